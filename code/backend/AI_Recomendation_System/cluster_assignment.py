@@ -0,0 +1,232 @@
+"""
+Online cluster assignment of new or changed users from the saved clustering artifacts.
+
+The per-city StandardScaler, MultiLabelBinarizer classes and KMeans centroids are loaded
+once. A user is featurized the way the training notebook did it, scaled and assigned to
+the nearest centroid with a few NumPy operations, without refitting anything.
+
+Supported artifacts (devloping_it/):
+    city_specific_clustering.pkl   {"cluster_models", "scalers", "encoders", "service_categories"}
+    clustering_model.pkl           (city users with a "cluster" column, scalers, encoders), save_model()
+    recommendation_models.pkl      {"city_clusters", "scalers", "encoders", "recommendations"}
+
+The last two have no KMeans, their centroids are rebuilt as the mean of the scaled
+features of each cluster's users, which is what KMeans converged to.
+
+Two feature layouts exist and are told apart by the scaler's feature names:
+    train_city_clusters_with_offset   location_x, location_y, age, gender_Male, interests
+    generate_city_features            location * 2, age, one column per gender, interests * 1.5
+
+The interest weight is read back from the scaler (the saved with_offset scalers were fit
+on unweighted interests although the notebook now multiplies them by 1.5).
+
+Every assignment also feeds drift statistics (feature mean shift, distance to the
+centroids, cluster shares) compared with the training data, needs_retrain() says which
+cities moved enough to be worth a full retrain.
+"""
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from recommender import parse_literal
+
+INTEREST_WEIGHT = 1.5  # when the scaler saw no interest at all
+
+# Drift thresholds, checked once a city has DRIFT_MIN_SAMPLES assignments
+DRIFT_MIN_SAMPLES = int(os.environ.get("DRIFT_MIN_SAMPLES", "200"))
+DRIFT_MAX_MEAN_SHIFT = float(os.environ.get("DRIFT_MAX_MEAN_SHIFT", "0.5"))  # in training standard deviations
+DRIFT_MAX_DISTANCE_RATIO = float(os.environ.get("DRIFT_MAX_DISTANCE_RATIO", "1.5"))  # vs training inertia per user
+DRIFT_MAX_CLUSTER_SHIFT = float(os.environ.get("DRIFT_MAX_CLUSTER_SHIFT", "0.2"))  # total variation distance
+
+
+def interest_weight(scaler, columns):
+    """
+    Weight the 0/1 interest columns were multiplied by before scaling. For a column w * x
+    with x in {0, 1}, var / mean + mean = w.
+    """
+    mean, var = scaler.mean_[columns], scaler.var_[columns]
+    seen = mean > 0
+    if not seen.any():
+        return INTEREST_WEIGHT
+    return float(np.round(np.median(var[seen] / mean[seen] + mean[seen]), 6))
+
+
+class CityClusters:
+    """Scaler, interest classes and centroids of one city."""
+
+    def __init__(self, city, scaler, categories, centers, labels, train_counts, train_distance):
+        self.city = city
+        self.columns = list(scaler.feature_names_in_)
+        self.mean = scaler.mean_.astype(np.float64)
+        self.scale = scaler.scale_.astype(np.float64)
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.center_norms = (self.centers ** 2).sum(axis=1)
+        self.labels = np.asarray(labels)
+        self.train_shares = np.asarray(train_counts, dtype=np.float64) / max(1, np.sum(train_counts))
+        self.train_distance = train_distance
+
+        # generate_city_features doubled the location, train_city_clusters_with_offset did not
+        location_weight = 1.0 if "gender_Male" in self.columns else 2.0
+        self.numeric = [(self.columns.index(c), c, location_weight if c.startswith("location") else 1.0)
+                        for c in ("location_x", "location_y", "age")]
+        self.gender_columns = [(i, "Male" if c == "gender_Male" else c) for i, c in enumerate(self.columns)
+                               if c == "gender_Male" or c in ("Male", "Female")]
+        self.interest_columns = {c: self.columns.index(c) for c in categories if c in self.columns}
+        self.interest_weight = interest_weight(scaler, list(self.interest_columns.values()))
+
+        self.drift = DriftStats(len(self.columns), len(self.centers))
+
+    @classmethod
+    def from_kmeans(cls, city, scaler, categories, kmeans):
+        counts = np.bincount(kmeans.labels_, minlength=kmeans.n_clusters)
+        return cls(city, scaler, categories, kmeans.cluster_centers_, np.arange(kmeans.n_clusters),
+                   counts, kmeans.inertia_ / len(kmeans.labels_))
+
+    @classmethod
+    def from_labelled_users(cls, city, scaler, categories, city_users):
+        """Centroids as the mean scaled features of each cluster of the training users."""
+        model = cls(city, scaler, categories, np.zeros((1, scaler.n_features_in_)), [0], [1], 0.0)
+        features = model.scaled(model.featurize(city_users))
+        labels, inverse, counts = np.unique(city_users["cluster"].to_numpy(), return_inverse=True, return_counts=True)
+        centers = np.zeros((len(labels), features.shape[1]))
+        np.add.at(centers, inverse, features)
+        centers /= counts[:, None]
+        distance = ((features - centers[inverse]) ** 2).sum(axis=1).mean()
+        return cls(city, scaler, categories, centers, labels, counts, distance)
+
+    def featurize(self, users):
+        """Unscaled (n, features) matrix of users (a DataFrame or a list of dicts), like the notebook."""
+        if isinstance(users, pd.DataFrame):
+            users = users.to_dict("records")
+        features = np.zeros((len(users), len(self.columns)))
+        for row, user in enumerate(users):
+            for column, name, weight in self.numeric:
+                features[row, column] = user[name] * weight
+            for column, gender in self.gender_columns:
+                features[row, column] = user["gender"] == gender
+            for category in parse_literal(user["service_categories_interest"]) or ():
+                column = self.interest_columns.get(category)
+                if column is not None:
+                    features[row, column] = self.interest_weight
+        return features
+
+    def scaled(self, features):
+        return (features - self.mean) / self.scale
+
+    def assign_features(self, features, track=True):
+        """(cluster ids, squared distances) of unscaled feature rows."""
+        scaled = self.scaled(features)
+        # |z - c|^2 = |z|^2 - 2 z.c + |c|^2, the |z|^2 term does not change the argmin
+        distances = self.center_norms - 2 * scaled @ self.centers.T
+        nearest = distances.argmin(axis=1)
+        squared = np.maximum(distances[np.arange(len(nearest)), nearest] + (scaled ** 2).sum(axis=1), 0.0)
+        if track:
+            self.drift.update(features, nearest, squared)
+        return self.labels[nearest], squared
+
+    def assign(self, users, track=True):
+        return self.assign_features(self.featurize(users), track)
+
+    def drift_stats(self):
+        return self.drift.summary(self)
+
+
+class DriftStats:
+    """Running sums of the assigned users, enough for means, distances and cluster shares."""
+
+    def __init__(self, features, clusters):
+        self.count = 0
+        self.feature_sum = np.zeros(features)
+        self.distance_sum = 0.0
+        self.cluster_counts = np.zeros(clusters, dtype=np.int64)
+
+    def update(self, features, nearest, squared):
+        self.count += len(features)
+        self.feature_sum += features.sum(axis=0)
+        self.distance_sum += float(squared.sum())
+        self.cluster_counts += np.bincount(nearest, minlength=len(self.cluster_counts))
+
+    def summary(self, model):
+        if self.count == 0:
+            return {"assigned": 0}
+        shift = np.abs(self.feature_sum / self.count - model.mean) / model.scale
+        worst = int(shift.argmax())
+        shares = self.cluster_counts / self.count
+        return {
+            "assigned": self.count,
+            "max_mean_shift": round(float(shift[worst]), 4),
+            "max_mean_shift_feature": model.columns[worst],
+            "distance_ratio": round(self.distance_sum / self.count / model.train_distance, 4)
+            if model.train_distance else None,
+            "cluster_shift": round(float(np.abs(shares - model.train_shares).sum() / 2), 4),
+        }
+
+
+class ClusterAssigner:
+    def __init__(self, models):
+        self.models = models  # city -> CityClusters
+
+    @classmethod
+    def load(cls, path):
+        assigner = cls.from_artifact(joblib.load(path))
+        print(f"Loaded cluster models of {len(assigner.models)} cities from {path}")
+        return assigner
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        models = {}
+        if isinstance(artifact, dict) and "cluster_models" in artifact:
+            categories = artifact.get("service_categories")
+            for city, kmeans in artifact["cluster_models"].items():
+                city_categories = categories or list(artifact["encoders"][city].classes_)
+                models[city] = CityClusters.from_kmeans(city, artifact["scalers"][city], city_categories, kmeans)
+        else:
+            if isinstance(artifact, dict):
+                city_users, scalers, encoders = artifact["city_clusters"], artifact["scalers"], artifact["encoders"]
+            else:
+                city_users, scalers, encoders = artifact
+            for city, users in city_users.items():
+                models[city] = CityClusters.from_labelled_users(city, scalers[city], list(encoders[city].classes_), users)
+        return cls(models)
+
+    def assign(self, user, track=True):
+        """Cluster id of one user (a dict with the user_df columns), None for a city without a model."""
+        model = self.models.get(user["city"])
+        if model is None:
+            return None
+        labels, _ = model.assign([user], track)
+        return labels[0].item()
+
+    def assign_batch(self, users, track=True):
+        """Cluster ids of a user DataFrame, -1 for cities without a model. Each city is featurized once."""
+        clusters = np.full(len(users), -1, dtype=np.int64)
+        cities = users["city"].to_numpy()
+        for city in pd.unique(cities):
+            model = self.models.get(city)
+            if model is None:
+                continue
+            rows = np.flatnonzero(cities == city)
+            clusters[rows], _ = model.assign(users.iloc[rows], track)
+        return clusters
+
+    def drift_stats(self):
+        return {city: model.drift_stats() for city, model in self.models.items()}
+
+    def needs_retrain(self):
+        """{city: reasons} of the cities whose assigned users drifted past the thresholds."""
+        retrain = {}
+        for city, stats in self.drift_stats().items():
+            if stats["assigned"] < DRIFT_MIN_SAMPLES:
+                continue
+            reasons = []
+            if stats["max_mean_shift"] > DRIFT_MAX_MEAN_SHIFT:
+                reasons.append(f"{stats['max_mean_shift_feature']} mean moved {stats['max_mean_shift']} std")
+            if stats["distance_ratio"] is not None and stats["distance_ratio"] > DRIFT_MAX_DISTANCE_RATIO:
+                reasons.append(f"distance to centroids x{stats['distance_ratio']}")
+            if stats["cluster_shift"] > DRIFT_MAX_CLUSTER_SHIFT:
+                reasons.append(f"cluster shares moved {stats['cluster_shift']}")
+            if reasons:
+                retrain[city] = reasons
+        return retrain
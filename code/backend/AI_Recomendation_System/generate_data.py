@@ -0,0 +1,271 @@
+"""
+Synthetic providers and users at load-test scale, the generators of Untitled1.ipynb with NumPy.
+
+    python generate_data.py --users 20000000 --services 500000 --output-dir load_test/
+
+Same schema and distributions as the notebook:
+    services   city, location uniform in the city's box + N(0, 0.01), category, gender of the
+               category (random when the category has none), review_avg U(3, 5) to 1 decimal,
+               review_count 1-50, click_count 0-100, provider_age 25-60
+    users      city, location, age 18-65, gender, 2-4 interests, 0-3 reviewed services of their
+               city in their interests with 1-10 clicks each, 1-3 favorites among the same services,
+               plus total_service_views and clicked of Untitled.ipynb
+Ids are contiguous per city, and the cities get the shares of city_service_id_ranges /
+city_user_id_ranges (200 of 1100 services and 400 of 2000 users for Algiers, ...).
+
+Differences:
+    - rows are generated and appended to the CSV in chunks of --chunk-size rows, memory does not
+      grow with --users. Only the category of every provider is kept (one byte per service and an
+      index over it) to draw the users' reviews and favorites.
+    - every city draws from its own default_rng([seed, table, city]), same arguments, same files
+    - the notebook redrew a location until it was not in assigned_locations, a set of every
+      location so far. Locations are drawn as arrays and only the duplicates of a chunk are
+      redrawn (at 6 decimals they are rare), uniqueness across chunks is not enforced
+    - favorites are capped by the services available, random.sample raised instead
+    - --catalog notebook uses the 23 categories of generating_data.ipynb (the ones train_clusters.py
+      encodes), those have no provider gender
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from train_clusters import SERVICE_CATEGORIES as NOTEBOOK_CATEGORIES
+
+# SERVICE_CATEGORIES and SERVICE_GENDER_LIKELIHOOD of Untitled1.ipynb
+SERVICE_CATEGORIES = [
+    "houseCleaning", "electricity", "plumbing", "gardening", "painting", "carpentry",
+    "pestControl", "acRepair", "vehicleRepair", "applianceInstallation", "itSupport",
+    "homeSecurity", "interiorDesign", "windowCleaning", "furnitureAssembly"
+]
+SERVICE_GENDER_LIKELIHOOD = {
+    "houseCleaning": "Female", "electricity": "Male", "plumbing": "Male", "gardening": "Female",
+    "painting": "Female", "carpentry": "Male", "pestControl": "Male", "acRepair": "Male",
+    "vehicleRepair": "Male", "applianceInstallation": "Male", "itSupport": "Male",
+    "homeSecurity": "Male", "interiorDesign": "Female", "windowCleaning": "Female",
+    "furnitureAssembly": "Male"
+}
+CATALOGS = {
+    "app": (SERVICE_CATEGORIES, SERVICE_GENDER_LIKELIHOOD),
+    "notebook": (NOTEBOOK_CATEGORIES, {}),
+}
+
+# algerian_cities of Untitled1.ipynb: lat_min, lat_max, lon_min, lon_max
+ALGERIAN_CITIES = {
+    "Algiers": (36.5, 37.0, 2.6, 3.3),
+    "Oran": (35.5, 36.0, -1.0, -0.4),
+    "Constantine": (36.1, 36.5, 6.4, 6.9),
+    "Annaba": (36.7, 37.2, 7.5, 8.0),
+    "Blida": (36.3, 36.8, 2.4, 3.3),
+    "Sétif": (35.4, 36.6, 5.2, 6.6),
+    "Tébessa": (34.4, 36.0, 7.4, 8.8),
+}
+# Sizes of city_service_id_ranges and city_user_id_ranges, used as shares
+CITY_SERVICE_SHARES = {"Algiers": 200, "Oran": 150, "Constantine": 150, "Annaba": 150,
+                       "Blida": 150, "Sétif": 150, "Tébessa": 150}
+CITY_USER_SHARES = {"Algiers": 400, "Oran": 300, "Constantine": 300, "Annaba": 300,
+                    "Blida": 300, "Sétif": 200, "Tébessa": 200}
+
+GENDERS = np.array(["Male", "Female"], dtype=object)
+LOCATION_OFFSET = 0.01  # add_random_offset
+MAX_INTERESTS = 4
+MAX_REVIEWS = 3
+MAX_FAVORITES = 3
+
+
+def split_counts(total, shares):
+    """{city: rows} proportional to shares, the remainder goes to the largest fractions."""
+    weights = np.array(list(shares.values()), dtype=np.float64)
+    exact = total * weights / weights.sum()
+    counts = np.floor(exact).astype(np.int64)
+    counts[np.argsort(-(exact - counts), kind="stable")[:total - counts.sum()]] += 1
+    return dict(zip(shares, counts.tolist()))
+
+
+def sample_locations(rng, box, n):
+    """n (lat, lon) uniform in box plus the notebook's offset, rounded, distinct within the call."""
+    lat_min, lat_max, lon_min, lon_max = box
+    lat = np.empty(n)
+    lon = np.empty(n)
+    redraw = np.arange(n)
+    while len(redraw):
+        lat[redraw] = np.round(rng.uniform(lat_min, lat_max, len(redraw)) + rng.normal(0, LOCATION_OFFSET, len(redraw)), 6)
+        lon[redraw] = np.round(rng.uniform(lon_min, lon_max, len(redraw)) + rng.normal(0, LOCATION_OFFSET, len(redraw)), 6)
+        # Both coordinates in micro degrees fit in one int64 key
+        keys = np.rint((lat + 90) * 1e6).astype(np.int64) * 400_000_000 + np.rint((lon + 180) * 1e6).astype(np.int64)
+        _, first = np.unique(keys, return_index=True)
+        redraw = np.setdiff1d(np.arange(n), first, assume_unique=True)
+    return lat, lon
+
+
+def sample_distinct(rng, pool_sizes, counts, max_count):
+    """
+    (n, max_count) distinct indices in [0, pool_sizes[i]) for each row i, counts[i] of them
+    (capped by the pool size) in draw order, -1 after. Each draw skips the earlier picks,
+    so there is no retry.
+    """
+    n = len(pool_sizes)
+    counts = np.minimum(counts, pool_sizes)
+    picks = np.full((n, max_count), -1, dtype=np.int64)
+    taken = np.full((n, max_count), np.iinfo(np.int64).max, dtype=np.int64)  # earlier picks, sorted
+    for j in range(max_count):
+        active = counts > j
+        pick = np.floor(rng.random(n) * np.maximum(pool_sizes - j, 1)).astype(np.int64)
+        for i in range(j):
+            pick += pick >= taken[:, i]
+        picks[active, j] = pick[active]
+        taken[active, j] = pick[active]
+        taken.sort(axis=1)
+    return picks
+
+
+class CityServices:
+    """Providers of one city grouped by category, to draw reviewed and favorite services from."""
+
+    def __init__(self, first_id, categories, n_categories):
+        self.first_id = first_id
+        self.order = np.argsort(categories, kind="stable").astype(np.int32)
+        self.counts = np.bincount(categories, minlength=n_categories)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+
+    def pool_sizes(self, interests):
+        """Services of each user's interests, interests is (n, MAX_INTERESTS) with -1 padding."""
+        return np.where(interests >= 0, self.counts[interests], 0)
+
+    def service_ids(self, interests, picks):
+        """Service ids of picks, indices into the concatenation of the users' interest categories."""
+        if not len(self.order):
+            return np.full(picks.shape, -1, dtype=np.int64)
+        sizes = self.pool_sizes(interests)
+        ends = np.cumsum(sizes, axis=1)
+        slot = (picks[:, :, None] >= ends[:, None, :]).sum(axis=2)
+        slot = np.minimum(slot, interests.shape[1] - 1)
+        rows = np.arange(len(picks))[:, None]
+        category = interests[rows, slot]
+        within = picks - (ends - sizes)[rows, slot]
+        ids = self.first_id + self.order[np.clip(self.offsets[category] + within, 0, len(self.order) - 1)]
+        return np.where(picks >= 0, ids, -1)
+
+
+def chunks(n, chunk_size):
+    for start in range(0, n, chunk_size):
+        yield start, min(n, start + chunk_size)
+
+
+def append_csv(df, path, first):
+    df.to_csv(path, mode="w" if first else "a", header=first, index=False)
+
+
+def generate_services(path, city_counts, catalog, seed, chunk_size):
+    """Write the providers, returns {city: CityServices}."""
+    categories, gender_likelihood = catalog
+    category_names = np.array(categories, dtype=object)
+    category_gender = np.array([gender_likelihood.get(c, "") for c in categories], dtype=object)
+    cities = {}
+    next_id = 1
+    first = True
+    for city_number, (city, count) in enumerate(city_counts.items()):
+        rng = np.random.default_rng([seed, 0, city_number])
+        city_categories = np.empty(count, dtype=np.int8)
+        for start, end in chunks(count, chunk_size):
+            n = end - start
+            lat, lon = sample_locations(rng, ALGERIAN_CITIES[city], n)
+            category = rng.integers(0, len(categories), n)
+            gender = category_gender[category]
+            unassigned = gender == ""
+            gender[unassigned] = GENDERS[rng.integers(0, 2, unassigned.sum())]
+            append_csv(pd.DataFrame({
+                "service_id": np.arange(next_id + start, next_id + end),
+                "city": city,
+                "provider_location_x": lat,
+                "provider_location_y": lon,
+                "service_category": category_names[category],
+                "gender": gender,
+                "review_avg": np.round(rng.uniform(3.0, 5.0, n), 1),
+                "review_count": rng.integers(1, 51, n),
+                "click_count": rng.integers(0, 101, n),
+                "provider_age": rng.integers(25, 61, n),
+            }), path, first)
+            first = False
+            city_categories[start:end] = category
+        cities[city] = CityServices(next_id, city_categories, len(categories))
+        next_id += count
+    return cities
+
+
+def generate_users(path, city_counts, city_services, catalog, seed, chunk_size):
+    categories, _ = catalog
+    next_id = 1
+    first = True
+    for city_number, (city, count) in enumerate(city_counts.items()):
+        rng = np.random.default_rng([seed, 1, city_number])
+        services = city_services[city]
+        for start, end in chunks(count, chunk_size):
+            n = end - start
+            lat, lon = sample_locations(rng, ALGERIAN_CITIES[city], n)
+            age = rng.integers(18, 66, n)
+            gender = GENDERS[rng.integers(0, 2, n)]
+
+            interests = sample_distinct(rng, np.full(n, len(categories)), rng.integers(2, MAX_INTERESTS + 1, n), MAX_INTERESTS)
+            available = services.pool_sizes(interests).sum(axis=1)
+            # randint(0, min(3, len(available_services))), then random.sample of them
+            reviews = np.floor(rng.random(n) * (np.minimum(MAX_REVIEWS, available) + 1)).astype(np.int64)
+            reviewed = services.service_ids(interests, sample_distinct(rng, available, reviews, MAX_REVIEWS))
+            clicks = np.where(reviewed >= 0, rng.integers(1, 11, reviewed.shape), 0)
+            favorites = services.service_ids(
+                interests, sample_distinct(rng, available, rng.integers(1, MAX_FAVORITES + 1, n), MAX_FAVORITES))
+            total_views = clicks.sum(axis=1) + rng.integers(0, 11, n)
+
+            # Python lists and dicts, to_csv writes their repr like the notebook's files
+            interest_lists = [[categories[c] for c in row if c >= 0] for row in interests.tolist()]
+            reviewed_lists = [[s for s in row if s >= 0] for row in reviewed.tolist()]
+            click_dicts = [{s: c for s, c in zip(ids, row)} for ids, row in zip(reviewed_lists, clicks.tolist())]
+            favorite_lists = [[s for s in row if s >= 0] for row in favorites.tolist()]
+            append_csv(pd.DataFrame({
+                "user_id": np.arange(next_id + start, next_id + end),
+                "city": city,
+                "location_x": lat,
+                "location_y": lon,
+                "age": age,
+                "gender": gender,
+                "service_categories_interest": interest_lists,
+                "reviewed_service_ids": reviewed_lists,
+                "click_count_per_service": click_dicts,
+                "favorites": favorite_lists,
+                "total_service_views": total_views,
+                "clicked": (reviews > 0).astype(np.int64),
+            }), path, first)
+            first = False
+        next_id += count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic user and service data")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--services", type=int, default=1100)
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--catalog", choices=sorted(CATALOGS), default="app",
+                        help="app: the categories of the csv files, notebook: the ones of generating_data.ipynb")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows generated and written at a time")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    service_path = os.path.join(args.output_dir, "service_data.csv")
+    user_path = os.path.join(args.output_dir, "user_data.csv")
+    catalog = CATALOGS[args.catalog]
+
+    start = time.perf_counter()
+    city_services = generate_services(service_path, split_counts(args.services, CITY_SERVICE_SHARES), catalog,
+                                      args.seed, args.chunk_size)
+    print(f"{args.services} services written to {service_path} in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    generate_users(user_path, split_counts(args.users, CITY_USER_SHARES), city_services, catalog,
+                   args.seed, args.chunk_size)
+    print(f"{args.users} users written to {user_path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Grid index over provider locations for proximity queries.
+
+Providers are bucketed into cells of cell_km x cell_km (in latitude degrees, longitude
+cells are widened by 1 / cos(latitude) when a query covers them). A radius query only
+looks at the cells overlapping the circle and filters them with the haversine distance,
+so it costs the providers around the point instead of every provider of the city.
+Unlike a BallTree, providers can be added, moved and removed one at a time.
+
+Locations follow the dataset: provider_location_x / location_x is the latitude and
+provider_location_y / location_y the longitude.
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Great circle distance in km, the helper of generating_data.ipynb, works on arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoIndex:
+    def __init__(self, cell_km=5.0):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.lon_cells = math.ceil(360 / self.cell_deg)
+        self.cells = {}  # (lat cell, lon cell) -> positions
+        self.positions = {}  # id -> position
+        self.ids = []
+        self.lat = np.empty(0)
+        self.lon = np.empty(0)
+        self.category = np.empty(0, dtype=object)
+
+    @classmethod
+    def from_services(cls, service_df, cell_km=5.0):
+        index = cls(cell_km)
+        for service_id, lat, lon, category in zip(
+            service_df["service_id"], service_df["provider_location_x"],
+            service_df["provider_location_y"], service_df["service_category"],
+        ):
+            index.add(service_id, lat, lon, category)
+        return index
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg) % self.lon_cells
+
+    def _grow(self):
+        capacity = max(16, 2 * len(self.lat))
+        for name in ("lat", "lon", "category"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, item_id, lat, lon, category=None):
+        """Add a provider, or move it when item_id is already indexed."""
+        if item_id in self.positions:
+            self.remove(item_id)
+        position = len(self.ids)
+        if position == len(self.lat):
+            self._grow()
+        self.ids.append(item_id)
+        self.lat[position], self.lon[position], self.category[position] = lat, lon, category
+        self.positions[item_id] = position
+        self.cells.setdefault(self._cell(lat, lon), []).append(position)
+
+    def remove(self, item_id):
+        position = self.positions.pop(item_id)
+        # The position stays allocated, it is only unreachable from the cells
+        cell = self._cell(self.lat[position], self.lon[position])
+        self.cells[cell].remove(position)
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def _covering_cells(self, lat, lon, radius_km):
+        dlat = radius_km / KM_PER_DEGREE
+        # Longitude degrees are shortest on the edge of the band furthest from the equator
+        edge = min(90.0, abs(lat) + dlat)
+        cos_edge = math.cos(math.radians(edge))
+        dlon = 180.0 if cos_edge < 1e-6 else min(180.0, radius_km / (KM_PER_DEGREE * cos_edge))
+
+        lat_range = range(math.floor((lat - dlat) / self.cell_deg), math.floor((lat + dlat) / self.cell_deg) + 1)
+        lon_first = math.floor((lon - dlon) / self.cell_deg)
+        lon_count = min(self.lon_cells, math.floor((lon + dlon) / self.cell_deg) - lon_first + 1)
+        if len(lat_range) * lon_count > len(self.cells):
+            # Wide searches are cheaper over the occupied cells
+            for (i, j), cell in self.cells.items():
+                if i in lat_range and (j - lon_first) % self.lon_cells < lon_count:
+                    yield cell
+            return
+        for i in lat_range:
+            for j in range(lon_first, lon_first + lon_count):
+                cell = self.cells.get((i, j % self.lon_cells))
+                if cell:
+                    yield cell
+
+    def within(self, lat, lon, radius_km, category=None):
+        """
+        (ids, distances in km) of the providers within radius_km of (lat, lon), nearest
+        first, only the given category (or list of categories) when set.
+        """
+        positions = [p for cell in self._covering_cells(lat, lon, radius_km) for p in cell]
+        positions = np.asarray(positions, dtype=np.int64)
+        if category is not None:
+            categories = list(category) if isinstance(category, (list, tuple, set, np.ndarray)) else [category]
+            positions = positions[np.isin(self.category[positions], categories)]
+        distances = haversine_distance(lat, lon, self.lat[positions], self.lon[positions])
+        keep = distances <= radius_km
+        positions, distances = positions[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return [self.ids[p] for p in positions[order]], distances[order]
+
+    def nearest(self, lat, lon, k, category=None, max_radius_km=None):
+        """
+        (ids, distances in km) of the k providers nearest to (lat, lon). The search radius
+        doubles from one cell until k providers are inside it.
+        """
+        radius = self.cell_deg * KM_PER_DEGREE
+        limit = max_radius_km if max_radius_km is not None else math.pi * EARTH_RADIUS_KM
+        while True:
+            radius = min(radius, limit)
+            ids, distances = self.within(lat, lon, radius, category)
+            if len(ids) >= k or radius >= limit:
+                return ids[:k], distances[:k]
+            radius *= 2
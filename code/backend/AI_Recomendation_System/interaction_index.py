@@ -0,0 +1,269 @@
+"""
+Sparse user-by-service interaction matrix with a top-k similar users index.
+
+The click counts are kept in a CSR matrix (one row per user, one column per service)
+next to its transpose, so the users who interacted with a service are one row slice
+away. The cosine similarity of a user is only computed against the users that share
+at least one service with them, which costs the number of co-interactions instead of
+users x services, and the top-k is selected with argpartition.
+
+New clicks and reviews are buffered by add_interaction() and, before the next query,
+moved into a small delta (dicts by user and by service) that every query adds to the
+CSR matrix. Only the squared norms of the users that clicked are updated, and only the
+cached neighbour lists of the users whose similarity may have changed are dropped. The
+delta is merged into the CSR matrix (one O(nnz) rebuild) once it holds more than
+INTERACTION_DELTA_MIN entries and INTERACTION_DELTA_FRACTION of the matrix.
+"""
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+# Size the delta can reach before it is merged into the CSR matrix
+INTERACTION_DELTA_MIN = int(os.environ.get("INTERACTION_DELTA_MIN", "10000"))
+INTERACTION_DELTA_FRACTION = float(os.environ.get("INTERACTION_DELTA_FRACTION", "0.05"))
+
+# Rows scanned at a time for the users that fill short neighbour lists
+ACTIVE_SCAN_BLOCK = 4096
+
+
+def top_k_indices(values, k):
+    """
+    Indices of the k largest values, largest first and ties in index order, found with
+    argpartition in O(n) instead of sorting every value.
+    """
+    n = len(values)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-values, k - 1)[:k]
+        # Values equal to the k-th largest may sit on both sides of the partition, take the first ones
+        kth = values[candidates].min()
+        candidates = np.concatenate([np.flatnonzero(values > kth), np.flatnonzero(values == kth)])[:k]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.lexsort((candidates, -values[candidates]))]
+
+
+class InteractionIndex:
+    def __init__(self, user_ids, service_ids, interactions=(), delta_min=INTERACTION_DELTA_MIN,
+                 delta_fraction=INTERACTION_DELTA_FRACTION):
+        """
+        user_ids and service_ids give the row and column order, interactions is an
+        iterable of (user_id, service_id, count).
+        """
+        self.user_ids = [int(uid) for uid in user_ids]
+        self.user_rows = {uid: i for i, uid in enumerate(self.user_ids)}
+        self.service_columns = {int(sid): i for i, sid in enumerate(service_ids)}
+        self.delta_min = delta_min
+        self.delta_fraction = delta_fraction
+        self._pending = []
+        self._neighbours = {}
+        self.delta_by_user = {}  # row -> {column: clicks not in the matrix yet}
+        self.delta_by_service = {}  # column -> {row: same clicks}
+        self.delta_nnz = 0
+        self.sq_norms = np.zeros(len(self.user_ids))
+        self.is_active = np.zeros(len(self.user_ids), dtype=bool)
+        self.active_count = 0
+
+        rows, cols, counts = [], [], []
+        for user_id, service_id, count in interactions:
+            rows.append(self.user_row(user_id))
+            cols.append(self.service_column(service_id))
+            counts.append(count)
+        self._grow_users()
+        self.matrix = sp.csr_matrix((counts, (rows, cols)), shape=self.shape, dtype=np.float64)
+        self._index_matrix()
+        self.sq_norms[:self.matrix.shape[0]] = np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)).ravel()
+        self.is_active[:] = self.sq_norms > 0
+        # Users with interactions, the only ones the notebook's pivot_table had rows for
+        self.active_count = int(self.is_active.sum())
+
+    @property
+    def shape(self):
+        return len(self.user_rows), len(self.service_columns)
+
+    def user_row(self, user_id):
+        user_id = int(user_id)
+        if user_id not in self.user_rows:
+            self.user_rows[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        return self.user_rows[user_id]
+
+    def service_column(self, service_id):
+        return self.service_columns.setdefault(int(service_id), len(self.service_columns))
+
+    def add_interaction(self, user_id, service_id, count=1):
+        """
+        Add count (> 0) clicks of user_id on service_id, unknown users and services get a
+        new row/column.
+        """
+        self._pending.append((self.user_row(user_id), self.service_column(service_id), count))
+
+    def refresh(self):
+        """Move the buffered interactions into the delta, called before every query."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self._grow_users()
+
+        changed = set()
+        for row, column, count in pending:
+            by_user = self.delta_by_user.setdefault(row, {})
+            if column not in by_user:
+                self.delta_nnz += 1
+            before = self._matrix_value(row, column) + by_user.get(column, 0.0)
+            by_user[column] = by_user.get(column, 0.0) + count
+            self.delta_by_service.setdefault(column, {})[row] = by_user[column]
+            self.sq_norms[row] += (before + count) ** 2 - before ** 2
+            changed.add(row)
+
+        for row in changed:
+            if not self.is_active[row]:
+                self.is_active[row] = True
+                self.active_count += 1
+
+        # The similarity of a changed user moves for everyone sharing a service with them.
+        # Counts only grow, so the services they had before are among their current ones.
+        stale = set(changed)
+        services = np.unique(np.concatenate([self._user_vector(row)[0] for row in changed]))
+        in_matrix = services[services < self.matrix.shape[1]]
+        stale.update(self.by_service[in_matrix].indices.tolist())
+        for service in services.tolist():
+            stale.update(self.delta_by_service.get(service, ()))
+        for row in stale:
+            self._neighbours.pop(row, None)
+
+        if self.delta_nnz > max(self.delta_min, self.delta_fraction * self.matrix.nnz):
+            self.compact()
+
+    def compact(self):
+        """Merge the delta into the CSR matrix and its transpose."""
+        self.refresh()
+        rows, cols, counts = [], [], []
+        for row, by_user in self.delta_by_user.items():
+            rows.extend([row] * len(by_user))
+            cols.extend(by_user.keys())
+            counts.extend(by_user.values())
+        self.matrix.resize(self.shape)
+        delta = sp.csr_matrix((counts, (rows, cols)), shape=self.shape, dtype=np.float64)
+        self.matrix = (self.matrix + delta).tocsr()
+        self._index_matrix()
+        self.delta_by_user, self.delta_by_service, self.delta_nnz = {}, {}, 0
+
+    def _index_matrix(self):
+        self.matrix.sort_indices()
+        self.by_service = self.matrix.T.tocsr()
+
+    def _grow_users(self):
+        # Room for the users added since, doubled so a stream of new users stays amortized O(1)
+        if len(self.user_ids) > len(self.sq_norms):
+            extra = max(len(self.user_ids), 2 * len(self.sq_norms)) - len(self.sq_norms)
+            self.sq_norms = np.concatenate([self.sq_norms, np.zeros(extra)])
+            self.is_active = np.concatenate([self.is_active, np.zeros(extra, dtype=bool)])
+
+    def _matrix_value(self, row, column):
+        if row >= self.matrix.shape[0] or column >= self.matrix.shape[1]:
+            return 0.0
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        i = start + np.searchsorted(self.matrix.indices[start:end], column)
+        return float(self.matrix.data[i]) if i < end and self.matrix.indices[i] == column else 0.0
+
+    def _user_vector(self, row):
+        """(columns, clicks) of a user, matrix and delta together."""
+        if row < self.matrix.shape[0]:
+            start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+            services, counts = self.matrix.indices[start:end].astype(np.int64), self.matrix.data[start:end]
+        else:
+            services, counts = np.empty(0, dtype=np.int64), np.empty(0)
+        delta = self.delta_by_user.get(row)
+        if delta:
+            services = np.concatenate([services, np.fromiter(delta.keys(), np.int64, len(delta))])
+            counts = np.concatenate([counts, np.fromiter(delta.values(), np.float64, len(delta))])
+            services, inverse = np.unique(services, return_inverse=True)
+            counts = np.bincount(inverse, weights=counts, minlength=len(services))
+        return services, counts
+
+    def similarities(self, row):
+        """(rows, cosine similarities) of the users sharing at least one service with row, row included."""
+        services, counts = self._user_vector(row)
+        if len(services) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # Dot products through the users of each of row's services, in the matrix and in the delta
+        in_matrix = services < self.matrix.shape[1]
+        users = self.by_service[services[in_matrix]]
+        indices = [users.indices.astype(np.int64)]
+        weights = [users.data * np.repeat(counts[in_matrix], np.diff(users.indptr))]
+        for service, count in zip(services.tolist(), counts.tolist()):
+            delta = self.delta_by_service.get(service)
+            if delta:
+                indices.append(np.fromiter(delta.keys(), np.int64, len(delta)))
+                weights.append(np.fromiter(delta.values(), np.float64, len(delta)) * count)
+        rows, inverse = np.unique(np.concatenate(indices), return_inverse=True)
+        dots = np.bincount(inverse, weights=np.concatenate(weights), minlength=len(rows))
+        return rows, dots / (np.sqrt(self.sq_norms[rows]) * np.sqrt(self.sq_norms[row]))
+
+    def positive_neighbours(self, row, k):
+        """Up to k rows most similar to row with a similarity above 0, cached until they go stale."""
+        cached = self._neighbours.get(row)
+        if cached is not None and cached[0] >= k:
+            return cached[1][:k]
+        rows, similarity = self.similarities(row)
+        keep = rows != row
+        rows, similarity = rows[keep], similarity[keep]
+        # rows come out sorted, so ties stay in user order
+        neighbours = rows[top_k_indices(similarity, k)]
+        self._neighbours[row] = (k, neighbours)
+        return neighbours
+
+    def neighbours(self, row, k):
+        """
+        The k users most similar to row, ties in user order. Like the notebook, users with
+        interactions but nothing in common fill the list when fewer than k share a service.
+        """
+        self.refresh()
+        if row >= len(self.user_ids) or self.sq_norms[row] == 0:
+            return np.empty(0, dtype=np.int64)
+        neighbours = self.positive_neighbours(row, k)
+        missing = min(k, self.active_count - 1) - len(neighbours)
+        if missing > 0:
+            taken = set(neighbours.tolist()) | {row}
+            fill = []
+            for start in range(0, len(self.user_ids), ACTIVE_SCAN_BLOCK):
+                block = np.flatnonzero(self.is_active[start:min(start + ACTIVE_SCAN_BLOCK, len(self.user_ids))])
+                fill.extend(r for r in (block + start).tolist() if r not in taken)
+                if len(fill) >= missing:
+                    break
+            neighbours = np.concatenate([neighbours, np.asarray(fill[:missing], dtype=np.int64)])
+        return neighbours
+
+    def similar_users(self, user_id, k):
+        """User ids of the k users most similar to user_id."""
+        row = self.user_rows.get(int(user_id))
+        if row is None:
+            return []
+        return [self.user_ids[r] for r in self.neighbours(row, k)]
+
+    def mean_interactions(self, rows, columns):
+        """Mean clicks of the users at rows on the services at columns, dense."""
+        self.refresh()
+        rows, columns = np.asarray(rows, dtype=np.int64), np.asarray(columns, dtype=np.int64)
+        if len(rows) == 0:
+            return np.zeros(len(columns))
+        total = np.zeros(len(columns))
+        in_rows = rows[rows < self.matrix.shape[0]]
+        in_columns = columns < self.matrix.shape[1]
+        if len(in_rows) and in_columns.any():
+            total[in_columns] = np.asarray(self.matrix[in_rows][:, columns[in_columns]].sum(axis=0)).ravel()
+        deltas = [self.delta_by_user[row] for row in rows.tolist() if row in self.delta_by_user]
+        if deltas:
+            positions = {}
+            for i, column in enumerate(columns.tolist()):
+                positions.setdefault(column, []).append(i)
+            for by_user in deltas:
+                for column, count in by_user.items():
+                    for i in positions.get(column, ()):
+                        total[i] += count
+        return total / len(rows)
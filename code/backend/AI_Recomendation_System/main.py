@@ -0,0 +1,171 @@
+import os
+import time
+from collections import deque
+from typing import Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from cluster_assignment import ClusterAssigner
+from recommendation_cache import ClusterRecommendations
+from recommender import RecommendationEngine, load_services, load_users
+
+# Per-city clustered users, scalers, encoders and top-k services per cluster. The default was built by
+#   python train_clusters.py --users devloping_it/user_data.csv --services devloping_it/service_data.csv \
+#       --categories data --output devloping_it/app_recommendation_models.pkl
+# devloping_it/recommendation_models.pkl (generating_data.ipynb) needs the notebook's catalog, which is not shipped
+RECOMMENDATION_MODELS_PATH = os.environ.get("RECOMMENDATION_MODELS_PATH",
+                                            "devloping_it/app_recommendation_models.pkl")
+# Full provider catalog the artifacts were built from (csv or json), required: the precomputed
+# top-k only holds a fraction of the providers
+SERVICE_DATA_PATH = os.environ.get("SERVICE_DATA_PATH", "devloping_it/service_data.csv")
+# Extra users (csv or json), assigned to a cluster at startup. The artifact's users are always loaded.
+USER_DATA_PATH = os.environ.get("USER_DATA_PATH", "")
+TOP_K = int(os.environ.get("TOP_K", "20"))
+
+app = FastAPI()
+
+# Filled at startup
+engine = None
+cache = None
+assigner = None
+user_clusters = {}  # user_id -> cluster
+
+# Durations of the last /recommendations requests
+latencies = deque(maxlen=10000)
+
+
+def check_catalog(artifact, service_df):
+    """Raise when the artifact was not built from this catalog, its top-k would name other providers."""
+    categories = dict(zip(service_df["service_id"].astype(int), service_df["service_category"]))
+    mismatched = [
+        int(sid)
+        for clusters in artifact["recommendations"].values()
+        for services in clusters.values()
+        for sid, category in zip(services["service_id"], services["service_category"])
+        if categories.get(int(sid)) != category
+    ]
+    if mismatched:
+        raise RuntimeError(f"{len(set(mismatched))} precomputed services are missing from {SERVICE_DATA_PATH} "
+                           f"or have another category there, e.g. {sorted(set(mismatched))[:5]}")
+    interests = {category for users in artifact["city_clusters"].values()
+                 for user_interests in users["service_categories_interest"] for category in user_interests or ()}
+    if not interests & set(categories.values()):
+        raise RuntimeError(f"No cluster interest is a category of {SERVICE_DATA_PATH}")
+
+
+@app.on_event("startup")
+def load_artifacts():
+    global engine, cache, assigner
+    start = time.perf_counter()
+    if not SERVICE_DATA_PATH or not os.path.exists(SERVICE_DATA_PATH):
+        raise RuntimeError(f"Service catalog not found: SERVICE_DATA_PATH={SERVICE_DATA_PATH!r}")
+    artifact = joblib.load(RECOMMENDATION_MODELS_PATH)
+    service_df = load_services(SERVICE_DATA_PATH)
+    check_catalog(artifact, service_df)
+
+    user_df = pd.concat(artifact["city_clusters"].values(), ignore_index=True)
+    assigner = ClusterAssigner.from_artifact(artifact)
+    if USER_DATA_PATH:
+        extra = load_users(USER_DATA_PATH)
+        extra = extra[~extra["user_id"].isin(user_df["user_id"])].reset_index(drop=True)
+        extra["cluster"] = assigner.assign_batch(extra)
+        user_df = pd.concat([user_df, extra], ignore_index=True)
+    user_clusters.update(zip(user_df["user_id"].astype(int), user_df["cluster"].astype(int)))
+
+    engine = RecommendationEngine(user_df, service_df)
+    cache = ClusterRecommendations.from_artifact(artifact, engine.service_df.copy(), TOP_K)
+    print(f"Loaded {len(user_df)} users, {len(service_df)} services and {len(cache.cluster_interests)} clusters "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "users": len(user_clusters), "services": len(engine.service_ids)}
+
+
+@app.get("/recommendations/{user_id}")
+async def recommendations(user_id: int, limit: int = TOP_K):
+    start = time.perf_counter()
+    user = engine.user_index.get(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Unknown user.")
+    city = engine.user_city[user]
+    cluster = user_clusters.get(user_id)
+    if cluster is None or cluster < 0:
+        # A user whose city had no clusters when the artifacts were trained
+        raise HTTPException(status_code=404, detail="No clusters for the user's city.")
+
+    service_ids, cluster_scores = cache.get(city, cluster)
+    known = np.array([sid in engine.service_index for sid in service_ids], dtype=bool)
+    service_ids, cluster_scores = service_ids[known], cluster_scores[known]
+    positions = np.array([engine.service_index[sid] for sid in service_ids], dtype=np.int64)
+
+    # Re-rank the cluster's top-k with the user's own score (interests, distance, similar users, ...)
+    scores = engine.score_users([user], positions)[0]
+    order = np.lexsort((np.arange(len(scores)), -scores))[:limit]
+    results = [
+        {
+            "service_id": int(service_ids[i]),
+            "service_category": engine.categories[engine.service_category[positions[i]]],
+            "cluster_score": round(float(cluster_scores[i]), 4),
+            "score": round(float(scores[i]), 4),
+        }
+        for i in order
+    ]
+    latencies.append(time.perf_counter() - start)
+    return {"user_id": user_id, "city": city, "cluster": int(cluster), "recommendations": results}
+
+
+class ProviderStats(BaseModel):
+    review_avg: Optional[float] = None
+    review_count: Optional[int] = None
+    click_count: Optional[int] = None
+
+
+@app.patch("/services/{service_id}")
+async def update_service(service_id: int, stats: ProviderStats):
+    if service_id not in engine.service_index:
+        raise HTTPException(status_code=404, detail="Unknown service.")
+    changes = stats.dict()
+    engine.update_service(service_id, **changes)
+    return {"service_id": service_id, "invalidated": cache.update_service(service_id, **changes)}
+
+
+class Provider(BaseModel):
+    service_id: int
+    city: str
+    provider_location_x: float
+    provider_location_y: float
+    service_category: str
+    review_avg: float = 0
+    review_count: int = 0
+    click_count: int = 0
+    provider_age: int
+    gender: Optional[str] = None
+
+
+@app.post("/services")
+async def add_service(provider: Provider):
+    if provider.service_id in engine.service_index:
+        raise HTTPException(status_code=409, detail="Service already exists.")
+    service = provider.dict()
+    engine.add_service(service)
+    return {"service_id": provider.service_id, "invalidated": cache.add_service(service)}
+
+
+@app.get("/stats")
+async def stats():
+    timings = np.array(latencies) * 1000
+    return {
+        "cache": cache.stats(),
+        "recommendations_served": len(timings),
+        "p50_ms": round(float(np.percentile(timings, 50)), 3) if len(timings) else None,
+        "p99_ms": round(float(np.percentile(timings, 99)), 3) if len(timings) else None,
+        "drift": assigner.drift_stats(),
+    }
+
+# To run the server: ./start.sh or uvicorn main:app --port 8001
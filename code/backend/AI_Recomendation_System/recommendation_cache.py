@@ -0,0 +1,137 @@
+"""
+Per city and cluster top-k services, served from memory and recomputed on demand.
+
+Entries start from the "recommendations" of recommendation_models.pkl. A cluster's
+entry is recomputed the way generate_service_recommendations did it:
+
+    recommendation_score = review_avg * 0.7 + rank(click_count) * 0.15 + rank(review_count) * 0.15
+
+over the services whose category one of the cluster's users is interested in. The ranks
+are taken among those services, so a change of review_avg, review_count or click_count
+of one provider can move every score of every cluster interested in its category. The
+entries of those clusters are dropped and rebuilt on their next request.
+"""
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+from interaction_index import top_k_indices
+
+REVIEW_AVG_WEIGHT = 0.7
+CLICK_RANK_WEIGHT = 0.15
+REVIEW_COUNT_RANK_WEIGHT = 0.15
+
+# Provider fields the cluster scores depend on
+SCORED_FIELDS = ("review_avg", "review_count", "click_count")
+
+
+class ClusterRecommendations:
+    def __init__(self, service_df, cluster_interests, top_k=20):
+        """cluster_interests maps (city, cluster) to the categories its users are interested in."""
+        self.top_k = top_k
+        self._service_frame = service_df.reset_index(drop=True)
+        self._added_services = []  # rows of add_service() not in _service_frame yet
+        self.service_index = {int(sid): i for i, sid in enumerate(self._service_frame["service_id"])}
+        self.cluster_interests = {key: set(categories) for key, categories in cluster_interests.items()}
+        self._by_category = {}
+        for key, categories in self.cluster_interests.items():
+            for category in categories:
+                self._by_category.setdefault(category, set()).add(key)
+        self._entries = {}  # (city, cluster) -> (service ids, recommendation scores)
+        self.hits = self.misses = self.invalidations = 0
+
+    @classmethod
+    def from_artifact(cls, artifact, service_df, top_k=20):
+        """Cache of recommendation_models.pkl, its precomputed top-k are the initial entries."""
+        interests = {}
+        for city, users in artifact["city_clusters"].items():
+            exploded = users[["cluster", "service_categories_interest"]].explode("service_categories_interest")
+            for cluster, categories in exploded.groupby("cluster")["service_categories_interest"]:
+                interests[(city, int(cluster))] = set(categories.dropna())
+        cache = cls(service_df, interests, top_k)
+        for city, clusters in artifact["recommendations"].items():
+            for cluster, services in clusters.items():
+                cache._entries[(city, int(cluster))] = (
+                    services["service_id"].to_numpy(dtype=np.int64)[:top_k],
+                    services["recommendation_score"].to_numpy(dtype=np.float64)[:top_k],
+                )
+        return cache
+
+    @property
+    def service_df(self):
+        """Every provider as a DataFrame, the added ones are merged in one concat per batch of adds."""
+        if self._added_services:
+            added = pd.DataFrame(self._added_services)
+            self._service_frame = pd.concat([self._service_frame, added], ignore_index=True)
+            self._added_services = []
+        return self._service_frame
+
+    def compute(self, key):
+        """(service ids, scores) of a cluster from the current provider stats."""
+        services = self.service_df
+        candidates = np.flatnonzero(services["service_category"].isin(self.cluster_interests.get(key, ())).to_numpy())
+        subset = services.iloc[candidates]
+        scores = (
+            subset["review_avg"].to_numpy(dtype=np.float64) * REVIEW_AVG_WEIGHT
+            + rankdata(subset["click_count"].to_numpy(), method="min") * CLICK_RANK_WEIGHT
+            + rankdata(subset["review_count"].to_numpy(), method="min") * REVIEW_COUNT_RANK_WEIGHT
+        )
+        # nlargest keeps the first of equal scores, top_k_indices does too
+        best = top_k_indices(scores, self.top_k)
+        return subset["service_id"].to_numpy(dtype=np.int64)[best], scores[best]
+
+    def get(self, city, cluster):
+        key = (city, int(cluster))
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = self._entries[key] = self.compute(key)
+        else:
+            self.hits += 1
+        return entry
+
+    def invalidate_category(self, category):
+        """Drop the entries of the clusters interested in category."""
+        dropped = 0
+        for key in self._by_category.get(category, ()):
+            if self._entries.pop(key, None) is not None:
+                dropped += 1
+        self.invalidations += dropped
+        return dropped
+
+    def update_service(self, service_id, **stats):
+        """
+        Set review_avg / review_count / click_count of a provider. Returns the number of
+        cache entries dropped, 0 when nothing the scores depend on changed.
+        """
+        row = self.service_index[int(service_id)]
+        # Providers added since the last compute are still dicts, only the frame rows are in the DataFrame
+        added = row >= len(self._service_frame)
+        service = self._added_services[row - len(self._service_frame)] if added else None
+        changed = False
+        for field, value in stats.items():
+            if field not in SCORED_FIELDS:
+                raise ValueError(f"{field} is not a provider stat")
+            current = service.get(field) if added else self._service_frame.at[row, field]
+            if value is not None and current != value:
+                if added:
+                    service[field] = value
+                else:
+                    self._service_frame.at[row, field] = value
+                changed = True
+        if not changed:
+            return 0
+        category = service["service_category"] if added else self._service_frame.at[row, "service_category"]
+        return self.invalidate_category(category)
+
+    def add_service(self, service):
+        """Add a provider (a dict with service_df's columns), it competes in its category's clusters."""
+        if int(service["service_id"]) in self.service_index:
+            raise ValueError(f"Service {service['service_id']} already exists")
+        self.service_index[int(service["service_id"])] = len(self._service_frame) + len(self._added_services)
+        self._added_services.append(dict(service))
+        return self.invalidate_category(service["service_category"])
+
+    def stats(self):
+        return {"entries": len(self._entries), "clusters": len(self.cluster_interests),
+                "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
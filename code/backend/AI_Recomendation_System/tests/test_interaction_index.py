@@ -0,0 +1,81 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from interaction_index import InteractionIndex
+from recommender import RecommendationEngine, load_services, load_users
+
+
+@pytest.fixture(scope="module")
+def data():
+    users = load_users(os.path.join(APP_DIR, "devloping_it", "user_data.csv"))
+    services = load_services(os.path.join(APP_DIR, "devloping_it", "service_data.csv"))
+    return users, services
+
+
+def random_clicks(users, services, count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [(int(rng.choice(users.user_id)), int(rng.choice(services.service_id)), int(rng.integers(1, 4)))
+            for _ in range(count)]
+
+
+def with_clicks(users, clicks):
+    # The users as they would be stored after the clicks, for a full rebuild
+    users = users.copy()
+    counts = {uid: dict(c or {}) for uid, c in zip(users.user_id, users.click_count_per_service)}
+    for user_id, service_id, count in clicks:
+        counts[user_id][service_id] = counts[user_id].get(service_id, 0) + count
+    users["click_count_per_service"] = [counts[uid] for uid in users.user_id]
+    return users
+
+
+@pytest.mark.parametrize("delta_min, compacted", [(10_000, False), (50, True)])
+def test_incremental_clicks_match_rebuilt_engine(data, delta_min, compacted):
+    users, services = data
+    engine = RecommendationEngine(users, services)
+    index = engine.interactions
+    index.delta_min = delta_min
+    matrix_nnz = index.matrix.nnz
+    clicks = random_clicks(users, services, 400)
+    checked = users.user_id.to_numpy()[::7]
+
+    for i, (user_id, service_id, count) in enumerate(clicks):
+        engine.add_interaction(user_id, service_id, count)
+        if i % 50 == 49:
+            # Queries in between move the clicks into the delta, or compact it
+            engine.recommend(int(checked[i % len(checked)]))
+    index.refresh()
+    assert (index.matrix.nnz > matrix_nnz) is compacted
+    assert index.delta_nnz > 0
+
+    rebuilt = RecommendationEngine(with_clicks(users, clicks), services)
+    for user_id in checked:
+        user = engine.user_index[int(user_id)]
+        np.testing.assert_array_equal(engine.neighbours(user), rebuilt.neighbours(user))
+        incremental, expected = engine.recommend(int(user_id), 20), rebuilt.recommend(int(user_id), 20)
+        pd.testing.assert_frame_equal(incremental, expected)
+
+
+def test_compaction_keeps_queries(data):
+    users, services = data
+    index = InteractionIndex(users.user_id, services.service_id, delta_min=10_000)
+    clicks = random_clicks(users, services, 300, seed=1) + [(99_999, 5_000, 2), (1, 5_000, 1)]  # new user, new service
+    for click in clicks:
+        index.add_interaction(*click)
+    rows = np.arange(len(index.user_ids))
+    columns = np.arange(len(index.service_columns))
+    before = [index.neighbours(row, 10) for row in rows]
+    means = index.mean_interactions(rows[:40], columns)
+    assert index.delta_nnz > 0
+
+    index.compact()
+    assert index.delta_nnz == 0
+    for row, neighbours in zip(rows, before):
+        np.testing.assert_array_equal(index.neighbours(row, 10), neighbours)
+    np.testing.assert_allclose(index.mean_interactions(rows[:40], columns), means)
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import main
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # The artifact and catalog paths are relative to the service directory
+    monkeypatch.chdir(APP_DIR)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_patch_of_top_k_provider_invalidates_its_clusters(client):
+    (city, cluster), (service_ids, _) = next(iter(main.cache._entries.items()))
+    service_id = int(service_ids[0])
+    category = main.engine.categories[main.engine.service_category[main.engine.service_index[service_id]]]
+    clusters = main.cache._by_category[category]
+    assert (city, cluster) in clusters
+
+    response = client.patch(f"/services/{service_id}", json={"review_count": 10_000})
+    assert response.status_code == 200
+    assert response.json()["invalidated"] == len(clusters)
+    assert not clusters & main.cache._entries.keys()
+
+    # The next request of the cluster recomputes its entry, the provider now leads it
+    user_id = next(uid for uid, c in main.user_clusters.items()
+                   if c == cluster and main.engine.user_city[main.engine.user_index[uid]] == city)
+    misses = main.cache.misses
+    assert client.get(f"/recommendations/{user_id}").status_code == 200
+    assert main.cache.misses == misses + 1
+    assert service_id in main.cache._entries[(city, cluster)][0]
+
+
+def test_patch_of_unknown_service(client):
+    assert client.patch("/services/999999", json={"review_count": 1}).status_code == 404
+
+
+def test_startup_rejects_artifact_of_another_catalog(monkeypatch):
+    monkeypatch.chdir(APP_DIR)
+    # Built from the notebook's catalog, its service ids name other providers in service_data.csv
+    monkeypatch.setattr(main, "RECOMMENDATION_MODELS_PATH", "devloping_it/recommendation_models.pkl")
+    with pytest.raises(RuntimeError, match="precomputed services"):
+        main.load_artifacts()
+
+
+def test_startup_requires_the_catalog(monkeypatch):
+    monkeypatch.chdir(APP_DIR)
+    monkeypatch.setattr(main, "SERVICE_DATA_PATH", "devloping_it/missing.csv")
+    with pytest.raises(RuntimeError, match="Service catalog not found"):
+        main.load_artifacts()
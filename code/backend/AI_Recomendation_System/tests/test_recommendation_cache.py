@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from recommendation_cache import ClusterRecommendations
+from recommender import load_services
+
+SERVICES = load_services(os.path.join(APP_DIR, "devloping_it", "service_data.csv"))
+INTERESTS = {("Algiers", 0): {"plumbing", "painting"}, ("Oran", 1): {"acRepair"}}
+
+
+def provider(service_id, category, **stats):
+    return dict({"service_id": service_id, "city": "Algiers", "provider_location_x": 36.7,
+                 "provider_location_y": 3.0, "service_category": category, "review_avg": 4.5,
+                 "review_count": 30, "click_count": 50, "provider_age": 40, "provider_experience": 5}, **stats)
+
+
+def test_added_providers_are_merged_once_per_compute():
+    cache = ClusterRecommendations(SERVICES, INTERESTS)
+    added = [provider(10_000 + i, "plumbing", click_count=100 + i) for i in range(20)]
+    for service in added:
+        cache.add_service(service)
+    assert len(cache._service_frame) == len(SERVICES)
+
+    # Updates of a provider that is not merged yet
+    assert cache.update_service(10_005, review_avg=5.0) == 0  # nothing cached yet
+    added[5]["review_avg"] = 5.0
+
+    expected = ClusterRecommendations(pd.concat([SERVICES, pd.DataFrame(added)], ignore_index=True), INTERESTS)
+    for key in INTERESTS:
+        ids, scores = cache.get(*key)
+        expected_ids, expected_scores = expected.get(*key)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(scores, expected_scores)
+    assert len(cache._service_frame) == len(SERVICES) + 20
+    assert cache._added_services == []
+
+
+def test_add_and_update_invalidate_the_category():
+    cache = ClusterRecommendations(SERVICES, INTERESTS)
+    cache.get("Algiers", 0)
+    cache.get("Oran", 1)
+    assert cache.add_service(provider(20_000, "painting")) == 1
+    cache.get("Algiers", 0)
+    assert cache.update_service(20_000, review_count=31) == 1
+    assert cache.update_service(20_000, review_count=31) == 0
+    assert ("Oran", 1) in cache._entries
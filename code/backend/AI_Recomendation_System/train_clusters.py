@@ -0,0 +1,210 @@
+"""
+Per-city user clustering, the nightly version of train_city_clusters in generating_data.ipynb.
+
+    python train_clusters.py --users user_data.csv --services service_data.csv --output recommendation_models.pkl
+
+For every city, KMeans is fitted for each k from 2 to min(max_clusters, users // min_samples_per_cluster)
+and the k with the best silhouette score is kept, as in the notebook. Differences:
+
+    - every (city, k) fit is a separate task of a process pool, the city features are
+      written once to a .npy file that the workers memory-map
+    - --algorithm minibatch uses MiniBatchKMeans
+    - the silhouette is computed on --silhouette-sample users (it is O(n^2) on all of them),
+      or --criterion calinski uses the Calinski-Harabasz index, which is O(n)
+    - every fit and sample uses --seed, the result does not depend on the number of workers
+    - the winning fit is reused instead of fitted a second time, and its KMeans is saved
+    - --categories data one-hot encodes the categories found in the users' interests and the
+      services (the app's, as in user_data.csv / service_data.csv) instead of the notebook's 23
+
+The output has the keys of recommendation_models.pkl ("city_clusters", "scalers",
+"encoders", "recommendations" when --services is given) plus "cluster_models" and
+"service_categories", so both main.py and ClusterAssigner can load it.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import calinski_harabasz_score, silhouette_score
+from sklearn.preprocessing import MultiLabelBinarizer, StandardScaler
+
+from recommendation_cache import ClusterRecommendations
+from recommender import load_services, load_users
+
+# SERVICE_CATEGORIES of generating_data.ipynb
+SERVICE_CATEGORIES = [
+    "Plumbing", "Electrical Work", "Painting and Decoration", "Masonry",
+    "Residential Cleaning", "Commercial Cleaning", "Post-Construction Cleaning",
+    "Taxi Services", "Furniture Moving", "Local Delivery Services",
+    "Car Repair and Maintenance", "Tire Services", "Car Wash",
+    "Traditional Algerian Catering", "Event Catering",
+    "Babysitting", "Elderly Companionship Services",
+    "Language Lessons", "Quranic Studies", "Academic Tutoring",
+    "Hairdressing", "Makeup Services", "Hammam and Spa Services"
+]
+
+
+def generate_city_features(city_users, categories=SERVICE_CATEGORIES):
+    """Same features as the notebook: location * 2, age, gender dummies, interests * 1.5, standardized."""
+    gender_encoded = pd.get_dummies(city_users["gender"], prefix="", prefix_sep="")
+    mlb = MultiLabelBinarizer(classes=categories)
+    service_interest_encoded = pd.DataFrame(mlb.fit_transform(city_users["service_categories_interest"]),
+                                            columns=categories)
+    features = pd.concat([
+        city_users[["location_x", "location_y"]] * 2,
+        city_users[["age"]],
+        gender_encoded,
+        service_interest_encoded * 1.5,
+    ], axis=1)
+    scaler = StandardScaler()
+    return scaler.fit_transform(features), scaler, mlb
+
+
+def fit_k(task):
+    """Fit one k on the memory-mapped features of a city and score it, runs in a pool worker."""
+    city, k, features_path, args = task
+    start = time.perf_counter()
+    features = np.load(features_path, mmap_mode="r")
+    if args["algorithm"] == "minibatch":
+        model = MiniBatchKMeans(n_clusters=k, random_state=args["seed"], n_init=args["n_init"],
+                                batch_size=args["batch_size"])
+    else:
+        model = KMeans(n_clusters=k, random_state=args["seed"], n_init=args["n_init"])
+    labels = model.fit_predict(features)
+
+    score = None
+    # Same validity rule as the notebook, every cluster must get users
+    if 2 <= k < len(labels) and len(np.unique(labels)) == k:
+        if args["criterion"] == "calinski":
+            score = calinski_harabasz_score(features, labels)
+        else:
+            sample = args["silhouette_sample"] if args["silhouette_sample"] < len(labels) else None
+            score = silhouette_score(features, labels, sample_size=sample, random_state=args["seed"])
+    return city, k, score, model, labels.astype(np.int32), time.perf_counter() - start
+
+
+def data_categories(user_df, service_df=None):
+    """Categories of the users' interests, then of the services, in first-seen order."""
+    categories = dict.fromkeys(c for interests in user_df["service_categories_interest"] for c in interests or ())
+    if service_df is not None:
+        categories.update(dict.fromkeys(service_df["service_category"]))
+    return list(categories)
+
+
+def train_city_clusters(user_df, args, workers=None, categories=SERVICE_CATEGORIES):
+    """
+    Returns ({city: users with a "cluster" column}, scalers, encoders, KMeans models, report).
+    """
+    start = time.perf_counter()
+    cities = {}
+    tasks = []
+    with tempfile.TemporaryDirectory() as feature_dir:
+        for i, city in enumerate(user_df["city"].unique()):
+            city_users = user_df[user_df["city"] == city].reset_index(drop=True)
+            features, scaler, encoder = generate_city_features(city_users, categories)
+            path = os.path.join(feature_dir, f"city_{i}.npy")
+            np.save(path, features)
+            potential_clusters = min(args["max_clusters"], len(city_users) // args["min_samples_per_cluster"])
+            cities[city] = {"users": city_users, "scaler": scaler, "encoder": encoder, "best": None,
+                            "fit_seconds": 0.0, "scores": {}}
+            tasks.extend((city, k, path, args) for k in range(2, potential_clusters + 1))
+            if potential_clusters < 2:
+                # Too few users to search, one fit with the notebook's default of 2 clusters
+                tasks.append((city, min(2, len(city_users)), path, args))
+
+        # Biggest cities first so the long fits do not end up last
+        tasks.sort(key=lambda task: -len(cities[task[0]]["users"]) * task[1])
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for city, k, score, model, labels, seconds in pool.map(fit_k, tasks):
+                entry = cities[city]
+                entry["fit_seconds"] += seconds
+                entry["scores"][k] = None if score is None else round(float(score), 4)
+                # Best score, ties keep the smaller k like the notebook's strict > over increasing k,
+                # and k=2 (the notebook's default) when no k gave a valid clustering
+                rank = (score is not None, score if score is not None else 0.0, -k)
+                if entry["best"] is None or rank > entry["best"][0]:
+                    entry["best"] = (rank, score, k, model, labels)
+
+    city_clusters, scalers, encoders, cluster_models, report = {}, {}, {}, {}, {}
+    for city, entry in cities.items():
+        _, score, k, model, labels = entry["best"]
+        entry["users"]["cluster"] = labels
+        city_clusters[city] = entry["users"]
+        scalers[city] = entry["scaler"]
+        encoders[city] = entry["encoder"]
+        cluster_models[city] = model
+        report[city] = {"users": len(labels), "chosen_k": k, "score": None if score is None else round(float(score), 4),
+                        "scores": entry["scores"], "fit_seconds": round(entry["fit_seconds"], 2)}
+    report["_total"] = {"wall_seconds": round(time.perf_counter() - start, 2), "tasks": len(tasks)}
+    return city_clusters, scalers, encoders, cluster_models, report
+
+
+def generate_service_recommendations(city_clusters, service_df, top_k=20):
+    """Top-k services of every city and cluster, generate_service_recommendations of the notebook."""
+    artifact = {"city_clusters": city_clusters, "recommendations": {}}
+    cache = ClusterRecommendations.from_artifact(artifact, service_df, top_k)
+    recommendations = {}
+    for city, cluster in cache.cluster_interests:
+        service_ids, scores = cache.get(city, cluster)
+        services = service_df.set_index("service_id").loc[service_ids].reset_index()
+        services["recommendation_score"] = scores
+        recommendations.setdefault(city, {})[cluster] = services
+    return recommendations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the per-city user clusters")
+    parser.add_argument("--users", required=True, help="user_data.csv or .json")
+    parser.add_argument("--services", help="service_data.csv or .json, to also precompute the per-cluster top-k")
+    parser.add_argument("--output", default="recommendation_models.pkl")
+    parser.add_argument("--report", help="Write the per-city report as JSON")
+    parser.add_argument("--max-clusters", type=int, default=10)
+    parser.add_argument("--min-samples-per-cluster", type=int, default=5)
+    parser.add_argument("--algorithm", choices=["kmeans", "minibatch"], default="kmeans")
+    parser.add_argument("--criterion", choices=["silhouette", "calinski"], default="silhouette")
+    parser.add_argument("--silhouette-sample", type=int, default=10000)
+    parser.add_argument("--n-init", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=4096, help="MiniBatchKMeans batch size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="Pool size, the number of CPUs by default")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--categories", choices=["notebook", "data"], default="notebook",
+                        help="Interest columns: the notebook's SERVICE_CATEGORIES or the ones in the data")
+    args = parser.parse_args()
+
+    user_df = load_users(args.users)
+    service_df = load_services(args.services) if args.services else None
+    categories = SERVICE_CATEGORIES if args.categories == "notebook" else data_categories(user_df, service_df)
+    settings = {name: getattr(args, name) for name in (
+        "max_clusters", "min_samples_per_cluster", "algorithm", "criterion", "silhouette_sample",
+        "n_init", "batch_size", "seed")}
+    city_clusters, scalers, encoders, cluster_models, report = train_city_clusters(user_df, settings, args.workers,
+                                                                                   categories)
+
+    print(f"\n{'city':<24} {'users':>8} {'k':>3} {'score':>10} {'fit s':>8}")
+    for city, row in report.items():
+        if city != "_total":
+            print(f"{city:<24} {row['users']:>8} {row['chosen_k']:>3} {str(row['score']):>10} {row['fit_seconds']:>8}")
+    print(f"Wall time: {report['_total']['wall_seconds']}s for {report['_total']['tasks']} fits")
+
+    artifact = {"city_clusters": city_clusters, "scalers": scalers, "encoders": encoders,
+                "cluster_models": cluster_models, "service_categories": categories}
+    if service_df is not None:
+        artifact["recommendations"] = generate_service_recommendations(city_clusters, service_df, args.top_k)
+    joblib.dump(artifact, args.output)
+    print(f"Models saved to {args.output}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+# Pool workers re-import this file on Windows, training must only start from here
+if __name__ == "__main__":
+    main()
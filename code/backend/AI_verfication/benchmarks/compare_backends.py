@@ -0,0 +1,164 @@
+"""
+Accuracy and latency of the ONNX Runtime YOLO backends against the PyTorch models.
+
+Run from code/backend/AI_verfication after export_onnx.py:
+
+    python -m benchmarks.compare_backends front_model --images path/to/front_photos
+    python -m benchmarks.compare_backends back_model --images path/to/back_photos --backends torch,onnx-int8
+
+The PyTorch predictions are the reference: for every other backend it reports the box
+precision/recall at IoU 0.5 (same class), the mean IoU of matched boxes and how often the
+set of detected classes (what detect_front_logos decides on) is identical. Latency is measured
+per image and per batch, on the CPU.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+os.environ.setdefault("INFERENCE_DEVICE", "cpu")
+
+import cv2
+import numpy as np
+
+from inference_backend import INFERENCE_THREADS, box_xyxy, configure_threads, load_yolo
+from benchmarks.fixtures import synthetic_back, synthetic_front
+
+
+def load_images(directory, limit):
+    if directory:
+        paths = sorted(
+            path for ext in ("*.jpg", "*.jpeg", "*.png") for path in glob.glob(os.path.join(directory, ext))
+        )[:limit]
+        images = [cv2.imread(path) for path in paths]
+        return [image for image in images if image is not None]
+    print("No --images given, using synthetic fixtures (latency only, accuracy is not meaningful)")
+    rng = np.random.default_rng(0)
+    return [synthetic_front(rng) if i % 2 == 0 else synthetic_back(rng) for i in range(limit)]
+
+
+def detections(result):
+    boxes = result.boxes
+    if boxes is None:
+        return []
+    return [(int(box.cls.item()), box_xyxy(box)) for box in boxes]
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def agreement(reference, candidate, threshold=0.5):
+    """Greedy same-class IoU matching of one image's boxes."""
+    matched, ious, used = 0, [], set()
+    for cls, ref_box in reference:
+        best, best_iou = None, threshold
+        for j, (other_cls, box) in enumerate(candidate):
+            if j in used or other_cls != cls:
+                continue
+            value = iou(ref_box, box)
+            if value >= best_iou:
+                best, best_iou = j, value
+        if best is not None:
+            used.add(best)
+            matched += 1
+            ious.append(best_iou)
+    same_classes = {cls for cls, _ in reference} == {cls for cls, _ in candidate}
+    return matched, len(reference), len(candidate), ious, same_classes
+
+
+def time_backend(model, images, batch_size, repeats):
+    single = []
+    for _ in range(repeats):
+        for image in images:
+            start = time.perf_counter()
+            model.predict(source=[image], save=False, imgsz=640, device="cpu", verbose=False)
+            single.append(time.perf_counter() - start)
+
+    batched = []
+    for _ in range(repeats):
+        for i in range(0, len(images), batch_size):
+            batch = images[i:i + batch_size]
+            start = time.perf_counter()
+            model.predict(source=batch, save=False, imgsz=640, device="cpu", verbose=False)
+            batched.append((time.perf_counter() - start) / len(batch))
+
+    single_ms = np.asarray(single) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(single_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(single_ms, 95)), 2),
+        "batched_ms_per_image": round(float(np.mean(batched) * 1000), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the YOLO inference backends")
+    parser.add_argument("model_dir", help="front_model or back_model")
+    parser.add_argument("--images", default=None, help="Directory of evaluation photos")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default="benchmarks/results")
+    args = parser.parse_args()
+
+    configure_threads()
+    images = load_images(args.images, args.limit)
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+
+    results, reference = {}, None
+    for backend in backends:
+        try:
+            model = load_yolo(args.model_dir, backend)
+        except (FileNotFoundError, ImportError) as e:
+            print(f"Skipping {backend}: {e}")
+            continue
+
+        # Warm-up outside the measurement
+        model.predict(source=images[:1], save=False, imgsz=640, device="cpu", verbose=False)
+        predictions = [
+            detections(model.predict(source=[image], save=False, imgsz=640, device="cpu", verbose=False)[0])
+            for image in images
+        ]
+        result = time_backend(model, images, args.batch_size, args.repeats)
+
+        if reference is None:
+            reference = predictions
+            result["reference"] = True
+        else:
+            matched = ref_total = cand_total = same = 0
+            ious = []
+            for ref, cand in zip(reference, predictions):
+                m, r, c, image_ious, same_classes = agreement(ref, cand)
+                matched, ref_total, cand_total = matched + m, ref_total + r, cand_total + c
+                ious.extend(image_ious)
+                same += same_classes
+            result.update({
+                "recall": round(matched / ref_total, 4) if ref_total else None,
+                "precision": round(matched / cand_total, 4) if cand_total else None,
+                "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+                "same_class_set": round(same / len(images), 4),
+            })
+        results[backend] = result
+        print(f"{backend}: {result}")
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"backends_{os.path.basename(args.model_dir)}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "model_dir": args.model_dir,
+            "images": len(images),
+            "threads": INFERENCE_THREADS,
+            "reference": backends[0] if backends else None,
+            "backends": results,
+        }, f, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
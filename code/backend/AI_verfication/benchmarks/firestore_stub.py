@@ -0,0 +1,214 @@
+import queue
+import sys
+import threading
+import types
+import uuid
+from datetime import datetime, timezone
+
+# Query.where operators, with Firestore's semantics for a missing field (never matches)
+OPERATORS = {
+    "==": lambda value, target: value == target,
+    "!=": lambda value, target: value != target,
+    "<": lambda value, target: value < target,
+    "<=": lambda value, target: value <= target,
+    ">": lambda value, target: value > target,
+    ">=": lambda value, target: value >= target,
+    "in": lambda value, target: value in target,
+    "not-in": lambda value, target: value not in target,
+    "array-contains": lambda value, target: isinstance(value, list) and target in value,
+    "array-contains-any": lambda value, target: isinstance(value, list) and any(t in value for t in target),
+}
+
+_MISSING = object()
+
+
+class StubDocument:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class StubDocumentReference:
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self):
+        with self.collection.lock:
+            data = self.collection.docs.get(self.id)
+        return StubDocument(self.id, data) if data is not None else None
+
+    def set(self, data):
+        self.collection._write(self.id, dict(data))
+
+    def delete(self):
+        self.collection._write(self.id, None)
+
+
+class StubDocumentChange:
+    def __init__(self, change_type, document):
+        self.type = types.SimpleNamespace(name=change_type)
+        self.document = document
+
+
+class StubWatch:
+    """Snapshot listener, delivers the changes in order on its own thread like Firestore."""
+
+    def __init__(self, collection, callback):
+        self.collection = collection
+        self.callback = callback
+        self._events = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"stub-watch-{collection.name}", daemon=True)
+        self._thread.start()
+
+    def push(self, changes):
+        self._events.put(changes)
+
+    def unsubscribe(self):
+        self.collection._unwatch(self)
+        self._events.put(None)
+
+    def _run(self):
+        while True:
+            changes = self._events.get()
+            if changes is None:
+                return
+            with self.collection.lock:
+                docs = [StubDocument(doc_id, data) for doc_id, data in self.collection.docs.items()]
+            try:
+                self.callback(docs, changes, datetime.now(timezone.utc))
+            except Exception as e:
+                print(f"Error in snapshot callback: {e}")
+
+
+class StubQuery:
+    def __init__(self, collection, filters=(), limit=None, fields=None):
+        self.collection = collection
+        self.filters = list(filters)
+        self._limit = limit
+        self.fields = fields
+
+    def where(self, field, op, value):
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown Firestore operator: {op}")
+        return StubQuery(self.collection, self.filters + [(field, op, value)], self._limit, self.fields)
+
+    def limit(self, count):
+        return StubQuery(self.collection, self.filters, count, self.fields)
+
+    def select(self, fields):
+        return StubQuery(self.collection, self.filters, self._limit, list(fields))
+
+    def stream(self):
+        with self.collection.lock:
+            items = list(self.collection.docs.items())
+        count = 0
+        for doc_id, data in items:
+            if all(_matches(data.get(field, _MISSING), op, value) for field, op, value in self.filters):
+                if self.fields is not None:
+                    data = {field: data[field] for field in self.fields if field in data}
+                yield StubDocument(doc_id, data)
+                count += 1
+                if self._limit is not None and count >= self._limit:
+                    return
+
+
+class StubCollection(StubQuery):
+    """In-memory collection with the subset of the Firestore API used by main.py and HashIndex."""
+
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+        self.lock = threading.Lock()
+        self._watches = []
+        super().__init__(self)
+
+    def add(self, data):
+        doc_id = uuid.uuid4().hex
+        self._write(doc_id, dict(data))
+        return None, StubDocumentReference(self, doc_id)
+
+    def document(self, doc_id=None):
+        return StubDocumentReference(self, doc_id or uuid.uuid4().hex)
+
+    def on_snapshot(self, callback):
+        """
+        Call callback(docs, changes, read_time) with the initial snapshot (every document
+        as ADDED), then once per write. Returns the watch, stop it with unsubscribe().
+        """
+        with self.lock:
+            watch = StubWatch(self, callback)
+            watch.push([StubDocumentChange("ADDED", StubDocument(doc_id, data)) for doc_id, data in self.docs.items()])
+            self._watches.append(watch)
+        return watch
+
+    def _write(self, doc_id, data):
+        # data None deletes the document. Changes are queued under the lock so every watch sees the writes in order.
+        with self.lock:
+            previous = self.docs.get(doc_id)
+            if data is None:
+                if previous is None:
+                    return
+                del self.docs[doc_id]
+                change = StubDocumentChange("REMOVED", StubDocument(doc_id, previous))
+            else:
+                self.docs[doc_id] = data
+                change = StubDocumentChange("MODIFIED" if previous is not None else "ADDED", StubDocument(doc_id, data))
+            for watch in self._watches:
+                watch.push([change])
+
+    def _unwatch(self, watch):
+        with self.lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+
+class StubFirestore:
+    def __init__(self):
+        self.collections = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self.collections:
+                self.collections[name] = StubCollection(name)
+            return self.collections[name]
+
+
+def _matches(value, op, target):
+    if value is _MISSING:
+        return False
+    try:
+        return OPERATORS[op](value, target)
+    except TypeError:
+        # Firestore only compares values of the same type
+        return False
+
+
+def install(client=None):
+    """
+    Replace firebase_admin in sys.modules so main.py can be imported without credentials
+    or network. Must be called before main is imported.
+
+    Returns:
+        StubFirestore: The client returned by firestore.client()
+    """
+    client = client or StubFirestore()
+
+    firebase_admin = types.ModuleType("firebase_admin")
+    credentials = types.ModuleType("firebase_admin.credentials")
+    firestore = types.ModuleType("firebase_admin.firestore")
+
+    credentials.Certificate = lambda path: path
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    firestore.client = lambda *args, **kwargs: client
+    firebase_admin.credentials = credentials
+    firebase_admin.firestore = firestore
+
+    sys.modules["firebase_admin"] = firebase_admin
+    sys.modules["firebase_admin.credentials"] = credentials
+    sys.modules["firebase_admin.firestore"] = firestore
+    return client
@@ -0,0 +1,95 @@
+import os
+
+import cv2
+import numpy as np
+
+# Fixture names looked up in --fixtures-dir, any missing one is generated
+FIXTURE_NAMES = ("front", "back", "selfie_closed", "selfie_open")
+
+
+def synthetic_front(rng, size=(1280, 800)):
+    """Card-shaped image with a photo area, logos and the two number fields."""
+    width, height = size
+    image = np.full((height, width, 3), 235, dtype=np.uint8)
+    cv2.rectangle(image, (40, 40), (width - 40, height - 40), (205, 215, 200), -1)
+    cv2.circle(image, (140, 130), 60, (40, 120, 40), -1)
+    cv2.circle(image, (width - 140, 130), 60, (40, 40, 160), -1)
+    _draw_face(image, (220, 420), 120, mouth_open=False)
+    id_number = "".join(str(d) for d in rng.integers(0, 10, 18))
+    compare_id = "".join(str(d) for d in rng.integers(0, 10, 9))
+    cv2.putText(image, id_number, (450, 560), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (20, 20, 20), 3)
+    cv2.putText(image, compare_id, (450, 660), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (20, 20, 20), 3)
+    return _add_noise(image, rng)
+
+
+def synthetic_back(rng, size=(1280, 800)):
+    """Card back with a machine-readable-zone like block of text."""
+    width, height = size
+    image = np.full((height, width, 3), 230, dtype=np.uint8)
+    cv2.rectangle(image, (40, 40), (width - 40, height - 40), (210, 210, 220), -1)
+    cv2.rectangle(image, (80, 80), (260, 200), (60, 60, 60), -1)
+    cv2.rectangle(image, (width - 260, 80), (width - 80, 200), (60, 60, 60), -1)
+    compare_id = "".join(str(d) for d in rng.integers(0, 10, 9))
+    lines = [f"IDDZA{compare_id}<<<<<<<<<<<<<<<", "9001011M3001019DZA<<<<<<<<<<<4", "DOE<<JOHN<<<<<<<<<<<<<<<<<<<<<"]
+    for i, line in enumerate(lines):
+        cv2.putText(image, line, (80, 520 + 80 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.3, (10, 10, 10), 3)
+    return _add_noise(image, rng)
+
+
+def synthetic_selfie(rng, mouth_open, size=(720, 960)):
+    width, height = size
+    image = np.full((height, width, 3), 180, dtype=np.uint8)
+    _draw_face(image, (width // 2, height // 2), 220, mouth_open=mouth_open)
+    return _add_noise(image, rng)
+
+
+def _draw_face(image, center, radius, mouth_open):
+    x, y = center
+    cv2.ellipse(image, (x, y), (int(radius * 0.8), radius), 0, 0, 360, (150, 180, 220), -1)
+    eye_dy, eye_dx = int(radius * 0.25), int(radius * 0.35)
+    for dx in (-eye_dx, eye_dx):
+        cv2.ellipse(image, (x + dx, y - eye_dy), (int(radius * 0.15), int(radius * 0.07)), 0, 0, 360, (255, 255, 255), -1)
+        cv2.circle(image, (x + dx, y - eye_dy), int(radius * 0.05), (40, 30, 20), -1)
+    cv2.line(image, (x, y - int(radius * 0.1)), (x, y + int(radius * 0.2)), (110, 140, 180), 3)
+    mouth_height = int(radius * 0.18) if mouth_open else int(radius * 0.03)
+    cv2.ellipse(image, (x, y + int(radius * 0.5)), (int(radius * 0.3), max(mouth_height, 2)), 0, 0, 360, (60, 40, 120), -1)
+
+
+def _add_noise(image, rng):
+    noise = rng.normal(0, 4, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def load_fixtures(fixtures_dir=None, seed=0):
+    """
+    Return the JPEG bytes of every fixture.
+
+    Real images named front/back/selfie_closed/selfie_open (.jpg or .png) in fixtures_dir
+    are used when present. Synthetic images only exercise the pipeline up to the first
+    rejection, real fixtures are needed to measure the successful path.
+    """
+    rng = np.random.default_rng(seed)
+    generators = {
+        "front": lambda: synthetic_front(rng),
+        "back": lambda: synthetic_back(rng),
+        "selfie_closed": lambda: synthetic_selfie(rng, mouth_open=False),
+        "selfie_open": lambda: synthetic_selfie(rng, mouth_open=True),
+    }
+
+    fixtures = {}
+    for name in FIXTURE_NAMES:
+        contents = None
+        if fixtures_dir:
+            for ext in (".jpg", ".jpeg", ".png"):
+                path = os.path.join(fixtures_dir, name + ext)
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        contents = f.read()
+                    break
+        if contents is None:
+            ok, encoded = cv2.imencode(".jpg", generators[name](), [cv2.IMWRITE_JPEG_QUALITY, 90])
+            if not ok:
+                raise RuntimeError(f"Could not encode fixture {name}")
+            contents = encoded.tobytes()
+        fixtures[name] = contents
+    return fixtures
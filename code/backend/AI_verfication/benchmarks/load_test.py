@@ -0,0 +1,325 @@
+"""
+Load test of the verification endpoints, in process and without network.
+
+The FastAPI app is driven through httpx's ASGI transport, Firestore is replaced by the
+in-memory stub (with a snapshot listener, so the ID index runs in its default listener
+mode) and inference runs on the CPU by default. Nothing is downloaded, but the model files
+are not in the repo and must already be on disk:
+
+    front_model/best.pt, back_model/best.pt    YOLO weights (best.onnx with INFERENCE_BACKEND=onnx)
+    shape_predictor_68_face_landmarks.dat      dlib 68 landmarks predictor
+    ~/.EasyOCR/model/craft_mlt_25k.pth,        EasyOCR detector and English recognizer
+    ~/.EasyOCR/model/english_g2.pth            (under $EASYOCR_MODULE_PATH/model when set)
+
+The script checks them first and exits naming the missing ones. Run from
+code/backend/AI_verfication, the model paths are relative:
+
+    python -m benchmarks.load_test --requests 50 --concurrency 4
+    python -m benchmarks.load_test --endpoints upload-back-id --baseline benchmarks/results/<run>.json
+
+Per endpoint it reports p50/p95/p99 latency, requests/s, peak RSS and the same percentiles
+for every pipeline step and executor stage, and writes them to a JSON file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# Offline, CPU-only defaults, set before main is imported
+os.environ.setdefault("INFERENCE_DEVICE", "cpu")
+os.environ.setdefault("ID_INDEX_SYNC", "listener")
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("FACE_EMBEDDINGS_DIR", os.path.join(tempfile.gettempdir(), "bench_face_embeddings"))
+
+from benchmarks import firestore_stub
+from benchmarks.fixtures import load_fixtures
+
+ENDPOINTS = ("upload-image", "upload-back-id", "compare-face")
+
+# Where easyocr.Reader looks for its models before downloading them
+EASYOCR_MODEL_DIR = os.path.join(os.environ.get("EASYOCR_MODULE_PATH", os.path.expanduser("~/.EasyOCR")), "model")
+EASYOCR_WEIGHTS = ("craft_mlt_25k.pth", "english_g2.pth")
+LANDMARKS_PATH = "shape_predictor_68_face_landmarks.dat"
+
+# Environment recorded with every run so results are only compared like for like
+RECORDED_ENV = (
+    "INFERENCE_DEVICE", "WORKER_POOL_SIZE", "STAGE_CONCURRENCY", "OCR_MODE",
+    "YOLO_MAX_BATCH_SIZE", "YOLO_MAX_WAIT_MS", "OCR_MAX_BATCH_SIZE", "OCR_MAX_WAIT_MS", "FRAME_GATES",
+    "ID_INDEX_SYNC",
+)
+
+
+class RssSampler:
+    """Samples the resident set size of the process to find the peak of each phase."""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def __enter__(self):
+        self.peak_kb = current_rss_kb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_kb = max(self.peak_kb, current_rss_kb())
+
+
+def current_rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class StepRecorder:
+    """Keeps every step/stage duration observed by the metrics histograms during a phase."""
+
+    def __init__(self, metrics):
+        self.samples = defaultdict(list)
+        for histogram, prefix in ((metrics.STEP_SECONDS, "step"), (metrics.STAGE_SECONDS, "stage")):
+            self._wrap(histogram, prefix)
+
+    def _wrap(self, histogram, prefix):
+        observe = histogram.observe
+
+        def recording_observe(value, *labels):
+            observe(value, *labels)
+            self.samples[f"{prefix}:{labels[0]}"].append(value)
+
+        histogram.observe = recording_observe
+
+    def take(self):
+        samples, self.samples = self.samples, defaultdict(list)
+        return samples
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    values_ms = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(values_ms, [50, 95, 99])
+    return {
+        "count": len(values),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "mean_ms": round(float(values_ms.mean()), 2),
+        "max_ms": round(float(values_ms.max()), 2),
+    }
+
+
+def request_builder(main, endpoint, fixtures):
+    """Return a function building the (path, files, data) of the i-th request of an endpoint."""
+    def jpeg(name):
+        return (f"{name}.jpg", fixtures[name], "image/jpeg")
+
+    if endpoint == "upload-image":
+        return lambda i: ("/upload-image/", {"file": jpeg("front")}, {})
+
+    if endpoint == "upload-back-id":
+        def build(i):
+            token = main.sessions.create(main.session_data(f"{i:018d}", f"{i:09d}"))
+            return "/upload-back-id/", {"file": jpeg("back")}, {"session_token": token}
+        return build
+
+    if endpoint == "compare-face":
+        embedding = np.random.default_rng(0).normal(0, 0.1, 128).astype(np.float32)
+
+        def build(i):
+            compare_id = f"{i:09d}"
+            token = main.sessions.create(dict(main.session_data(f"{i:018d}", compare_id), back_verified=True))
+            main.face_cache.put(token, embedding)
+            files = {"file1": jpeg("selfie_closed"), "file2": jpeg("selfie_open")}
+            return "/compare-face/", files, {"compare_id": compare_id, "session_token": token}
+        return build
+
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+async def run_phase(client, build, total, concurrency):
+    latencies = []
+    statuses = Counter()
+    messages = Counter()
+    next_index = iter(range(total))
+
+    async def worker():
+        for i in next_index:
+            path, files, data = build(i)
+            start = time.perf_counter()
+            response = await client.post(path, files=files, data=data)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+            try:
+                messages[response.json().get("message", "")] += 1
+            except ValueError:
+                messages["<non-JSON response>"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return latencies, wall, statuses, messages
+
+
+async def run(args):
+    import httpx
+
+    firestore_stub.install()
+    import main
+    import metrics
+
+    fixtures = load_fixtures(args.fixtures_dir, seed=args.seed)
+
+    start = time.perf_counter()
+    main.preload_models()
+    main.load_id_index()
+    startup_seconds = time.perf_counter() - start
+
+    recorder = StepRecorder(metrics)
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for endpoint in args.endpoints:
+            build = request_builder(main, endpoint, fixtures)
+            if args.warmup:
+                await run_phase(client, build, args.warmup, min(args.concurrency, args.warmup))
+            recorder.take()
+
+            with RssSampler() as rss:
+                latencies, wall, statuses, messages = await run_phase(client, build, args.requests, args.concurrency)
+
+            results[endpoint] = {
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "wall_seconds": round(wall, 3),
+                "requests_per_second": round(args.requests / wall, 2) if wall else None,
+                "latency": summarize(latencies),
+                "peak_rss_mb": round(rss.peak_kb / 1024, 1),
+                "status_codes": {str(code): count for code, count in statuses.items()},
+                "messages": dict(messages),
+                "stages": {name: summarize(values) for name, values in sorted(recorder.take().items())},
+            }
+            print_endpoint(endpoint, results[endpoint])
+
+    main.shutdown_executor()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "env": {name: os.environ.get(name) for name in RECORDED_ENV},
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "fixtures_dir": args.fixtures_dir,
+        },
+        "startup_seconds": round(startup_seconds, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "endpoints": results,
+    }
+
+
+def missing_model_files():
+    """Model files the app loads at startup that are not on disk."""
+    from inference_backend import resolve_backend, yolo_weights_path
+
+    paths = [yolo_weights_path(model_dir, resolve_backend(model_dir)) for model_dir in ("front_model", "back_model")]
+    paths.append(LANDMARKS_PATH)
+    paths.extend(os.path.join(EASYOCR_MODEL_DIR, name) for name in EASYOCR_WEIGHTS)
+    return [path for path in paths if not os.path.exists(path)]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_endpoint(endpoint, result):
+    latency = result["latency"]
+    print(f"\n{endpoint}: {result['requests_per_second']} req/s, "
+          f"p50 {latency.get('p50_ms')} ms, p95 {latency.get('p95_ms')} ms, p99 {latency.get('p99_ms')} ms, "
+          f"peak RSS {result['peak_rss_mb']} MB")
+    for name, stats in result["stages"].items():
+        print(f"  {name:<32} n={stats['count']:<5} p50 {stats['p50_ms']:>9} ms  p95 {stats['p95_ms']:>9} ms  "
+              f"p99 {stats['p99_ms']:>9} ms")
+    for message, count in result["messages"].items():
+        print(f"  {count:>5} x {message}")
+
+
+def print_comparison(current, baseline):
+    print(f"\nCompared with {baseline.get('git_commit')} ({baseline.get('timestamp')}):")
+    for endpoint, result in current["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            before, after = previous["latency"].get(key), result["latency"].get(key)
+            if before and after:
+                print(f"  {endpoint:<16} {key:<7} {before:>9} -> {after:>9} ms ({(after - before) / before:+.1%})")
+        before, after = previous.get("requests_per_second"), result.get("requests_per_second")
+        if before and after:
+            print(f"  {endpoint:<16} req/s   {before:>9} -> {after:>9}    ({(after - before) / before:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the verification endpoints")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                        help="Comma separated endpoints: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=50, help="Measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at the same time")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per endpoint")
+    parser.add_argument("--fixtures-dir", default=None,
+                        help="Directory with front/back/selfie_closed/selfie_open images, synthetic ones otherwise")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmarks/results", help="Directory of the JSON results")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON result to compare with")
+    args = parser.parse_args()
+
+    args.endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    unknown = [endpoint for endpoint in args.endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        parser.error(f"Unknown endpoints: {unknown}")
+
+    missing = missing_model_files()
+    if missing:
+        parser.exit(1, "Model files not found (run from code/backend/AI_verfication, see the module docstring):\n"
+                    + "".join(f"  {path}\n" for path in missing))
+
+    result = asyncio.run(run(args))
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"load_test_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
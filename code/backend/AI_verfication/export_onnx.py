@@ -0,0 +1,103 @@
+"""
+Export the front/back YOLO models to ONNX for the CPU inference backend.
+
+    python export_onnx.py front_model back_model
+    python export_onnx.py front_model back_model --int8 --calibration-dir uploaded_images
+
+Writes best.onnx (FP32, dynamic batch) next to each best.pt and, with --int8, best.int8.onnx.
+INT8 uses static QDQ quantization calibrated on real ID photos when --calibration-dir has
+images, and weight-only dynamic quantization otherwise.
+"""
+import argparse
+import glob
+import os
+import shutil
+
+import cv2
+import numpy as np
+
+from inference_backend import letterbox, yolo_weights_path
+
+
+def export_fp32(model_dir, imgsz=640, opset=12):
+    from ultralytics import YOLO
+
+    exported = YOLO(yolo_weights_path(model_dir, "torch")).export(
+        format="onnx", imgsz=imgsz, dynamic=True, simplify=True, opset=opset
+    )
+    target = yolo_weights_path(model_dir, "onnx")
+    if os.path.abspath(exported) != os.path.abspath(target):
+        shutil.move(exported, target)
+    print(f"Exported {target} ({os.path.getsize(target) / 1e6:.1f} MB)")
+    return target
+
+
+def calibration_images(directory, count):
+    paths = sorted(
+        path for ext in ("*.jpg", "*.jpeg", "*.png") for path in glob.glob(os.path.join(directory, ext))
+    )
+    return paths[:count]
+
+
+class LetterboxCalibrationReader:
+    """Feeds letterboxed calibration images to the ONNX Runtime static quantizer."""
+
+    def __init__(self, paths, input_name, imgsz=640):
+        self.paths = iter(paths)
+        self.input_name = input_name
+        self.imgsz = imgsz
+
+    def get_next(self):
+        for path in self.paths:
+            image = cv2.imread(path)
+            if image is None:
+                continue
+            padded, _, _ = letterbox(image, self.imgsz)
+            batch = padded[:, :, ::-1].transpose(2, 0, 1)[np.newaxis].astype(np.float32) / 255.0
+            return {self.input_name: np.ascontiguousarray(batch)}
+        return None
+
+    def rewind(self):
+        pass
+
+
+def export_int8(model_dir, calibration_dir=None, calibration_count=100, imgsz=640):
+    import onnxruntime
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    source = yolo_weights_path(model_dir, "onnx")
+    target = yolo_weights_path(model_dir, "onnx-int8")
+    paths = calibration_images(calibration_dir, calibration_count) if calibration_dir else []
+
+    if paths:
+        input_name = onnxruntime.InferenceSession(source, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        quantize_static(
+            source, target, LetterboxCalibrationReader(paths, input_name, imgsz),
+            quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+            per_channel=True,
+        )
+        print(f"Quantized {target} statically on {len(paths)} calibration images")
+    else:
+        print("No calibration images, using weight-only dynamic quantization")
+        quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+    print(f"Exported {target} ({os.path.getsize(target) / 1e6:.1f} MB)")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the YOLO models to ONNX")
+    parser.add_argument("model_dirs", nargs="+", help="Directories holding best.pt, e.g. front_model back_model")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--int8", action="store_true", help="Also write an INT8 quantized model")
+    parser.add_argument("--calibration-dir", default=None, help="Images used to calibrate the INT8 model")
+    parser.add_argument("--calibration-count", type=int, default=100)
+    args = parser.parse_args()
+
+    for model_dir in args.model_dirs:
+        export_fp32(model_dir, args.imgsz)
+        if args.int8:
+            export_int8(model_dir, args.calibration_dir, args.calibration_count, args.imgsz)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import face_recognition
+import numpy as np
+
+# Define mouth landmarks (indices from the shape_predictor_68_face_landmarks.dat model)
+MOUTH_POINTS = list(range(48, 68))
+
+# Mouth aspect ratio above which the mouth counts as open
+MAR_THRESHOLD = 0.5
+
+
+# Helper function to calculate mouth aspect ratio (MAR)
+def mouth_aspect_ratio(landmarks):
+    # Get the coordinates of the mouth landmarks
+    mouth = [(landmarks.part(i).x, landmarks.part(i).y) for i in MOUTH_POINTS]
+
+    # Calculate the vertical and horizontal distances
+    vertical_distance = (abs(mouth[2][1] - mouth[10][1]) + abs(mouth[4][1] - mouth[8][1])) / 2
+    horizontal_distance = abs(mouth[0][0] - mouth[6][0])
+
+    # Calculate the mouth aspect ratio (MAR)
+    mar = vertical_distance / horizontal_distance
+    return mar
+
+
+class FaceAnalysis:
+    """One detected face with its 68 landmarks and mouth aspect ratio."""
+
+    def __init__(self, rect, landmarks):
+        self.rect = rect
+        self.landmarks = landmarks
+        self.mar = mouth_aspect_ratio(landmarks)
+
+    def mouth_matches(self, expected_status):
+        if expected_status == "closed":
+            return self.mar <= MAR_THRESHOLD
+        if expected_status == "open":
+            return self.mar > MAR_THRESHOLD
+        return False
+
+
+def analyze_faces(image, detector, predictor):
+    """
+    Detect the faces of an image once and compute their landmarks once.
+
+    Args:
+        image (ImageContext): Decoded selfie
+        detector: dlib frontal face detector
+        predictor: dlib 68-point shape predictor
+
+    Returns:
+        list: FaceAnalysis for every detected face
+    """
+    gray = image.gray
+    return [FaceAnalysis(rect, predictor(gray, rect)) for rect in detector(gray)]
+
+
+def find_face_with_mouth_status(faces, expected_status):
+    for face in faces:
+        if face.mouth_matches(expected_status):
+            return face
+    return None
+
+
+def encode_face(image, face, num_jitters=1):
+    """
+    Compute the 128-d embedding of an already analyzed face.
+
+    The 68 landmarks of the analysis are passed to dlib's face recognition model, the one
+    face_recognition loaded, so neither the detector nor a landmark predictor runs again.
+    """
+    descriptor = face_recognition.api.face_encoder.compute_face_descriptor(image.rgb, face.landmarks, num_jitters)
+    return np.array(descriptor)
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from session_store import SESSION_TTL_SECONDS
+
+# ID-face embeddings live as long as the verification session they belong to
+FACE_CACHE_TTL_SECONDS = float(os.environ.get("FACE_CACHE_TTL_SECONDS", str(SESSION_TTL_SECONDS)))
+
+# Directory of the on-disk fallback, shared by the workers of one machine
+FACE_EMBEDDINGS_DIR = os.environ.get("FACE_EMBEDDINGS_DIR", "face_embeddings")
+
+
+class FaceEmbeddingCache:
+    """
+    TTL cache of the 128-d face embedding of each verification session's ID photo.
+
+    Entries are kept in memory and also written to FACE_EMBEDDINGS_DIR as a 512-byte
+    float32 .npy file, so a /compare-face/ request handled by another worker (or after the
+    in-memory entry was dropped) still finds the embedding without re-encoding the ID face.
+    """
+
+    def __init__(self, ttl_seconds=FACE_CACHE_TTL_SECONDS, directory=FACE_EMBEDDINGS_DIR):
+        self.ttl_seconds = ttl_seconds
+        self.directory = directory
+        self._entries = {}  # key -> (expires_at, embedding)
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, key, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32)
+
+        # Drop abandoned sessions once per TTL period
+        if time.time() - self._last_purge > self.ttl_seconds:
+            self._last_purge = time.time()
+            self.purge_expired()
+
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, embedding)
+
+        # Write to a temporary file first so readers never see a partial file
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, embedding)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        """Return the embedding, or None if it is unknown or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    return entry[1]
+                del self._entries[key]
+
+        path = self._path(key)
+        try:
+            expires_at = os.path.getmtime(path) + self.ttl_seconds
+            if expires_at < now:
+                os.remove(path)
+                return None
+            embedding = np.load(path)
+        except (OSError, ValueError):
+            return None
+
+        with self._lock:
+            self._entries[key] = (expires_at, embedding)
+        return embedding
+
+    def touch(self, key):
+        """Restart the TTL of an entry, called whenever its verification session is updated."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (now + self.ttl_seconds, entry[1])
+        try:
+            # Other workers derive the expiry from the file's mtime
+            os.utime(self._path(key), (now, now))
+        except OSError:
+            pass
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (expires_at, _) in self._entries.items() if expires_at < now]:
+                del self._entries[key]
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) + self.ttl_seconds < now:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _path(self, key):
+        # Session tokens are URL-safe base64, basename() guards against anything else
+        return os.path.join(self.directory, f"{os.path.basename(key)}.npy")
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from metrics import STEP_SECONDS
+
+# Gates run in this order (cheapest first), remove one from the list to disable it
+FRAME_GATES = [
+    gate.strip()
+    for gate in os.environ.get("FRAME_GATES", "resolution,exposure,blur,classifier").split(",")
+    if gate.strip()
+]
+
+# Resolution gate: shortest side of the frame in pixels
+MIN_FRAME_SIDE = int(os.environ.get("MIN_FRAME_SIDE", "480"))
+
+# Exposure gate: mean grayscale level and share of clipped (near black/white) pixels
+MIN_MEAN_BRIGHTNESS = float(os.environ.get("MIN_MEAN_BRIGHTNESS", "40"))
+MAX_MEAN_BRIGHTNESS = float(os.environ.get("MAX_MEAN_BRIGHTNESS", "220"))
+MAX_CLIPPED_FRACTION = float(os.environ.get("MAX_CLIPPED_FRACTION", "0.4"))
+
+# Blur gate: variance of the Laplacian, measured at BLUR_CHECK_WIDTH so it does not depend on resolution
+MIN_BLUR_VARIANCE = float(os.environ.get("MIN_BLUR_VARIANCE", "50"))
+BLUR_CHECK_WIDTH = 640
+
+# Classifier gate: MobileNet with_id/without_id model from train_model_for_client_side
+ID_CLASSIFIER_PATH = os.environ.get("ID_CLASSIFIER_PATH", "train_model_for_client_side/mobilenet_model.onnx")
+MIN_WITH_ID_PROBABILITY = float(os.environ.get("MIN_WITH_ID_PROBABILITY", "0.5"))
+# ImageFolder sorts the class folders, so "with_id" is class 0 and "without_id" class 1
+CLASSIFIER_WITH_ID_INDEX = int(os.environ.get("CLASSIFIER_WITH_ID_INDEX", "0"))
+
+# Same resize and normalization as val_transform in train_model_for_client_side/classifier.py
+CLASSIFIER_IMAGE_SIZE = 224
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+REJECTION_MESSAGES = {
+    "resolution": "Image resolution too low. Please retake the picture.",
+    "exposure": "Image too dark or too bright. Please retake the picture in better light.",
+    "blur": "Image too blurry. Hold the phone still and retake the picture.",
+    "classifier": "No ID card detected. Please place your ID inside the frame.",
+}
+
+
+def check_resolution(image, classifier=None):
+    height, width = image.shape[:2]
+    shortest_side = min(height, width)
+    return shortest_side >= MIN_FRAME_SIDE, shortest_side
+
+
+def check_exposure(image, classifier=None):
+    gray = image.gray
+    mean = float(gray.mean())
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    clipped = float(hist[:10].sum() + hist[246:].sum()) / gray.size
+    ok = MIN_MEAN_BRIGHTNESS <= mean <= MAX_MEAN_BRIGHTNESS and clipped <= MAX_CLIPPED_FRACTION
+    return ok, round(mean, 1)
+
+
+def check_blur(image, classifier=None):
+    gray = image.gray
+    if gray.shape[1] > BLUR_CHECK_WIDTH:
+        scale = BLUR_CHECK_WIDTH / gray.shape[1]
+        gray = cv2.resize(gray, (BLUR_CHECK_WIDTH, int(gray.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    variance = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    return variance >= MIN_BLUR_VARIANCE, round(variance, 1)
+
+
+def preprocess_for_classifier(rgb):
+    # Resize((224, 224)) + ToTensor() + Normalize(), as the classifier was trained with.
+    # torchvision resizes PIL images with PIL's bilinear filter, which antialiases when it
+    # downscales. cv2.INTER_LINEAR does not, camera frames would not look like the training images.
+    resized = Image.fromarray(rgb).resize((CLASSIFIER_IMAGE_SIZE, CLASSIFIER_IMAGE_SIZE), Image.BILINEAR)
+    resized = np.asarray(resized, dtype=np.float32) / 255.0
+    normalized = (resized - IMAGENET_MEAN) / IMAGENET_STD
+    return np.ascontiguousarray(normalized.transpose(2, 0, 1)[np.newaxis])
+
+
+def check_classifier(image, classifier):
+    session = classifier()
+    inputs = {session.get_inputs()[0].name: preprocess_for_classifier(image.rgb)}
+    logits = session.run(None, inputs)[0][0]
+    exp = np.exp(logits - logits.max())
+    probability = float(exp[CLASSIFIER_WITH_ID_INDEX] / exp.sum())
+    return probability >= MIN_WITH_ID_PROBABILITY, round(probability, 3)
+
+
+GATE_CHECKS = {
+    "resolution": check_resolution,
+    "exposure": check_exposure,
+    "blur": check_blur,
+    "classifier": check_classifier,
+}
+
+
+class FrameGate:
+    """
+    Cheap checks run on a frame before the YOLO + OCR pipeline.
+
+    Each gate returns quickly for frames that are too small, badly exposed, blurry or
+    contain no ID card (MobileNet classifier), so those frames never reach YOLO or EasyOCR.
+    Per-gate counters record how many frames each gate checked and rejected and the time
+    it spent, to show what every gate saves.
+    """
+
+    def __init__(self, gates=None, classifier=None):
+        """
+        Args:
+            gates (list): Names of the gates to run, in order
+            classifier (callable): Returns the ONNX Runtime session of the ID classifier,
+                the classifier gate is skipped when it is None
+        """
+        gates = FRAME_GATES if gates is None else gates
+        unknown = [gate for gate in gates if gate not in GATE_CHECKS]
+        if unknown:
+            raise ValueError(f"Unknown frame gates: {unknown}")
+        if "classifier" in gates and classifier is None:
+            print("ID classifier not available, the classifier gate is disabled")
+            gates = [gate for gate in gates if gate != "classifier"]
+        self.gates = gates
+        self.classifier = classifier
+        self._lock = threading.Lock()
+        self._stats = {gate: {"checked": 0, "rejected": 0, "seconds": 0.0} for gate in gates}
+        self._passed = 0
+
+    def check(self, image):
+        """
+        Run the gates on a decoded frame.
+
+        Returns:
+            tuple: (passed, rejected_by, value) where rejected_by is the name of the first
+            failing gate and value the measurement it rejected
+        """
+        for gate in self.gates:
+            start = time.perf_counter()
+            ok, value = GATE_CHECKS[gate](image, self.classifier)
+            elapsed = time.perf_counter() - start
+            STEP_SECONDS.observe(elapsed, f"gate_{gate}")
+            with self._lock:
+                stats = self._stats[gate]
+                stats["checked"] += 1
+                stats["seconds"] += elapsed
+                if not ok:
+                    stats["rejected"] += 1
+            if not ok:
+                print(f"Frame rejected by {gate} gate ({value})")
+                return False, gate, value
+        with self._lock:
+            self._passed += 1
+        return True, None, None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "gates": {gate: dict(stats) for gate, stats in self._stats.items()},
+                "passed": self._passed,
+            }
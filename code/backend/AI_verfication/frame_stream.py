@@ -0,0 +1,38 @@
+import asyncio
+
+
+class LatestFrameSlot:
+    """
+    Single-frame buffer between the WebSocket receiver and the verification pipeline.
+
+    put() replaces the pending frame instead of queueing it, so the pipeline always picks
+    up the newest frame and stale frames are dropped (and counted) instead of piling up.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._event = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self.received += 1
+        self._event.set()
+
+    def close(self):
+        self.closed = True
+        self._event.set()
+
+    async def get(self):
+        """Wait for the newest frame, returns None once the stream is closed and drained."""
+        while self._frame is None:
+            if self.closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        frame, self._frame = self._frame, None
+        return frame
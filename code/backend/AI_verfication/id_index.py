@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from collections import Counter
+
+# How the index follows writes made by other workers: "listener" (Firestore on_snapshot),
+# "refresh" (reload every ID_INDEX_REFRESH_SECONDS) or "off" (startup load and local writes only)
+ID_INDEX_SYNC = os.environ.get("ID_INDEX_SYNC", "listener")
+ID_INDEX_REFRESH_SECONDS = float(os.environ.get("ID_INDEX_REFRESH_SECONDS", "60"))
+
+HASH_FIELDS = ("id_number", "compare_id")
+
+
+class HashIndex:
+    """
+    Local membership index of the hashed id_number / compare_id values in Metadata.
+
+    The index counts the documents holding each SHA-256 digest (32 bytes) per field, and
+    remembers the digests of every document id, so a removed or modified document only
+    drops a digest no other document still has. In listener mode it is built from the
+    listener's initial snapshot and kept in sync by the changes that follow. Otherwise it
+    is built by streaming the collection and, in refresh mode, rebuilt periodically.
+    Digests added by this process stay in the index until a document holding them has
+    been seen, so a load that streamed past them does not lose them. Until the first
+    snapshot or load completes every lookup is a possible match. A negative answer skips
+    the Firestore query. A positive answer must still be confirmed with Firestore by the
+    caller.
+
+    The collection only needs stream() (and on_snapshot() for the listener mode), so a
+    Firestore emulator client (FIRESTORE_EMULATOR_HOST) or an in-memory stub works too.
+    """
+
+    def __init__(self, collection, sync=ID_INDEX_SYNC, refresh_seconds=ID_INDEX_REFRESH_SECONDS):
+        self.collection = collection
+        self.sync = sync
+        self.refresh_seconds = refresh_seconds
+        self.ready = False
+        self._docs = {}  # document id -> digest of each field (None when missing)
+        self._counts = {field: Counter() for field in HASH_FIELDS}
+        self._local = {field: set() for field in HASH_FIELDS}  # written here, not seen in a document yet
+        self._lock = threading.Lock()
+        self._watch = None
+        self._stop = threading.Event()
+        self._refresh_thread = None
+
+    def load(self):
+        """Rebuild the index from the whole collection."""
+        start = time.perf_counter()
+        docs = {}
+        counts = {field: Counter() for field in HASH_FIELDS}
+        query = self.collection.select(list(HASH_FIELDS)) if hasattr(self.collection, "select") else self.collection
+        for doc in query.stream():
+            digests = docs[doc.id] = _digests(doc.to_dict() or {})
+            _count(counts, digests, 1)
+        with self._lock:
+            self._docs, self._counts = docs, counts
+            for field in HASH_FIELDS:
+                # Local writes the stream passed before they were made stay local
+                self._local[field] -= counts[field].keys()
+            self.ready = True
+        print(f"Loaded ID index with {len(counts['id_number'])} records in {time.perf_counter() - start:.2f}s")
+
+    def start(self):
+        """Load the index and start following changes according to the sync mode."""
+        if self.sync == "listener":
+            try:
+                # The initial snapshot delivers every document, it is the initial load
+                self._watch = self.collection.on_snapshot(self._on_snapshot)
+                return
+            except Exception as e:
+                print(f"Could not start ID index listener, refreshing periodically instead: {e}")
+                self.sync = "refresh"
+
+        try:
+            self.load()
+        except Exception as e:
+            print(f"Could not load ID index, falling back to Firestore queries: {e}")
+            return
+
+        if self.sync == "refresh":
+            self._refresh_thread = threading.Thread(target=self._refresh_loop, name="id-index-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def add(self, hashed_id_number, hashed_compare_id):
+        """Record a Metadata document written by this process."""
+        digests = _digests({"id_number": hashed_id_number, "compare_id": hashed_compare_id})
+        with self._lock:
+            for field, digest in zip(HASH_FIELDS, digests):
+                if digest is not None and digest not in self._counts[field]:
+                    self._local[field].add(digest)
+
+    def might_contain(self, field, hashed_value):
+        """False means the value is not in Firestore, True must be confirmed with a query."""
+        if not self.ready:
+            return True
+        digest = _to_digest(hashed_value)
+        with self._lock:
+            return digest in self._counts[field] or digest in self._local[field]
+
+    def size(self):
+        """Distinct digests per field."""
+        with self._lock:
+            return {field: len(self._counts[field]) + len(self._local[field] - self._counts[field].keys())
+                    for field in HASH_FIELDS}
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # The first call lists every document of the collection as ADDED
+        first = not self.ready
+        with self._lock:
+            for change in changes:
+                doc_id = change.document.id
+                # A modified document first gives back the digests it had
+                _count(self._counts, self._docs.pop(doc_id, (None,) * len(HASH_FIELDS)), -1)
+                if change.type.name != "REMOVED":
+                    digests = self._docs[doc_id] = _digests(change.document.to_dict() or {})
+                    _count(self._counts, digests, 1)
+                    for field, digest in zip(HASH_FIELDS, digests):
+                        self._local[field].discard(digest)
+            self.ready = True
+        if first:
+            print(f"Loaded ID index with {len(self._counts['id_number'])} records from the initial snapshot")
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_seconds):
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Error refreshing ID index: {e}")
+
+
+def _digests(data):
+    return tuple(_to_digest(data.get(field)) for field in HASH_FIELDS)
+
+
+def _count(counts, digests, delta):
+    for field, digest in zip(HASH_FIELDS, digests):
+        if digest is None:
+            continue
+        counts[field][digest] += delta
+        if counts[field][digest] <= 0:
+            del counts[field][digest]
+
+
+def _to_digest(hex_value):
+    if not hex_value:
+        return None
+    try:
+        return bytes.fromhex(hex_value)
+    except (TypeError, ValueError):
+        return None
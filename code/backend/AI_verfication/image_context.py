@@ -0,0 +1,66 @@
+import os
+
+import cv2
+import numpy as np
+
+# Write uploads to disk for debugging (off by default, uploads are processed in memory)
+DEBUG_SAVE_IMAGES = os.environ.get("DEBUG_SAVE_IMAGES", "0") == "1"
+
+
+class ImageContext:
+    """
+    A decoded upload shared by every stage of a request.
+
+    The JPEG/PNG bytes are decoded once with cv2.imdecode. Derived views (grayscale, RGB)
+    are computed on first access and cached, so the detection, OCR and face stages all
+    work on the same arrays instead of reading the file from disk again.
+    """
+
+    def __init__(self, image, name="upload"):
+        self.bgr = image
+        self.name = name
+        self._gray = None
+        self._rgb = None
+
+    @classmethod
+    def from_bytes(cls, contents, name="upload"):
+        """
+        Decode uploaded image bytes.
+
+        Raises:
+            ValueError: If the bytes are not a decodable image
+        """
+        image = cv2.imdecode(np.frombuffer(contents, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Could not decode image {name}")
+        return cls(image, name)
+
+    @property
+    def shape(self):
+        return self.bgr.shape
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            # face_recognition expects a contiguous RGB array
+            self._rgb = np.ascontiguousarray(cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB))
+        return self._rgb
+
+
+def save_debug_image(directory, filename, contents):
+    """Write the raw upload to directory when DEBUG_SAVE_IMAGES is enabled."""
+    if not DEBUG_SAVE_IMAGES:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    # Never trust the client-supplied filename as a path
+    path = os.path.join(directory, os.path.basename(filename or "upload.jpg"))
+    with open(path, "wb") as buffer:
+        buffer.write(contents)
+    print(f"Saved debug image to {path}")
+    return path
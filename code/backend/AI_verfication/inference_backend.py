@@ -0,0 +1,199 @@
+import os
+
+import cv2
+import numpy as np
+
+# "auto" picks the first CUDA device when torch sees one and the CPU otherwise
+INFERENCE_DEVICE_SETTING = os.environ.get("INFERENCE_DEVICE", "auto")
+
+# "torch" runs the ultralytics .pt models, "onnx" / "onnx-int8" the exported ONNX Runtime models
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "auto")
+
+# Intra-op threads of each inference call. The front and back YOLO batchers and the OCR
+# stage run at the same time, so by default each gets a share of the cores.
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+# Same defaults as ultralytics predict()
+YOLO_CONF_THRESHOLD = float(os.environ.get("YOLO_CONF_THRESHOLD", "0.25"))
+YOLO_IOU_THRESHOLD = float(os.environ.get("YOLO_IOU_THRESHOLD", "0.7"))
+YOLO_MAX_DETECTIONS = 300
+
+
+def resolve_device(setting=INFERENCE_DEVICE_SETTING):
+    """Return "cpu" or a CUDA device index as used by ultralytics ("0")."""
+    if setting != "auto":
+        return setting
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return "0"
+    except ImportError:
+        pass
+    return "cpu"
+
+
+INFERENCE_DEVICE = resolve_device()
+
+
+def resolve_backend(model_dir, setting=INFERENCE_BACKEND, device=INFERENCE_DEVICE):
+    # PyTorch on GPU, ONNX Runtime on CPU replicas when the model has been exported
+    if setting != "auto":
+        return setting
+    if device == "cpu" and os.path.exists(yolo_weights_path(model_dir, "onnx")):
+        return "onnx"
+    return "torch"
+
+
+def configure_threads(threads=INFERENCE_THREADS):
+    """Limit the intra-op threads of torch and OpenCV in this process."""
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def yolo_weights_path(model_dir, backend):
+    if backend == "torch":
+        return os.path.join(model_dir, "best.pt")
+    if backend == "onnx":
+        return os.path.join(model_dir, "best.onnx")
+    if backend == "onnx-int8":
+        return os.path.join(model_dir, "best.int8.onnx")
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+
+def letterbox(image, size=640, color=(114, 114, 114)):
+    """
+    Resize keeping the aspect ratio and pad to a size x size square, as ultralytics does.
+
+    Returns:
+        tuple: (padded image, scale, (pad_x, pad_y))
+    """
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_width) / 2, (size - new_height) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    padded = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return padded, scale, (left, top)
+
+
+class DetectionBoxes:
+    """
+    Detected boxes of one image, with the fields the endpoints read from ultralytics Boxes:
+    iterating yields one-box DetectionBoxes, cls.item() is the class and xyxy[0] the box.
+    """
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.cls)
+
+    def __iter__(self):
+        for i in range(len(self.cls)):
+            yield DetectionBoxes(self.xyxy[i:i + 1], self.conf[i:i + 1], self.cls[i:i + 1])
+
+
+class DetectionResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class OnnxYoloDetector:
+    """
+    YOLOv8 detector exported to ONNX, run with ONNX Runtime on the CPU.
+
+    The session is created with INFERENCE_THREADS intra-op threads. Images of one predict()
+    call are letterboxed and run as a single batch when the model has a dynamic batch
+    dimension (export_onnx.py exports it that way), one by one otherwise.
+    """
+
+    def __init__(self, path, threads=INFERENCE_THREADS, imgsz=640):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        batch_dim = self.session.get_inputs()[0].shape[0]
+        self.dynamic_batch = not isinstance(batch_dim, int)
+        self.imgsz = imgsz
+        self.path = path
+
+    def predict(self, source, conf=YOLO_CONF_THRESHOLD, iou=YOLO_IOU_THRESHOLD, **kwargs):
+        """Same call as the ultralytics model, extra ultralytics arguments are ignored."""
+        images = source if isinstance(source, list) else [source]
+        batch, transforms = [], []
+        for image in images:
+            padded, scale, pad = letterbox(image, self.imgsz)
+            # BGR HWC uint8 -> RGB CHW float in [0, 1]
+            batch.append(padded[:, :, ::-1].transpose(2, 0, 1))
+            transforms.append((scale, pad, image.shape[:2]))
+        batch = np.ascontiguousarray(np.stack(batch), dtype=np.float32) / 255.0
+
+        if self.dynamic_batch:
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            outputs = np.concatenate(
+                [self.session.run(None, {self.input_name: batch[i:i + 1]})[0] for i in range(len(batch))]
+            )
+
+        return [
+            DetectionResult(postprocess(output, transform, conf, iou))
+            for output, transform in zip(outputs, transforms)
+        ]
+
+
+def postprocess(output, transform, conf_threshold, iou_threshold):
+    """Turn one (4 + classes, anchors) YOLOv8 output into boxes in original image coordinates."""
+    predictions = output.T
+    scores = predictions[:, 4:]
+    cls = scores.argmax(axis=1)
+    conf = scores[np.arange(len(scores)), cls]
+    keep = conf >= conf_threshold
+    predictions, cls, conf = predictions[keep], cls[keep], conf[keep]
+
+    cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+    xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    if len(xyxy):
+        # Per-class NMS: offset the boxes of each class so they never overlap
+        offset = cls[:, None] * 4096.0
+        shifted = xyxy + offset
+        boxes_xywh = np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1)
+        indices = cv2.dnn.NMSBoxes(boxes_xywh.tolist(), conf.tolist(), conf_threshold, iou_threshold)
+        indices = np.array(indices, dtype=int).reshape(-1)[:YOLO_MAX_DETECTIONS]
+        xyxy, conf, cls = xyxy[indices], conf[indices], cls[indices]
+
+    scale, (pad_x, pad_y), (height, width) = transform
+    xyxy = (xyxy - [pad_x, pad_y, pad_x, pad_y]) / scale
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, width)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, height)
+    return DetectionBoxes(xyxy.astype(np.float32), conf.astype(np.float32), cls.astype(np.float32))
+
+
+def box_xyxy(box):
+    """Coordinates of a single box as a numpy array, for ultralytics and ONNX results alike."""
+    xyxy = box.xyxy[0]
+    return xyxy.cpu().numpy() if hasattr(xyxy, "cpu") else np.asarray(xyxy)
+
+
+def load_yolo(model_dir, backend):
+    path = yolo_weights_path(model_dir, backend)
+    if backend == "torch":
+        from ultralytics import YOLO
+        return YOLO(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found, export it with: python export_onnx.py {model_dir}")
+    return OnnxYoloDetector(path)
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import BATCH_SIZE, timed
+
+# Upper bound on the number of images sent to one predict call
+YOLO_MAX_BATCH_SIZE = int(os.environ.get("YOLO_MAX_BATCH_SIZE", "8"))
+
+# How long the first request of a batch waits for others to join it
+YOLO_MAX_WAIT_MS = float(os.environ.get("YOLO_MAX_WAIT_MS", "10"))
+
+
+class InferenceBatcher:
+    """
+    Collects concurrent inference requests for one model into batched calls.
+
+    Requests are queued by submit(). A worker thread takes the first queued request, waits
+    up to max_wait_ms for more requests (or until max_batch_size is reached), runs
+    predict_fn once on the whole batch and hands every result back to its own request.
+    Under low load a request only pays max_wait_ms extra, under high load each predict
+    call serves up to max_batch_size requests.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=YOLO_MAX_BATCH_SIZE, max_wait_ms=YOLO_MAX_WAIT_MS, name="batcher"):
+        """
+        Args:
+            predict_fn (callable): Takes a list of inputs and returns a list of results in the same order
+            max_batch_size (int): Maximum number of inputs per predict_fn call
+            max_wait_ms (float): Maximum time to wait for a batch to fill up
+            name (str): Name used in log messages and for the worker thread
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=f"{name}-worker", daemon=True)
+        self._worker.start()
+
+    def submit_future(self, item):
+        """Queue one input and return a concurrent.futures.Future for its result."""
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def submit(self, item, timeout=None):
+        """Queue one input and block until its result is ready."""
+        return self.submit_future(item).result(timeout=timeout)
+
+    async def submit_async(self, item):
+        """Queue one input and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit_future(item))
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                # Put the sentinel back so the loop stops after this batch
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            BATCH_SIZE.observe(len(items), self.name)
+            try:
+                with timed(self.name):
+                    results = list(self.predict_fn(items))
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name} returned {len(results)} results for {len(items)} inputs")
+            except Exception as e:
+                print(f"Error in {self.name} batch of {len(items)}: {e}")
+                for future in futures:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                if not future.cancelled():
+                    future.set_result(result)
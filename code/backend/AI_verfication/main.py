@@ -1,21 +1,33 @@
 import os
-import shutil
+import asyncio
+import time
 import cv2
-from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.responses import JSONResponse
-from ultralytics import YOLO
+from fastapi import FastAPI, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 import face_recognition
 from PIL import Image
 import warnings
-import easyocr
 import numpy as np
 import re
 from datetime import datetime
 import torch  # Import torch to manage GPU memory
-import dlib  # Import dlib for facial landmark detection
 import firebase_admin
 from firebase_admin import credentials, firestore
 import hashlib  # Import hashlib for hashing
+from model_manager import create_model_manager, PRELOAD_MODELS
+from inference_backend import INFERENCE_DEVICE, box_xyxy
+from inference_batcher import InferenceBatcher
+from stage_executor import StageExecutor
+from session_store import create_session_store
+from image_context import ImageContext, save_debug_image
+from id_index import HashIndex
+from face_cache import FaceEmbeddingCache
+from face_analysis import analyze_faces, find_face_with_mouth_status, encode_face
+from number_ocr import OCR_MODE, OCR_FALLBACK_READTEXT, OCR_MAX_BATCH_SIZE, OCR_MAX_WAIT_MS, recognize_crops
+from frame_gate import FrameGate, REJECTION_MESSAGES
+from frame_stream import LatestFrameSlot
+import metrics
+from metrics import timed, count_rejection
 
 # Initialize Firebase Admin SDK
 cred = credentials.Certificate("firebase-adminsdk-key.json")
@@ -25,83 +37,143 @@ db = firestore.client()
 # Suppress the FutureWarning for torch.load
 warnings.filterwarnings("ignore")
 
-# Load your trained YOLO models
-model = YOLO("front_model/best.pt")
-# Remove the loading of the second model from here
-# model_back = YOLO("back_model/best.pt")  # Load the second model for back ID
+# YOLO models, EasyOCR reader, Haar cascade and dlib detector/predictor stay resident
+# in the model manager instead of being loaded per request
+models = create_model_manager()
 
-# Initialize EasyOCR reader for English text, force use of CPU
-ocr_reader = easyocr.Reader(['en'], gpu=True)
+# Concurrent uploads for the same YOLO model are grouped into one batched predict call
+def yolo_batch_predict(model_name):
+    def predict(sources):
+        return models.get(model_name).predict(source=sources, save=False, imgsz=640, device=INFERENCE_DEVICE, verbose=False)
+    return predict
+
+yolo_batchers = {
+    "front_yolo": InferenceBatcher(yolo_batch_predict("front_yolo"), name="front_yolo"),
+    "back_yolo": InferenceBatcher(yolo_batch_predict("back_yolo"), name="back_yolo"),
+}
+
+# ID number crops from concurrent uploads are recognized together, without text detection
+ocr_batcher = InferenceBatcher(
+    lambda crops: recognize_crops(models.get("ocr_reader"), crops),
+    max_batch_size=OCR_MAX_BATCH_SIZE, max_wait_ms=OCR_MAX_WAIT_MS, name="number_ocr"
+)
+
+# Blurry, badly exposed, low resolution or ID-less frames are rejected before YOLO + OCR
+frame_gate = FrameGate(
+    classifier=(lambda: models.get("id_classifier")) if models.is_registered("id_classifier") else None
+)
+
+# Blocking CV/OCR/Firestore work runs here so the event loop only handles I/O
+executor = StageExecutor()
+
+# Local index of the hashed IDs in Metadata, Firestore is only queried to confirm a hit
+id_index = HashIndex(db.collection('Metadata'))
+
+# Front-to-back-to-selfie state, keyed by the session token returned from /upload-image/
+sessions = create_session_store()
 
 app = FastAPI()
 
-# Load the Haar Cascade for face detection
-face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+@app.on_event("startup")
+def preload_models():
+    # Load and warm up the models before the first request arrives
+    models.preload(PRELOAD_MODELS)
 
-# Path to store extracted face images
-extracted_faces_dir = 'extracted_faces'
+@app.on_event("startup")
+def load_id_index():
+    id_index.start()
 
-# Ensure the directory exists
-os.makedirs(extracted_faces_dir, exist_ok=True)
+@app.on_event("shutdown")
+def shutdown_executor():
+    executor.shutdown()
+    id_index.stop()
 
-# Define mouth landmarks (indices from the shape_predictor_68_face_landmarks.dat model)
-MOUTH_POINTS = list(range(48, 68))
+@app.get("/health")
+async def health():
+    return {"status": "ok", "models_loaded": models.loaded(), "in_flight": executor.in_flight()}
 
-# Helper function to calculate mouth aspect ratio (MAR)
-#dsfsdf
-def mouth_aspect_ratio(landmarks):
-    # Get the coordinates of the mouth landmarks
-    mouth = [(landmarks.part(i).x, landmarks.part(i).y) for i in MOUTH_POINTS]
+def run_frame_gate(image):
+    return frame_gate.check(image)
 
-    # Calculate the vertical and horizontal distances
-    vertical_distance = (abs(mouth[2][1] - mouth[10][1]) + abs(mouth[4][1] - mouth[8][1])) / 2
-    horizontal_distance = abs(mouth[0][0] - mouth[6][0])
+# Requests currently being handled, per path
+requests_in_flight = {}
 
-    # Calculate the mouth aspect ratio (MAR)
-    mar = vertical_distance / horizontal_distance
-    return mar
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    path = request.url.path
+    requests_in_flight[path] = requests_in_flight.get(path, 0) + 1
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        requests_in_flight[path] -= 1
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, path, status)
+
+metrics.registry.gauge(
+    "verification_requests_in_flight", "HTTP requests being handled", ("path",),
+    lambda: {(path,): count for path, count in requests_in_flight.items()}
+)
+metrics.registry.gauge(
+    "verification_stage_in_flight", "Executor stage calls running", ("stage",),
+    lambda: {(stage,): count for stage, count in executor.in_flight().items()}
+)
+metrics.registry.gauge(
+    "verification_batcher_queue_depth", "Inputs waiting in each inference batcher", ("batcher",),
+    lambda: {(batcher.name,): batcher.queue_depth() for batcher in [*yolo_batchers.values(), ocr_batcher]}
+)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/frame-gate-stats")
+async def frame_gate_stats():
+    return frame_gate.stats()
+
+# Embedding of each session's ID face, computed once at /upload-image/ time
+face_cache = FaceEmbeddingCache()
+
+def analyze_selfie(image, expected_status, id_face_encoding=None, tolerance=0.6):
+    """
+    Run the liveness check and, if an ID face embedding is given, the face match on one selfie.
 
-def verify_mouth_status(image_path, expected_status, predictor):
-    detector = dlib.get_frontal_face_detector()  # Define the detector within the function
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    faces = detector(gray)
+    Faces are detected once with dlib and their 68 landmarks computed once. The landmarks
+    give the mouth aspect ratio and, for the face that passed the mouth check, the
+    alignment of the face encoder, so no detector or landmark predictor runs again.
 
-    for face in faces:
-        landmarks = predictor(gray, face)
-        mar = mouth_aspect_ratio(landmarks)
-        if expected_status == "closed" and mar <= 0.5:
-            return True
-        elif expected_status == "open" and mar > 0.5:
-            return True
-    return False
+    Returns:
+        tuple: (mouth_ok, faces_match), faces_match is None when no comparison was made
+    """
+    with timed("face_detection"):
+        faces = analyze_faces(image, models.get("face_detector"), models.get("shape_predictor"))
+    face = find_face_with_mouth_status(faces, expected_status)
+    if face is None:
+        return False, None
+    if id_face_encoding is None:
+        return True, None
+    return True, compare_faces(image, face, id_face_encoding, tolerance=tolerance)
 
 def clear_gpu_memory():
-    if torch.cuda.is_available():
+    if INFERENCE_DEVICE != "cpu" and torch.cuda.is_available():
         torch.cuda.empty_cache()
         torch.cuda.ipc_collect()
         print("GPU memory cleared.")
 
-def resize_image(image_path, max_size=(640, 640)):
-    image = cv2.imread(image_path)
+def resize_image(image, max_size=(640, 640)):
     height, width = image.shape[:2]
     if height > max_size[0] or width > max_size[1]:
         scaling_factor = min(max_size[0] / height, max_size[1] / width)
         new_size = (int(width * scaling_factor), int(height * scaling_factor))
-        resized_image = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
-        cv2.imwrite(image_path, resized_image)
+        resized_image = cv2.resize(image.bgr, new_size, interpolation=cv2.INTER_AREA)
         print(f"Image resized to {new_size}")
-    return image_path
+        return ImageContext(resized_image, image.name)
+    return image
 
-def extract_face(image_path, compare_id):
-    image = cv2.imread(image_path)
-
-    if image is None:
-        print(f"Error: Could not open or find the image at {image_path}")
-        return None
-
-    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray_image, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+def extract_face(image):
+    faces = models.get("face_cascade").detectMultiScale(image.gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
 
     if len(faces) == 0:
         print("No faces detected.")
@@ -109,83 +181,128 @@ def extract_face(image_path, compare_id):
     else:
         largest_face = max(faces, key=lambda face: face[2] * face[3])  # Find the largest face
         x, y, w, h = largest_face
-        face = image[y:y + h, x:x + w]  # Corrected coordinates for cropping the face
-        face_image_path = os.path.join(extracted_faces_dir, f"{compare_id}.jpg")
-        cv2.imwrite(face_image_path, face)  # Save to a specific path
-        print(f"Largest face saved to {face_image_path}")
-        return face_image_path
+        face = image.bgr[y:y + h, x:x + w]  # Corrected coordinates for cropping the face
+        print(f"Largest face found at {(x, y, w, h)}")
+        return face
+
+def encode_id_face(image):
+    # Compute the 128-d embedding of the ID face once, every selfie attempt reuses it
+    with timed("id_face_detection"):
+        face = extract_face(image)
+    if face is None:
+        return None
+
+    # Convert to RGB (face_recognition uses RGB, while OpenCV uses BGR)
+    face_rgb = np.ascontiguousarray(cv2.cvtColor(face, cv2.COLOR_BGR2RGB))
+    with timed("face_encoding"):
+        encodings = face_recognition.face_encodings(face_rgb)
+    if len(encodings) == 0:
+        print("No faces found in the extracted face image.")
+        return None
+    return encodings[0]
+
+# Expected digit count of the number read from each YOLO class
+NUMBER_LENGTHS = {2: 18, 3: 9}
+
+def crop_number_region(image, logo_box, logo_type):
+    x1, y1, x2, y2 = logo_box
+    if logo_type == 2:
+        padding_left = 90  # Increased padding to the left for logo 2
+        padding_other = 10  # Minimal padding for other directions
+    else:
+        padding_left = 10  # Minimal padding for logo 3
+        padding_other = 10  # Minimal padding for all directions
+
+    x = max(0, int(x1) - padding_left)  # Increase padding to the left
+    y = max(0, int(y1) - padding_other)
+    w = int(x2 - x1) + padding_left + padding_other  # Increase padding on the right side
+    h = int(y2 - y1) + 2 * padding_other
+
+    # Ensure coordinates are within image bounds
+    y2 = min(y + h, image.shape[0])
+    x2 = min(x + w, image.shape[1])
+
+    # Crop the cached grayscale view of the upload
+    gray_logo = image.gray[y:y2, x:x2]
+
+    # Apply sharpening
+    kernel = np.array([[0, -1, 0], [-1, 5,-1], [0, -1, 0]])
+    return cv2.filter2D(gray_logo, -1, kernel)
+
+def read_number_region(sharpened_logo):
+    # Perform OCR with adjusted parameters (EasyOCR text detection + recognition)
+    result = models.get("ocr_reader").readtext(
+        sharpened_logo,
+        detail=0,
+        paragraph=False,
+        batch_size=1,
+        min_size=10,
+        contrast_ths=0.2,
+        adjust_contrast=0.5,
+        text_threshold=0.6
+    )
+    return "".join(result)
+
+def parse_number(text, expected_length):
+    # Join all results and clean up
+    extracted_text = text.replace(" ", "").replace(":", "").replace("+", "").replace("*", "")
+    print(f"Cleaned extracted text: {extracted_text}")
+
+    # Extract numbers of expected length
+    pattern = rf'\d{{{expected_length}}}'
+    numbers = re.findall(pattern, extracted_text)
+
+    if not numbers:
+        print(f"No valid {expected_length}-digit number found in: {extracted_text}")
+        return None
+
+    return numbers[0]
+
+def extract_numbers_from_logos(image, number_boxes):
+    """
+    Read the numbers inside the YOLO number boxes of one image.
+
+    In "recognize" mode all crops go through the OCR batcher together, which skips
+    EasyOCR's text detection (YOLO already located the text) and recognizes them in one
+    batch, also shared with concurrent requests.
+
+    Args:
+        image (ImageContext): Decoded upload
+        number_boxes (list): (logo_type, logo_box) pairs for classes 2 and 3
 
-def extract_number_from_logo(image_path, logo_box, expected_length, logo_type):
+    Returns:
+        list: The number found in each box, or None
+    """
     try:
-        x1, y1, x2, y2 = logo_box
-        if logo_type == 2:
-            padding_left = 90  # Increased padding to the left for logo 2
-            padding_other = 10  # Minimal padding for other directions
+        crops = [crop_number_region(image, logo_box, logo_type) for logo_type, logo_box in number_boxes]
+        if OCR_MODE == "recognize":
+            futures = [ocr_batcher.submit_future(crop) for crop in crops]
+            texts = [future.result() for future in futures]
         else:
-            padding_left = 10  # Minimal padding for logo 3
-            padding_other = 10  # Minimal padding for all directions
-
-        x = max(0, int(x1) - padding_left)  # Increase padding to the left
-        y = max(0, int(y1) - padding_other)
-        w = int(x2 - x1) + padding_left + padding_other  # Increase padding on the right side
-        h = int(y2 - y1) + 2 * padding_other
-        
-        image = cv2.imread(image_path)
-        if image is None:
-            print("Failed to load image")
-            return None
-            
-        # Ensure coordinates are within image bounds
-        y2 = min(y + h, image.shape[0])
-        x2 = min(x + w, image.shape[1])
-        logo_image = image[y:y2, x:x2]
-        
-        # Convert to grayscale
-        gray_logo = cv2.cvtColor(logo_image, cv2.COLOR_BGR2GRAY)
-        
-        # Apply sharpening
-        kernel = np.array([[0, -1, 0], [-1, 5,-1], [0, -1, 0]])
-        sharpened_logo = cv2.filter2D(gray_logo, -1, kernel)
-        
-        # Save processed image for debugging
-        debug_path = f"debug_processed_{expected_length}.png"
-
-        
-        # Perform OCR with adjusted parameters
-        result = ocr_reader.readtext(
-            sharpened_logo,
-            detail=0,
-            paragraph=False,
-            batch_size=1,
-            min_size=10,
-            contrast_ths=0.2,
-            adjust_contrast=0.5,
-            text_threshold=0.6
-        )
-        
-        # Join all results and clean up
-        extracted_text = "".join(result).replace(" ", "").replace(":", "").replace("+", "").replace("*", "")
-        print(f"Cleaned extracted text: {extracted_text}")
-        
-        # Extract numbers of expected length
-        pattern = rf'\d{{{expected_length}}}'
-        numbers = re.findall(pattern, extracted_text)
-        
-        if not numbers:
-            print(f"No valid {expected_length}-digit number found in: {extracted_text}")
-            return None
-            
-        return numbers[0]
-        
+            texts = [read_number_region(crop) for crop in crops]
     except Exception as e:
-        print(f"Error in extract_number_from_logo: {e}")
-        return None
-
-def check_logos(image_path):
-    results = model.predict(source=image_path, save=False, imgsz=640, device=0)
+        print(f"Error in extract_numbers_from_logos: {e}")
+        return [None] * len(number_boxes)
+
+    numbers = []
+    for (logo_type, _), crop, text in zip(number_boxes, crops, texts):
+        expected_length = NUMBER_LENGTHS[logo_type]
+        number = parse_number(text, expected_length)
+        if number is None and OCR_MODE == "recognize" and OCR_FALLBACK_READTEXT:
+            # Let EasyOCR's detector split the crop into text lines and try again
+            try:
+                number = parse_number(read_number_region(crop), expected_length)
+            except Exception as e:
+                print(f"Error in read_number_region: {e}")
+        numbers.append(number)
+    return numbers
+
+def detect_front_logos(image):
+    # Detection stage: YOLO logos of the front, with the boxes holding the ID numbers
+    results = [yolo_batchers["front_yolo"].submit(image.bgr)]
     logos_found = {0: False, 1: False, 2: False, 3: False}
-    logo_numbers = {'logo2': None, 'logo3': None}
-    
+    number_boxes = []
+
     try:
         for result in results:
             boxes = result.boxes
@@ -194,46 +311,75 @@ def check_logos(image_path):
                     class_id = int(box.cls.item())
                     if class_id in logos_found:
                         logos_found[class_id] = True
-                        
-                        if class_id == 2:  # Main ID number
-                            number = extract_number_from_logo(image_path, box.xyxy[0].cpu().numpy(), 18, 2)
-                            if number:  # Only update if a valid number was found
-                                logo_numbers['logo2'] = number
-                        elif class_id == 3:  # Compare ID
-                            number = extract_number_from_logo(image_path, box.xyxy[0].cpu().numpy(), 9, 3)
-                            if number:  # Only update if a valid number was found
-                                logo_numbers['logo3'] = number
-
-        print(f"Logos found: {logos_found}")
-        print(f"Extracted numbers: {logo_numbers}")
-        return logos_found, logo_numbers
-        
+
+                        if class_id in NUMBER_LENGTHS:  # Main ID number (2) or Compare ID (3)
+                            number_boxes.append((class_id, box_xyxy(box)))
     except Exception as e:
-        print(f"Error in check_logos: {e}")
-        return {0: False, 1: False, 2: False, 3: False}, {'logo2': None, 'logo3': None}
+        print(f"Error in detect_front_logos: {e}")
+        return {0: False, 1: False, 2: False, 3: False}, []
 
-# Global variable to store compare_id and id_number
-compare_id_global = None
-id_number_global = None
+    print(f"Logos found: {logos_found}")
+    return logos_found, number_boxes
+
+def read_logo_numbers(image, number_boxes):
+    # OCR stage: all number boxes of the image in one batch
+    logo_numbers = {'logo2': None, 'logo3': None}
+    with timed("read_numbers"):
+        numbers = extract_numbers_from_logos(image, number_boxes)
+    for (class_id, _), number in zip(number_boxes, numbers):
+        if number:  # Only update if a valid number was found
+            logo_numbers[f'logo{class_id}'] = number
+
+    print(f"Extracted numbers: {logo_numbers}")
+    return logo_numbers
 
 def hash_id_number(id_number):
     return hashlib.sha256(id_number.encode()).hexdigest()
+
+def session_data(id_number, compare_id):
+    # Sessions only keep the digests, the sqlite backend writes them to disk
+    return {"id_number_hash": hash_id_number(id_number), "compare_id_hash": hash_id_number(compare_id)}
  
-def check_id_and_compare_id_exist(id_number, compare_id):
-    hashed_id_number = hash_id_number(id_number)
-    hashed_compare_id = hash_id_number(compare_id)
+def check_id_and_compare_id_exist(hashed_id_number, hashed_compare_id):
     metadata_ref = db.collection('Metadata')
     
-    id_number_exists = any(metadata_ref.where('id_number', '==', hashed_id_number).stream())
-    compare_id_exists = any(metadata_ref.where('compare_id', '==', hashed_compare_id).stream())
+    # Only query Firestore when the local index reports a possible match
+    with timed("firestore_read"):
+        id_number_exists = (
+            id_index.might_contain('id_number', hashed_id_number)
+            and any(metadata_ref.where('id_number', '==', hashed_id_number).limit(1).stream())
+        )
+        compare_id_exists = (
+            id_index.might_contain('compare_id', hashed_compare_id)
+            and any(metadata_ref.where('compare_id', '==', hashed_compare_id).limit(1).stream())
+        )
     
-    print(f"Checking database for ID number: {id_number} (hashed: {hashed_id_number})")
+    print(f"Checking database for ID number (hashed: {hashed_id_number})")
     print(f"ID number exists: {id_number_exists}")
-    print(f"Checking database for Compare ID: {compare_id} (hashed: {hashed_compare_id})")
+    print(f"Checking database for Compare ID (hashed: {hashed_compare_id})")
     print(f"Compare ID exists: {compare_id_exists}")
     
     return id_number_exists, compare_id_exists
 
+async def read_upload(file, debug_dir):
+    # Decode the upload once, every stage works on the same in-memory image
+    contents = await file.read()
+    image = await executor.run("decode", ImageContext.from_bytes, contents, file.filename)
+    await executor.run("disk", save_debug_image, debug_dir, file.filename, contents)
+    return image
+
+def save_metadata(hashed_id_number, hashed_compare_id, last_name, first_name):
+    # Save the hashed id_number and compare_id to the Metadata collection
+    with timed("firestore_write"):
+        db.collection('Metadata').add({
+            'id_number': hashed_id_number,
+            'compare_id': hashed_compare_id,
+            'last_name': last_name,
+            'first_name': first_name,
+            'timestamp': datetime.now()
+        })
+    id_index.add(hashed_id_number, hashed_compare_id)
+
 def delete_file(file_path):
     try:
         if os.path.exists(file_path):
@@ -244,19 +390,27 @@ def delete_file(file_path):
     except Exception as e:
         print(f"Error deleting file {file_path}: {e}")
 
-@app.post("/upload-image/")
-async def upload_image(file: UploadFile = File(...)):
-    global compare_id_global, id_number_global
-    try:
-        # Generate a temporary file location to save the uploaded image
-        temp_dir = "uploaded_images"
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_file_location = f"{temp_dir}/{file.filename}"
+async def verify_front(image):
+    """
+    Run the front ID checks on a decoded frame.
 
-        with open(temp_file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    Returns:
+        dict: Response content, stop_capture is True once the front ID is verified
+    """
+    try:
+        # Cheap quality and ID-presence checks first, most rejected frames never reach YOLO
+        passed, rejected_by, _ = await executor.run("gate", run_frame_gate, image)
+        if not passed:
+            count_rejection("front", f"gate_{rejected_by}")
+            return {
+                "message": REJECTION_MESSAGES[rejected_by],
+                "stop_capture": False
+            }
 
-        logos_found, logo_numbers = check_logos(temp_file_location)
+        logos_found, number_boxes = await executor.run("detection", detect_front_logos, image)
+        logo_numbers = {'logo2': None, 'logo3': None}
+        if number_boxes:
+            logo_numbers = await executor.run("ocr", read_logo_numbers, image, number_boxes)
 
         # Check logo presence
         valid_logo_combination = (
@@ -266,115 +420,109 @@ async def upload_image(file: UploadFile = File(...)):
         )
 
         if not valid_logo_combination:
-            delete_file(temp_file_location)
-            return JSONResponse(content={
+            count_rejection("front", "missing_logos")
+            return {
                 "message": "Invalid ID: Missing required logos or numbers. Please retake the picture.",
                 "stop_capture": False
-            })
+            }
 
         # Validate ID numbers
         id_number = logo_numbers.get('logo2')
         compare_id = logo_numbers.get('logo3')
 
         if not id_number or len(id_number) != 18:
-            delete_file(temp_file_location)
-            return JSONResponse(content={
+            count_rejection("front", "id_number_unreadable")
+            return {
                 "message": "Invalid ID: Main ID number not properly detected. Please retake the picture.",
                 "stop_capture": False
-            })
+            }
 
         if not compare_id or len(compare_id) != 9:
-            delete_file(temp_file_location)
-            return JSONResponse(content={
+            count_rejection("front", "compare_id_unreadable")
+            return {
                 "message": "Invalid ID: Compare ID not properly detected. Please retake the picture.",
                 "stop_capture": False
-            })
+            }
 
         # Check if id_number and compare_id already exist in the Metadata collection
-        id_number_exists, compare_id_exists = check_id_and_compare_id_exist(id_number, compare_id)
+        session = session_data(id_number, compare_id)
+        id_number_exists, compare_id_exists = await executor.run(
+            "firestore", check_id_and_compare_id_exist, session["id_number_hash"], session["compare_id_hash"]
+        )
         if id_number_exists or compare_id_exists:
-            delete_file(temp_file_location)
-            return JSONResponse(content={
+            count_rejection("front", "id_already_exists")
+            return {
                 "message": "ID number or Compare ID already exists. Please use a different ID.",
                 "stop_capture": False
-            })
-
-        # Save compare_id and id_number for later use
-        compare_id_global = compare_id
-        id_number_global = id_number
-
-        # Save the uploaded image with the compare_id as part of the filename
-        uploaded_image_dir = "uploaded_images_with_id"
-        os.makedirs(uploaded_image_dir, exist_ok=True)
-        uploaded_image_path = os.path.join(uploaded_image_dir, f"{compare_id}_img.jpg")
-        shutil.move(temp_file_location, uploaded_image_path)
+            }
 
         # Extract face
-        face_image_path = extract_face(uploaded_image_path, compare_id)
-        if not face_image_path:
-            delete_file(uploaded_image_path)
-            return JSONResponse(content={
+        id_face_encoding = await executor.run("face", encode_id_face, image)
+        if id_face_encoding is None:
+            count_rejection("front", "no_id_face")
+            return {
                 "message": "Invalid ID: No face detected. Please retake the picture.",
                 "stop_capture": False
-            })
+            }
 
-        # Delete the uploaded image after extracting the face
-        delete_file(uploaded_image_path)
+        # Save the hashed compare_id and id_number in a new verification session for the next steps
+        session_token = sessions.create(session)
+        await executor.run("disk", face_cache.put, session_token, id_face_encoding)
 
-        return JSONResponse(content={
+        return {
             "message": "ID verified successfully.",
             "id_number": id_number,
             "compare_id": compare_id,
-            "face_image_path": face_image_path,
+            "session_token": session_token,
             "stop_capture": True
-        })
+        }
 
     except Exception as e:
         print(f"Error processing upload: {e}")
-        return JSONResponse(content={
+        return {
             "message": "Error processing ID. Please try again.",
             "stop_capture": False
-        })
-
-@app.post("/upload-back-id/")
-async def upload_back_id(file: UploadFile = File(...)):
-    global compare_id_global, id_number_global
-    try:
-        # Load the second YOLO model for back ID verification
-        model_back = YOLO("back_model/best.pt")
+        }
 
-        # Generate a temporary file location to save the uploaded back ID image
-        temp_dir = "uploaded_back_ids"
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_file_location = f"{temp_dir}/{file.filename}"
+def session_expired_response():
+    return {
+        "message": "Verification session expired. Please scan the front of your ID again.",
+        "stop_capture": False
+    }
 
-        with open(temp_file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+async def verify_back(image, session_token, session):
+    """
+    Run the back ID checks on a decoded frame against the session created by the front.
 
+    Returns:
+        tuple: (response content, status code)
+    """
+    try:
         # Resize image to reduce memory usage
-        # temp_file_location = resize_image(temp_file_location)
+        # image = resize_image(image)
 
         # Perform logo detection using the second model
-        logos_found = check_logos_with_model(temp_file_location, model_back)
+        logos_found = await executor.run("detection", check_logos_with_model, image, "back_yolo")
 
         # Check logo presence
         if not (logos_found[0] and logos_found[1]):
-            delete_file(temp_file_location)
             print("Invalid Back ID: Missing required logos")
-            return JSONResponse(content={
+            count_rejection("back", "missing_logos")
+            return {
                 "message": "Invalid Back ID: Please retake the picture.",
                 "stop_capture": False  # Indicate not to stop capturing
-            })
+            }, 200
 
         # Clear GPU memory after logo detection
         clear_gpu_memory()
 
         # Perform OCR to extract text from the back of the ID
-        extracted_text = extract_text(temp_file_location)
-        last_name, first_name = extract_names(extracted_text)
+        extracted_text = await executor.run("ocr", extract_text, image)
+        with timed("extract_names"):
+            last_name, first_name = extract_names(extracted_text)
 
-        # Extract second_pair_id from the text
-        second_pair_id = extract_second_pair_id(extracted_text)
+            # Extract second_pair_id from the text
+            second_pair_id = extract_second_pair_id(extracted_text)
 
         if last_name and first_name and second_pair_id:
             print(f"Extracted Last Name: {last_name}")
@@ -382,61 +530,143 @@ async def upload_back_id(file: UploadFile = File(...)):
             print(f"Extracted Second Pair ID: {second_pair_id}")
 
             # Compare second_pair_id with the saved compare_id
-            if second_pair_id == compare_id_global:
-                # Save the uploaded back ID image with the compare_id as part of the filename
-                uploaded_back_id_dir = "uploaded_back_ids_with_id"
-                os.makedirs(uploaded_back_id_dir, exist_ok=True)
-                uploaded_back_id_path = os.path.join(uploaded_back_id_dir, f"{compare_id_global}_back_img.jpg")
-                shutil.move(temp_file_location, uploaded_back_id_path)
-
-                # Hash the id_number and compare_id and save them to the Metadata collection
-                hashed_id_number = hash_id_number(id_number_global)
-                hashed_compare_id = hash_id_number(compare_id_global)
-                db.collection('Metadata').add({
-                    'id_number': hashed_id_number,
-                    'compare_id': hashed_compare_id,
-                    'last_name': last_name,
-                    'first_name': first_name,
-                    'timestamp': datetime.now()
-                })
-
-                # Delete the back ID image after verification
-                delete_file(uploaded_back_id_path)
-
-                return JSONResponse(content={
+            if hash_id_number(second_pair_id) == session["compare_id_hash"]:
+                # Save the hashed id_number and compare_id to the Metadata collection
+                await executor.run(
+                    "firestore", save_metadata, session["id_number_hash"], session["compare_id_hash"],
+                    last_name, first_name
+                )
+                if sessions.update(session_token, back_verified=True):
+                    # The ID face embedding lives as long as the session it belongs to
+                    await executor.run("disk", face_cache.touch, session_token)
+
+                return {
                     "message": "Back ID verified successfully.",
                     "last_name": last_name,
                     "first_name": first_name,
                     "second_pair_id": second_pair_id,
-                    "compare_id": compare_id_global,  # Add this line
+                    "compare_id": second_pair_id,  # Same as the front's compare_id
                     "stop_capture": True  # Indicate to stop capturing
-                })
+                }, 200
             else:
-                delete_file(temp_file_location)
                 print("Back ID does not match the front ID.")
-                return JSONResponse(content={
+                count_rejection("back", "compare_id_mismatch")
+                return {
                     "message": "Back ID does not match the front ID.",
                     "stop_capture": False  # Indicate not to stop capturing
-                })
+                }, 200
         else:
-            delete_file(temp_file_location)
             print("Failed to verify back ID.")
-            return JSONResponse(content={
+            count_rejection("back", "text_unreadable")
+            return {
                 "message": "Failed to verify back ID.",
                 "stop_capture": False  # Indicate not to stop capturing
-            })
+            }, 200
     except Exception as e:
         print(f"Error processing back ID: {e}")
         clear_gpu_memory()  # Clear GPU memory in case of an error
-        return JSONResponse(content={
+        return {
             "message": "Internal server error.",
             "error": str(e),
             "stop_capture": False  # Indicate not to stop capturing
+        }, 500
+
+@app.post("/upload-image/")
+async def upload_image(file: UploadFile = File(...)):
+    try:
+        # Decode the uploaded image once (saved under uploaded_images only when debugging)
+        image = await read_upload(file, "uploaded_images")
+    except Exception as e:
+        print(f"Error processing upload: {e}")
+        return JSONResponse(content={
+            "message": "Error processing ID. Please try again.",
+            "stop_capture": False
+        })
+    return JSONResponse(content=await verify_front(image))
+
+@app.post("/upload-back-id/")
+async def upload_back_id(file: UploadFile = File(...), session_token: str = Form(...)):
+    session = sessions.get(session_token)
+    if session is None:
+        return JSONResponse(content=session_expired_response(), status_code=401)
+    try:
+        # Decode the uploaded back ID image once (saved under uploaded_back_ids only when debugging)
+        image = await read_upload(file, "uploaded_back_ids")
+    except Exception as e:
+        print(f"Error processing back ID: {e}")
+        return JSONResponse(content={
+            "message": "Internal server error.",
+            "error": str(e),
+            "stop_capture": False
         }, status_code=500)
+    content, status_code = await verify_back(image, session_token, session)
+    return JSONResponse(content=content, status_code=status_code)
+
+async def receive_frames(websocket, slot):
+    # Keep only the newest frame, frames arriving while one is processed replace each other
+    try:
+        while True:
+            slot.put(await websocket.receive_bytes())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        slot.close()
+
+@app.websocket("/ws/capture")
+async def capture_stream(websocket: WebSocket, side: str = "front", session_token: str = None):
+    """
+    Streaming capture: the phone sends encoded frames as binary messages and receives
+    the JSON result of every processed frame. Only the newest frame is processed, frames
+    that arrive while the pipeline is busy are dropped. The stream ends after the first
+    frame that verifies (stop_capture is True).
 
-def check_logos_with_model(image_path, model):
-    # Perform logo detection using the specified YOLO model
-    results = model.predict(source=image_path, save=False, imgsz=640, device=0)
+    Query parameters: side ("front" or "back") and, for the back, session_token.
+    """
+    await websocket.accept()
+
+    session = None
+    if side == "back":
+        session = sessions.get(session_token) if session_token else None
+        if session is None:
+            await websocket.send_json(session_expired_response())
+            await websocket.close(code=4401)
+            return
+    elif side != "front":
+        await websocket.close(code=4400)
+        return
+
+    slot = LatestFrameSlot()
+    receiver = asyncio.create_task(receive_frames(websocket, slot))
+    try:
+        while True:
+            contents = await slot.get()
+            if contents is None:
+                break
+            try:
+                image = await executor.run("decode", ImageContext.from_bytes, contents, f"{side}_frame")
+            except Exception as e:
+                print(f"Error decoding streamed frame: {e}")
+                continue
+
+            if side == "front":
+                content = await verify_front(image)
+            else:
+                content, _ = await verify_back(image, session_token, session)
+            content["frames_received"] = slot.received
+            content["frames_dropped"] = slot.dropped
+            await websocket.send_json(content)
+            if content["stop_capture"]:
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+    print(f"Capture stream closed: {slot.received} frames received, {slot.dropped} dropped")
+
+def check_logos_with_model(image, model_name):
+    # Perform logo detection using the batcher of the specified YOLO model
+    results = [yolo_batchers[model_name].submit(image.bgr)]
     logos_found = {0: False, 1: False}  # Assuming classes 0 and 1 correspond to the logos
 
     for result in results:
@@ -450,34 +680,18 @@ def check_logos_with_model(image_path, model):
     print(f"Logos found: {logos_found}")
     return logos_found  # Return a dictionary indicating which logos were found
 
-def compare_faces(face_image_path, compare_id, tolerance=0.6):
-    # Load the extracted face image for the given compare_id
-    extracted_face_path = os.path.join(extracted_faces_dir, f"{compare_id}.jpg")
-    extracted_face = cv2.imread(extracted_face_path)
-    submitted_face = cv2.imread(face_image_path)
+def compare_faces(submitted_image, submitted_face, id_face_encoding, tolerance=0.6):
+    # The ID face was encoded at /upload-image/ time, only the located selfie face is encoded here
+    with timed("face_encoding"):
+        submitted_face_encoding = encode_face(submitted_image, submitted_face)
 
-    if extracted_face is None or submitted_face is None:
-        print("Error: One or both images could not be loaded.")
-        return False
-
-    # Convert images to RGB (face_recognition uses RGB, while OpenCV uses BGR)
-    extracted_face_rgb = cv2.cvtColor(extracted_face, cv2.COLOR_BGR2RGB)
-    submitted_face_rgb = cv2.cvtColor(submitted_face, cv2.COLOR_BGR2RGB)
-
-    # Get face encodings for both images
-    extracted_face_encodings = face_recognition.face_encodings(extracted_face_rgb)
-    submitted_face_encodings = face_recognition.face_encodings(submitted_face_rgb)
-
-    # Check if faces were found in both images
-    if len(extracted_face_encodings) == 0:
-        print("No faces found in the extracted face image.")
-        return False
-    if len(submitted_face_encodings) == 0:
+    # Check if the face could be encoded
+    if submitted_face_encoding is None:
         print("No faces found in the submitted face image.")
         return False
 
-    # Compare the first encoding (assuming one face per image) with tolerance
-    results = face_recognition.compare_faces([extracted_face_encodings[0]], submitted_face_encodings[0], tolerance=tolerance)
+    # Compare the selfie encoding with the ID face encoding with tolerance
+    results = face_recognition.compare_faces([id_face_encoding], submitted_face_encoding, tolerance=tolerance)
 
     if results[0]:
         print("Faces match.")
@@ -487,70 +701,62 @@ def compare_faces(face_image_path, compare_id, tolerance=0.6):
     return results[0]  # Return the result of the comparison
 
 @app.post("/compare-face/")
-async def compare_face(compare_id: str = Form(...), file1: UploadFile = File(...), file2: UploadFile = File(...)):
-    upload_dir = "face_images"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_location1 = f"{upload_dir}/{file1.filename}"
-    file_location2 = f"{upload_dir}/{file2.filename}"
-
-    with open(file_location1, "wb") as buffer:
-        shutil.copyfileobj(file1.file, buffer)
+async def compare_face(compare_id: str = Form(...), session_token: str = Form(...),
+                       file1: UploadFile = File(...), file2: UploadFile = File(...)):
+    session = sessions.get(session_token)
+    if session is None or session["compare_id_hash"] != hash_id_number(compare_id) or not session.get("back_verified"):
+        return JSONResponse(content={
+            "message": "Verification session expired. Please scan your ID again."
+        }, status_code=401)
 
-    with open(file_location2, "wb") as buffer:
-        shutil.copyfileobj(file2.file, buffer)
+    id_face_encoding = await executor.run("disk", face_cache.get, session_token)
+    if id_face_encoding is None:
+        return JSONResponse(content={
+            "message": "Verification session expired. Please scan your ID again."
+        }, status_code=401)
 
     try:
-        # Load the pre-trained facial landmark detector
-        predictor = dlib.shape_predictor("shape_predictor_68_face_landmarks.dat")  # Ensure you have the shape predictor file
-
-        # Verify mouth status
-        if not verify_mouth_status(file_location1, "closed", predictor):
-            delete_file(file_location1)
-            delete_file(file_location2)
+        # Decode both selfies once (saved under face_images only when debugging)
+        image1 = await read_upload(file1, "face_images")
+        image2 = await read_upload(file2, "face_images")
+
+        # Verify mouth status of both selfies in parallel, the second one is also compared to the ID face
+        (mouth_closed, _), (mouth_open, faces_match) = await asyncio.gather(
+            executor.run("face", analyze_selfie, image1, "closed"),
+            executor.run("face", analyze_selfie, image2, "open", id_face_encoding, tolerance=0.6),
+        )
+        if not mouth_closed:
+            count_rejection("selfie", "mouth_not_closed")
             return JSONResponse(content={"message": "First image should have mouth closed."})
-        if not verify_mouth_status(file_location2, "open", predictor):
-            delete_file(file_location1)
-            delete_file(file_location2)
+        if not mouth_open:
+            count_rejection("selfie", "mouth_not_open")
             return JSONResponse(content={"message": "Second image should have mouth open."})
 
-        # Proceed with face comparison
-        faces_match = compare_faces(file_location2, compare_id, tolerance=0.6)
-
         if faces_match:
-            # Delete the extracted face image after successful verification
-            extracted_face_path = os.path.join(extracted_faces_dir, f"{compare_id}.jpg")
-            delete_file(extracted_face_path)
-            delete_file(file_location1)
-            delete_file(file_location2)
+            # Delete the ID face embedding and the session after successful verification
+            await executor.run("disk", face_cache.delete, session_token)
+            sessions.delete(session_token)
             return JSONResponse(content={"message": "Faces match!"})
         else:
-            delete_file(file_location1)
-            delete_file(file_location2)
+            count_rejection("selfie", "face_mismatch")
             return JSONResponse(content={"message": "Faces do not match."})
 
     except Exception as e:
         print(f"Error comparing faces: {e}")
-        delete_file(file_location1)
-        delete_file(file_location2)
         return JSONResponse(content={"message": "Error comparing faces."})
 
-def enhance_sharpness_and_blacks(image_path, sharpen_amount=2.0, black_boost=1.5):
+def enhance_sharpness_and_blacks(image, sharpen_amount=2.0, black_boost=1.5):
     """
     Enhance image sharpness and make black elements darker
 
     Parameters:
-        image_path (str): Path to the input image
+        image (numpy.ndarray): Input BGR image
         sharpen_amount (float): Amount of sharpening (higher = sharper, default: 2.0)
         black_boost (float): Amount to darken blacks (higher = darker, default: 1.5)
 
     Returns:
         numpy.ndarray: Enhanced image
     """
-    # Read the image
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError("Could not load image")
-
     # Convert to LAB color space for better processing
     lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
     l, a, b = cv2.split(lab)
@@ -574,9 +780,9 @@ def enhance_sharpness_and_blacks(image_path, sharpen_amount=2.0, black_boost=1.5
 
     return enhanced
 
-def preprocess_image(image_path):
+def preprocess_image(image):
     # Use the enhanced sharpness and black boosting instead of the previous preprocessing
-    enhanced_image = enhance_sharpness_and_blacks(image_path, sharpen_amount=3.0, black_boost=2.0)
+    enhanced_image = enhance_sharpness_and_blacks(image.bgr, sharpen_amount=3.0, black_boost=2.0)
 
     # Resize the image to a smaller size to reduce memory usage
     resized = cv2.resize(enhanced_image, (0, 0), fx=1.5, fy=1.5, interpolation=cv2.INTER_LINEAR)
@@ -587,15 +793,17 @@ def preprocess_image(image_path):
 
     return preprocessed_image_path, resized  # Return path and image data
 
-def extract_text(image_path):
+def extract_text(image):
     # Clear GPU memory before OCR processing
     clear_gpu_memory()
 
     # Preprocess the image to improve OCR accuracy
-    preprocessed_image_path, preprocessed_image = preprocess_image(image_path)
+    with timed("enhance"):
+        preprocessed_image_path, preprocessed_image = preprocess_image(image)
 
     # Perform OCR using EasyOCR to extract English text (you can change language if needed)
-    result = ocr_reader.readtext(preprocessed_image, detail=0, paragraph=True)
+    with timed("text_ocr"):
+        result = models.get("ocr_reader").readtext(preprocessed_image, detail=0, paragraph=True)
     extracted_text = " ".join(result)
 
     print("Extracted Text:", extracted_text)
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Set METRICS_ENABLED=0 to turn every observation into a no-op
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+class Histogram:
+    """
+    Prometheus histogram keyed by a tuple of label values.
+
+    observe() only does a bisect and three increments under a lock. Buckets are kept as
+    plain counts and only made cumulative when the exposition text is rendered.
+    """
+
+    def __init__(self, name, help_text, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        for labels, counts, total, count in snapshot:
+            base = _format_labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{base} {total}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge read when /metrics is scraped, callback returns {label values tuple: value}."""
+
+    def __init__(self, name, help_text, labelnames, callback):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.callback = callback
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return lines
+        for labels, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, tuple(labelnames), buckets))
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, tuple(labelnames)))
+
+    def gauge(self, name, help_text, labelnames, callback):
+        return self._add(Gauge(name, help_text, tuple(labelnames), callback))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+# Time spent in each pipeline step (YOLO, OCR, face detection, Firestore, ...)
+STEP_SECONDS = registry.histogram(
+    "verification_step_seconds", "Duration of each pipeline step", ("step",)
+)
+# Time a stage call spent waiting for a slot of its stage and the total including the run
+STAGE_WAIT_SECONDS = registry.histogram(
+    "verification_stage_wait_seconds", "Time waiting for a free slot of the stage", ("stage",)
+)
+STAGE_SECONDS = registry.histogram(
+    "verification_stage_seconds", "Duration of executor stage calls, without the wait for a slot", ("stage",)
+)
+REQUEST_SECONDS = registry.histogram(
+    "verification_request_seconds", "Duration of HTTP requests", ("path", "status")
+)
+BATCH_SIZE = registry.histogram(
+    "verification_batch_size", "Number of inputs per batched inference call", ("batcher",), BATCH_SIZE_BUCKETS
+)
+REJECTIONS = registry.counter(
+    "verification_rejections_total", "Frames or requests rejected, by step and reason", ("step", "reason")
+)
+
+
+@contextmanager
+def timed(step):
+    """Record the duration of the block under verification_step_seconds{step=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STEP_SECONDS.observe(time.perf_counter() - start, step)
+
+
+def count_rejection(step, reason):
+    REJECTIONS.inc(step, reason)
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import dlib
+import easyocr
+
+from frame_gate import ID_CLASSIFIER_PATH
+from inference_backend import INFERENCE_DEVICE, configure_threads, load_yolo, resolve_backend, yolo_weights_path
+
+# Memory budget for resident models in MB (0 disables eviction)
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0"))
+
+# Models loaded and warmed up when the app starts, the rest are loaded on first use
+PRELOAD_MODELS = [
+    name.strip()
+    for name in os.environ.get(
+        "PRELOAD_MODELS",
+        "front_yolo,back_yolo,ocr_reader,face_cascade,face_detector,shape_predictor,id_classifier"
+    ).split(",")
+    if name.strip()
+]
+
+
+class ModelManager:
+    """
+    Keeps the verification models resident in memory.
+
+    Each model is registered with a loader and an optional warm-up function. Models are
+    loaded once (at startup through preload() or lazily on the first get()) and reused by
+    every request. When a memory budget is set, the least recently used models that are
+    not pinned are evicted to stay under it and reloaded the next time they are needed.
+    """
+
+    def __init__(self, memory_budget_mb=0):
+        self.memory_budget_mb = memory_budget_mb
+        self._specs = {}
+        self._models = OrderedDict()  # name -> model, ordered from least to most recently used
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def register(self, name, loader, warmup=None, size_mb=0, weights_path=None, pinned=False):
+        """
+        Register a model without loading it.
+
+        Args:
+            name (str): Name used to fetch the model
+            loader (callable): Function returning the loaded model
+            warmup (callable): Function running a dummy inference on the loaded model
+            size_mb (float): Approximate resident size, used when there is no weights file
+            weights_path (str): Weights file, its size is used as the resident size estimate
+            pinned (bool): Pinned models are never evicted
+        """
+        if weights_path and os.path.exists(weights_path):
+            size_mb = max(size_mb, os.path.getsize(weights_path) / (1024 * 1024))
+        self._specs[name] = {
+            "loader": loader,
+            "warmup": warmup,
+            "size_mb": size_mb,
+            "pinned": pinned,
+        }
+        self._load_locks[name] = threading.Lock()
+
+    def get(self, name):
+        """Return the model, loading and warming it up first if it is not resident."""
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]
+
+        if name not in self._specs:
+            raise KeyError(f"Unknown model: {name}")
+
+        # Only one thread loads a given model, the others wait for it
+        with self._load_locks[name]:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    return self._models[name]
+            model = self._load(name)
+            with self._lock:
+                self._models[name] = model
+                self._evict_over_budget(keep=name)
+            return model
+
+    def is_registered(self, name):
+        return name in self._specs
+
+    def preload(self, names=None):
+        """Load and warm up the given models (all registered models by default)."""
+        for name in names if names is not None else list(self._specs):
+            if name in self._specs:
+                self.get(name)
+            else:
+                print(f"Skipping preload of unknown model: {name}")
+
+    def evict(self, name):
+        with self._lock:
+            if self._models.pop(name, None) is not None:
+                print(f"Evicted model: {name}")
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
+
+    def resident_size_mb(self):
+        with self._lock:
+            return sum(self._specs[name]["size_mb"] for name in self._models)
+
+    def _load(self, name):
+        spec = self._specs[name]
+        start = time.perf_counter()
+        model = spec["loader"]()
+        load_time = time.perf_counter() - start
+
+        if spec["warmup"] is not None:
+            start = time.perf_counter()
+            try:
+                spec["warmup"](model)
+            except Exception as e:
+                print(f"Warm-up failed for {name}: {e}")
+            warmup_time = time.perf_counter() - start
+        else:
+            warmup_time = 0.0
+
+        print(f"Loaded model {name} in {load_time:.2f}s (warm-up {warmup_time:.2f}s)")
+        return model
+
+    def _evict_over_budget(self, keep):
+        # Called with self._lock held
+        if not self.memory_budget_mb:
+            return
+        total = sum(self._specs[name]["size_mb"] for name in self._models)
+        for name in list(self._models):
+            if total <= self.memory_budget_mb:
+                break
+            if name == keep or self._specs[name]["pinned"]:
+                continue
+            self._models.pop(name)
+            total -= self._specs[name]["size_mb"]
+            print(f"Evicted model {name} to stay under {self.memory_budget_mb} MB")
+
+
+def _warmup_yolo(model):
+    model.predict(source=np.zeros((640, 640, 3), dtype=np.uint8), save=False, imgsz=640, device=INFERENCE_DEVICE, verbose=False)
+
+
+def _warmup_ocr(reader):
+    reader.readtext(np.zeros((64, 256), dtype=np.uint8), detail=0)
+
+
+def _warmup_face_cascade(cascade):
+    cascade.detectMultiScale(np.zeros((120, 120), dtype=np.uint8), scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+
+
+def _warmup_face_detector(detector):
+    detector(np.zeros((120, 120), dtype=np.uint8))
+
+
+def _warmup_shape_predictor(predictor):
+    predictor(np.zeros((120, 120), dtype=np.uint8), dlib.rectangle(10, 10, 110, 110))
+
+
+def _load_id_classifier():
+    # onnxruntime is only needed when the classifier gate is used
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = 1
+    return onnxruntime.InferenceSession(ID_CLASSIFIER_PATH, options, providers=["CPUExecutionProvider"])
+
+
+def _warmup_id_classifier(session):
+    session.run(None, {session.get_inputs()[0].name: np.zeros((1, 3, 224, 224), dtype=np.float32)})
+
+
+def create_model_manager(memory_budget_mb=MODEL_MEMORY_BUDGET_MB):
+    """Create the model manager with every model used by the verification endpoints."""
+    configure_threads()
+    manager = ModelManager(memory_budget_mb=memory_budget_mb)
+    front_backend = resolve_backend("front_model")
+    back_backend = resolve_backend("back_model")
+    print(f"Inference device: {INFERENCE_DEVICE}, YOLO backends: front={front_backend}, back={back_backend}")
+    manager.register("front_yolo", lambda: load_yolo("front_model", front_backend), _warmup_yolo,
+                     weights_path=yolo_weights_path("front_model", front_backend), pinned=True)
+    manager.register("back_yolo", lambda: load_yolo("back_model", back_backend), _warmup_yolo,
+                     weights_path=yolo_weights_path("back_model", back_backend))
+    manager.register("ocr_reader", lambda: easyocr.Reader(['en'], gpu=INFERENCE_DEVICE != "cpu"), _warmup_ocr,
+                     size_mb=100, pinned=True)
+    manager.register("face_cascade", lambda: cv2.CascadeClassifier('haarcascade_frontalface_default.xml'),
+                     _warmup_face_cascade, weights_path='haarcascade_frontalface_default.xml')
+    manager.register("face_detector", dlib.get_frontal_face_detector, _warmup_face_detector, size_mb=1)
+    manager.register("shape_predictor", lambda: dlib.shape_predictor("shape_predictor_68_face_landmarks.dat"),
+                     _warmup_shape_predictor, weights_path="shape_predictor_68_face_landmarks.dat")
+    # MobileNet with_id/without_id classifier of the frame gate, only when it has been exported
+    if os.path.exists(ID_CLASSIFIER_PATH):
+        manager.register("id_classifier", _load_id_classifier, _warmup_id_classifier,
+                         weights_path=ID_CLASSIFIER_PATH, pinned=True)
+    return manager
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import numpy as np
+from easyocr.recognition import get_text
+from easyocr.utils import get_image_list
+
+# "recognize" reads the YOLO number boxes with EasyOCR's recognizer only,
+# "readtext" runs the full EasyOCR detection + recognition on every crop
+OCR_MODE = os.environ.get("OCR_MODE", "recognize")
+
+# Retry a crop with the full readtext when the recognized text has no number of the expected length
+OCR_FALLBACK_READTEXT = os.environ.get("OCR_FALLBACK_READTEXT", "1") == "1"
+
+# Batching of number crops across concurrent requests
+OCR_MAX_BATCH_SIZE = int(os.environ.get("OCR_MAX_BATCH_SIZE", "16"))
+OCR_MAX_WAIT_MS = float(os.environ.get("OCR_MAX_WAIT_MS", "5"))
+
+# Gap between crops stacked on the recognition canvas
+CANVAS_GAP = 4
+
+
+def stack_crops(crops):
+    """
+    Stack grayscale crops vertically on one canvas.
+
+    Args:
+        crops (list): Grayscale uint8 crops of any size
+
+    Returns:
+        tuple: (canvas, horizontal_list) where horizontal_list holds the
+        [x_min, x_max, y_min, y_max] box of every crop on the canvas
+    """
+    width = max(crop.shape[1] for crop in crops)
+    height = sum(crop.shape[0] for crop in crops) + CANVAS_GAP * (len(crops) - 1)
+    canvas = np.full((height, width), 255, dtype=np.uint8)
+
+    horizontal_list = []
+    y = 0
+    for crop in crops:
+        h, w = crop.shape[:2]
+        canvas[y:y + h, :w] = crop
+        horizontal_list.append([0, w, y, y + h])
+        y += h + CANVAS_GAP
+    return canvas, horizontal_list
+
+
+def recognize_crops(reader, crops, contrast_ths=0.2, adjust_contrast=0.5):
+    """
+    Recognize the text of every crop in one recognizer forward pass, skipping text detection.
+
+    The crops are stacked on one canvas and cut out again by EasyOCR's get_image_list, then
+    get_text runs the recognizer on all of them as a single batch. reader.recognize is not
+    used: on the CPU it loops over the boxes and runs the recognizer once per box, whatever
+    batch_size is. get_image_list sorts its crops by the top of each box, the results are
+    mapped back to the crops by that coordinate.
+
+    Returns:
+        list: Recognized text for each crop, "" when a crop could not be read
+    """
+    texts = [""] * len(crops)
+    valid = [i for i, crop in enumerate(crops) if crop is not None and crop.size > 0]
+    if not valid:
+        return texts
+
+    canvas, horizontal_list = stack_crops([crops[i] for i in valid])
+    # Recognizer input height, a global of the reader's module (custom models change it)
+    model_height = sys.modules[type(reader).__module__].imgH
+    image_list, max_width = get_image_list(horizontal_list, [], canvas, model_height=model_height)
+    if not image_list:
+        return texts
+    # Same characters as reader.recognize without an allowlist or blocklist
+    ignore_char = "".join(set(reader.character) - set(reader.lang_char))
+    results = get_text(
+        reader.character, model_height, int(max_width), reader.recognizer, reader.converter, image_list,
+        ignore_char, "greedy", 5, len(image_list), contrast_ths, adjust_contrast, 0.003, 0, reader.device,
+    )
+
+    crop_by_top = {box[2]: index for box, index in zip(horizontal_list, valid)}
+    for box, text, _confidence in results:
+        index = crop_by_top.get(int(box[0][1]))
+        if index is not None:
+            texts[index] = text
+    return texts
@@ -0,0 +1,171 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+# "memory" keeps sessions in this process, "sqlite" shares them between workers on one machine
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "sqlite")
+
+# Time a verification session stays valid after its last update
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", "900"))
+
+# Database file used by the sqlite backend
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", "verification_sessions.db")
+
+
+def new_session_token():
+    return secrets.token_urlsafe(32)
+
+
+class InMemorySessionStore:
+    """
+    Verification sessions kept in a dict of this process.
+
+    Each session holds the state passed from /upload-image/ to /upload-back-id/ and
+    /compare-face/ (SHA-256 digests of id_number and compare_id, back_verified). Sessions
+    expire ttl_seconds after their last update. Only usable with a single uvicorn worker.
+    """
+
+    def __init__(self, ttl_seconds=SESSION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._sessions = {}  # token -> (expires_at, data)
+        self._lock = threading.Lock()
+
+    def create(self, data):
+        """Store a new session and return its token."""
+        token = new_session_token()
+        with self._lock:
+            self._purge_expired_locked(time.time())
+            self._sessions[token] = (time.time() + self.ttl_seconds, dict(data))
+        return token
+
+    def get(self, token):
+        """Return the session data, or None if the token is unknown or expired."""
+        if not token:
+            return None
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.time():
+                del self._sessions[token]
+                return None
+            return dict(data)
+
+    def update(self, token, **fields):
+        """Merge fields into the session and extend its expiry. Returns False if it expired."""
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None or entry[0] < time.time():
+                self._sessions.pop(token, None)
+                return False
+            data = dict(entry[1], **fields)
+            self._sessions[token] = (time.time() + self.ttl_seconds, data)
+            return True
+
+    def delete(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def purge_expired(self):
+        with self._lock:
+            return self._purge_expired_locked(time.time())
+
+    def _purge_expired_locked(self, now):
+        expired = [token for token, (expires_at, _) in self._sessions.items() if expires_at < now]
+        for token in expired:
+            del self._sessions[token]
+        return len(expired)
+
+
+class SQLiteSessionStore:
+    """
+    Verification sessions stored in a local SQLite database.
+
+    Every uvicorn worker on the machine opens the same database file, so a session created
+    by one worker can be read by another. The data is written as plain JSON, callers must
+    not put raw ID numbers in it. Each thread uses its own connection and the
+    database runs in WAL mode so readers do not block the writer.
+    """
+
+    def __init__(self, db_path=SESSION_DB_PATH, ttl_seconds=SESSION_TTL_SECONDS):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "token TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        conn.commit()
+
+    def create(self, data):
+        """Store a new session and return its token."""
+        token = new_session_token()
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+            conn.execute(
+                "INSERT INTO sessions (token, data, expires_at) VALUES (?, ?, ?)",
+                (token, json.dumps(data), now + self.ttl_seconds),
+            )
+        return token
+
+    def get(self, token):
+        """Return the session data, or None if the token is unknown or expired."""
+        if not token:
+            return None
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE token = ? AND expires_at >= ?", (token, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, token, **fields):
+        """Merge fields into the session and extend its expiry. Returns False if it expired."""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            # BEGIN IMMEDIATE takes the write lock so concurrent updates do not overwrite each other
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE token = ? AND expires_at >= ?", (token, now)
+            ).fetchone()
+            if row is None:
+                return False
+            data = dict(json.loads(row[0]), **fields)
+            conn.execute(
+                "UPDATE sessions SET data = ?, expires_at = ? WHERE token = ?",
+                (json.dumps(data), now + self.ttl_seconds, token),
+            )
+        return True
+
+    def delete(self, token):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    def purge_expired(self):
+        conn = self._connection()
+        with conn:
+            return conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+
+def create_session_store(backend=SESSION_BACKEND):
+    if backend == "memory":
+        return InMemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -0,0 +1,88 @@
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import STAGE_SECONDS, STAGE_WAIT_SECONDS
+
+# Number of workers in the CPU pool
+WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", str(os.cpu_count() or 4)))
+
+# Maximum number of calls of each stage running at the same time, e.g. "ocr=2,face=2"
+DEFAULT_STAGE_LIMITS = {
+    "decode": 4,
+    "gate": 4,
+    "detection": 4,
+    "ocr": 2,
+    "face": 2,
+    "firestore": 16,
+    "disk": 16,
+}
+
+# Stages that only wait on the network/disk, they run on the default thread pool
+IO_STAGES = {"firestore", "disk"}
+
+
+def parse_stage_limits(value):
+    limits = dict(DEFAULT_STAGE_LIMITS)
+    for entry in value.split(","):
+        if "=" in entry:
+            stage, limit = entry.split("=", 1)
+            limits[stage.strip()] = int(limit)
+    return limits
+
+
+STAGE_LIMITS = parse_stage_limits(os.environ.get("STAGE_CONCURRENCY", ""))
+
+
+class StageExecutor:
+    """
+    Runs the blocking pipeline stages (YOLO, EasyOCR, dlib, face_recognition, Firestore)
+    outside the event loop.
+
+    CPU stages run on a thread pool and I/O stages on the loop's default thread pool.
+    Every stage has its own concurrency limit, so a burst of slow OCR calls can only
+    occupy its own slots and the event loop stays free for other requests and health checks.
+
+    The stages share the resident models, the inference batchers and the metrics of this
+    process, so they must run in it: a process pool worker would block forever on a batcher
+    whose thread only exists in the parent. YOLO, OCR and dlib release the GIL while they
+    compute, threads are enough to use several cores.
+    """
+
+    def __init__(self, max_workers=WORKER_POOL_SIZE, stage_limits=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cv-worker")
+        self.stage_limits = stage_limits if stage_limits is not None else dict(STAGE_LIMITS)
+        self._semaphores = {}
+        self._in_flight = {}
+
+    async def run(self, stage, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in the pool, waiting for a free slot of the given stage."""
+        semaphore = self._semaphore(stage)
+        queued = time.perf_counter()
+        async with semaphore:
+            # Stage time starts once the slot is acquired, the queueing before is STAGE_WAIT_SECONDS
+            start = time.perf_counter()
+            STAGE_WAIT_SECONDS.observe(start - queued, stage)
+            self._in_flight[stage] = self._in_flight.get(stage, 0) + 1
+            try:
+                loop = asyncio.get_running_loop()
+                executor = None if stage in IO_STAGES else self.executor
+                return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+            finally:
+                self._in_flight[stage] -= 1
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+
+    def in_flight(self):
+        return dict(self._in_flight)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+    def _semaphore(self, stage):
+        # Created lazily so the semaphore belongs to the running event loop
+        if stage not in self._semaphores:
+            limit = self.stage_limits.get(stage, WORKER_POOL_SIZE)
+            self._semaphores[stage] = asyncio.Semaphore(limit)
+        return self._semaphores[stage]
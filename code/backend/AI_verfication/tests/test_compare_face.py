@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+# main.py loads the YOLO/EasyOCR/dlib stack at import time
+for module in ("torch", "ultralytics", "easyocr", "face_recognition"):
+    pytest.importorskip(module)
+
+from fastapi.testclient import TestClient
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+os.environ["SESSION_BACKEND"] = "memory"
+os.environ["ID_INDEX_SYNC"] = "off"
+os.environ.setdefault("FACE_EMBEDDINGS_DIR", os.path.join(tempfile.mkdtemp(), "face_embeddings"))
+
+from benchmarks import firestore_stub
+
+firestore_stub.install()
+os.chdir(APP_DIR)
+import main
+
+COMPARE_ID = "123456789"
+SELFIES = {"file1": ("a.jpg", b"not read", "image/jpeg"), "file2": ("b.jpg", b"not read", "image/jpeg")}
+EXPIRED = "Verification session expired. Please scan your ID again."
+
+
+@pytest.fixture
+def client():
+    # No startup events: the session checks answer before any model is needed
+    return TestClient(main.app)
+
+
+def session(back_verified):
+    data = main.session_data("1" * 18, COMPARE_ID)
+    if back_verified:
+        data["back_verified"] = True
+    token = main.sessions.create(data)
+    main.face_cache.put(token, np.zeros(128, dtype=np.float32))
+    return token
+
+
+def compare(client, token, compare_id=COMPARE_ID):
+    return client.post("/compare-face/", data={"compare_id": compare_id, "session_token": token}, files=SELFIES)
+
+
+def test_rejected_before_back_side_verified(client):
+    response = compare(client, session(back_verified=False))
+    assert response.status_code == 401
+    assert response.json()["message"] == EXPIRED
+
+
+def test_rejected_with_another_compare_id(client):
+    response = compare(client, session(back_verified=True), compare_id="987654321")
+    assert response.status_code == 401
+
+
+def test_rejected_for_unknown_or_expired_session(client):
+    token = session(back_verified=True)
+    main.sessions.delete(token)
+    assert compare(client, token).status_code == 401
+    assert compare(client, "unknown").status_code == 401
+
+
+def test_verified_session_reaches_the_selfie_checks(client):
+    # The undecodable selfies fail after the session checks, not with a 401
+    response = compare(client, session(back_verified=True))
+    assert response.status_code == 200
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import face_cache
+from face_cache import FaceEmbeddingCache
+
+TTL = 900
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(face_cache, "time", clock)
+    return clock
+
+
+def put(cache, key, clock):
+    cache.put(key, np.arange(128, dtype=np.float32))
+    # Files written now get the fake clock's time, as every worker would see them
+    os.utime(cache._path(key), (clock.now, clock.now))
+
+
+def test_expires_after_ttl(tmp_path, clock):
+    cache = FaceEmbeddingCache(TTL, str(tmp_path))
+    put(cache, "token", clock)
+    clock.now += TTL - 1
+    assert cache.get("token") is not None
+    clock.now += 2
+    assert cache.get("token") is None
+
+
+def test_touch_follows_session_update(tmp_path, clock):
+    cache = FaceEmbeddingCache(TTL, str(tmp_path))
+    put(cache, "token", clock)
+    clock.now += TTL - 1
+    cache.touch("token")  # the back side updated the session
+    clock.now += TTL - 1
+    np.testing.assert_array_equal(cache.get("token"), np.arange(128, dtype=np.float32))
+
+    # Another worker only has the file, its mtime carries the new expiry
+    other_worker = FaceEmbeddingCache(TTL, str(tmp_path))
+    assert other_worker.get("token") is not None
+    clock.now += 2
+    assert other_worker.get("token") is None
+    assert cache.get("token") is None
+
+
+def test_touch_of_unknown_key(tmp_path, clock):
+    cache = FaceEmbeddingCache(TTL, str(tmp_path))
+    cache.touch("unknown")
+    assert cache.get("unknown") is None
@@ -0,0 +1,118 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_gate import (CLASSIFIER_IMAGE_SIZE, IMAGENET_MEAN, IMAGENET_STD, check_blur, check_exposure,
+                        check_resolution, preprocess_for_classifier)
+from image_context import ImageContext
+
+
+def camera_frame(height=720, width=1280, seed=0):
+    # Fine high-contrast detail (text, card edges) is where resize filters differ the most
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    frame[::2, ::2] = 255
+    frame[1::2, 1::2] = 0
+    return frame
+
+
+def halve_antialiased(values, axis):
+    # Bilinear (triangle) filter stretched over the source pixels of a 2x downscale: taps
+    # 2i-1 .. 2i+2 weighted 1, 3, 3, 1, renormalized where they fall outside the image
+    values = np.moveaxis(values.astype(np.float64), axis, 0)
+    padded = np.concatenate([np.zeros_like(values[:1]), values, np.zeros_like(values[:1])])
+    inside = np.concatenate([[0.0], np.ones(len(values)), [0.0]])
+    weights = np.array([1.0, 3.0, 3.0, 1.0])
+    out = sum(w * padded[k:k + len(values) - 1:2] for k, w in enumerate(weights))
+    norm = sum(w * inside[k:k + len(values) - 1:2] for k, w in enumerate(weights))
+    return np.moveaxis(out / norm.reshape((-1,) + (1,) * (values.ndim - 1)), 0, axis)
+
+
+def test_uniform_frame_values():
+    frame = np.full((720, 1280, 3), (200, 128, 30), dtype=np.uint8)
+    batch = preprocess_for_classifier(frame)
+    assert batch.shape == (1, 3, CLASSIFIER_IMAGE_SIZE, CLASSIFIER_IMAGE_SIZE)
+    assert batch.dtype == np.float32
+    # (value / 255 - mean) / std of each channel
+    expected = np.array([1.3070468, 0.2051822, -1.2815686], dtype=np.float32)
+    np.testing.assert_allclose(batch[0, :, 100, 100], expected, atol=1e-5)
+    np.testing.assert_allclose(batch[0], np.broadcast_to(expected[:, None, None], batch.shape[1:]), atol=1e-5)
+
+
+def test_matches_antialiased_bilinear_downscale():
+    size = 2 * CLASSIFIER_IMAGE_SIZE
+    frame = camera_frame(size, size)
+    expected = halve_antialiased(halve_antialiased(frame, 1), 0) / 255.0
+    expected = ((expected - IMAGENET_MEAN) / IMAGENET_STD).transpose(2, 0, 1)
+    # PIL rounds to 8 bits between its two passes, one level is 1 / 255 / std
+    np.testing.assert_allclose(preprocess_for_classifier(frame)[0], expected, atol=1.5 / 255 / IMAGENET_STD.min())
+
+
+def test_not_inter_linear():
+    frame = camera_frame()
+    inter_linear = cv2.resize(frame, (CLASSIFIER_IMAGE_SIZE, CLASSIFIER_IMAGE_SIZE), interpolation=cv2.INTER_LINEAR)
+    inter_linear = ((inter_linear / 255.0 - IMAGENET_MEAN) / IMAGENET_STD).transpose(2, 0, 1)
+    assert np.abs(preprocess_for_classifier(frame)[0] - inter_linear).mean() > 0.5
+
+
+def test_matches_torchvision_val_transform():
+    pytest.importorskip("torchvision")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    "train_model_for_client_side"))
+    from classifier import val_transform
+
+    frame = camera_frame(seed=1)
+    expected = val_transform(Image.fromarray(frame)).numpy()[np.newaxis]
+    np.testing.assert_allclose(preprocess_for_classifier(frame), expected, atol=1e-5)
+
+
+def test_downscale_is_antialiased():
+    # A one pixel checkerboard averages to flat gray, a resize without antialiasing keeps
+    # sampling single black or white pixels
+    checkerboard = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    checkerboard[::2, ::2] = 255
+    checkerboard[1::2, 1::2] = 255
+    batch = preprocess_for_classifier(checkerboard)
+    pixels = batch[0] * IMAGENET_STD[:, None, None] + IMAGENET_MEAN[:, None, None]
+    assert abs(float(pixels.mean()) - 0.5) < 0.02
+    assert float(pixels.std()) < 0.05
+
+
+def textured_frame(height=720, width=1280, seed=0):
+    # Mid-gray noise: well exposed and sharp
+    return np.random.default_rng(seed).integers(60, 200, (height, width, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("shape, accepted", [((480, 640), True), ((720, 1280), True), ((360, 640), False)])
+def test_resolution_gate(shape, accepted):
+    ok, shortest_side = check_resolution(ImageContext(textured_frame(*shape)))
+    assert ok is accepted
+    assert shortest_side == min(shape)
+
+
+@pytest.mark.parametrize("frame, accepted", [
+    (textured_frame(), True),
+    (np.full((720, 1280, 3), 15, dtype=np.uint8), False),  # too dark
+    (np.full((720, 1280, 3), 240, dtype=np.uint8), False),  # too bright
+    (np.repeat(np.array([0, 255], dtype=np.uint8), 640)[None, :, None].repeat(720, 0).repeat(3, 2), False),  # clipped
+])
+def test_exposure_gate(frame, accepted):
+    ok, _ = check_exposure(ImageContext(frame))
+    assert ok is accepted
+
+
+def test_blur_gate():
+    sharp = textured_frame()
+    ok, sharp_variance = check_blur(ImageContext(sharp))
+    assert ok
+
+    blurred = cv2.GaussianBlur(sharp, (0, 0), 6)
+    ok, blurred_variance = check_blur(ImageContext(blurred))
+    assert not ok
+    assert blurred_variance < sharp_variance
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.firestore_stub import StubCollection
+from id_index import HashIndex
+
+
+def digest(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def metadata(id_number, compare_id):
+    return {"id_number": digest(id_number), "compare_id": digest(compare_id), "last_name": "L", "first_name": "F"}
+
+
+def wait_for(condition, timeout=2.0):
+    # The stub delivers snapshots on its own thread, like Firestore
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the snapshot listener"
+        time.sleep(0.005)
+
+
+class CountingCollection(StubCollection):
+    def __init__(self, name="Metadata"):
+        super().__init__(name)
+        self.streams = 0
+        self.during_stream = None
+
+    def select(self, fields):
+        # HashIndex.load streams select(HASH_FIELDS), count and hook that stream
+        return self
+
+    def stream(self):
+        self.streams += 1
+        for i, doc in enumerate(super().stream()):
+            if i == 1 and self.during_stream:
+                self.during_stream()
+            yield doc
+
+
+def test_unknown_until_loaded():
+    index = HashIndex(CountingCollection(), sync="off")
+    assert index.might_contain("id_number", digest("1" * 18))
+
+
+def test_add_during_load_is_kept():
+    collection = CountingCollection()
+    for i in range(3):
+        collection.add(metadata(f"{i:018d}", f"{i:09d}"))
+    index = HashIndex(collection, sync="off")
+    # A registration whose document the stream has already passed
+    collection.during_stream = lambda: index.add(digest("9" * 18), digest("9" * 9))
+    index.load()
+
+    assert index.might_contain("id_number", digest("9" * 18))
+    assert index.might_contain("compare_id", digest("9" * 9))
+    assert index.might_contain("id_number", digest("0" * 18))
+    assert not index.might_contain("id_number", digest("8" * 18))
+    assert index.size() == {"id_number": 4, "compare_id": 4}
+
+
+def test_listener_follows_added_and_removed_documents():
+    collection = CountingCollection()
+    _, first = collection.add(metadata("1" * 18, "1" * 9))
+    index = HashIndex(collection, sync="listener")
+    index.start()
+    try:
+        wait_for(lambda: index.ready)
+        # The initial snapshot is the initial load
+        assert collection.streams == 0
+        assert index.might_contain("id_number", digest("1" * 18))
+        assert not index.might_contain("id_number", digest("2" * 18))
+
+        _, second = collection.add(metadata("2" * 18, "2" * 9))
+        wait_for(lambda: index.might_contain("id_number", digest("2" * 18)))
+        assert index.might_contain("compare_id", digest("2" * 9))
+
+        first.delete()
+        wait_for(lambda: not index.might_contain("id_number", digest("1" * 18)))
+        assert not index.might_contain("compare_id", digest("1" * 9))
+        assert index.might_contain("id_number", digest("2" * 18))
+    finally:
+        index.stop()
+
+
+def test_removed_keeps_digest_held_by_another_document():
+    collection = CountingCollection()
+    _, first = collection.add(metadata("1" * 18, "5" * 9))
+    _, second = collection.add(metadata("2" * 18, "5" * 9))
+    index = HashIndex(collection, sync="listener")
+    index.start()
+    try:
+        wait_for(lambda: index.ready)
+        first.delete()
+        wait_for(lambda: not index.might_contain("id_number", digest("1" * 18)))
+        assert index.might_contain("compare_id", digest("5" * 9))
+
+        second.delete()
+        wait_for(lambda: not index.might_contain("compare_id", digest("5" * 9)))
+    finally:
+        index.stop()
+
+
+def test_modified_document_drops_its_old_digests():
+    collection = CountingCollection()
+    _, ref = collection.add(metadata("1" * 18, "1" * 9))
+    index = HashIndex(collection, sync="listener")
+    index.start()
+    try:
+        wait_for(lambda: index.ready)
+        ref.set(metadata("3" * 18, "3" * 9))
+        wait_for(lambda: index.might_contain("id_number", digest("3" * 18)))
+        assert not index.might_contain("id_number", digest("1" * 18))
+        assert index.size() == {"id_number": 1, "compare_id": 1}
+    finally:
+        index.stop()
+
+
+def test_local_add_before_its_snapshot():
+    collection = CountingCollection()
+    index = HashIndex(collection, sync="listener")
+    index.start()
+    try:
+        wait_for(lambda: index.ready)
+        # main.py writes the document, then records it, the snapshot may come later
+        _, ref = collection.add(metadata("4" * 18, "4" * 9))
+        index.add(digest("4" * 18), digest("4" * 9))
+        assert index.might_contain("id_number", digest("4" * 18))
+
+        ref.delete()
+        wait_for(lambda: not index.might_contain("id_number", digest("4" * 18)))
+    finally:
+        index.stop()
@@ -0,0 +1,120 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import session_store
+from session_store import InMemorySessionStore, SQLiteSessionStore
+
+TTL = 900
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_store, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, clock):
+    if request.param == "memory":
+        return InMemorySessionStore(ttl_seconds=TTL)
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl_seconds=TTL)
+
+
+def test_create_get(store):
+    token = store.create({"id_number_hash": "ab" * 32, "compare_id_hash": "cd" * 32})
+    assert store.get(token) == {"id_number_hash": "ab" * 32, "compare_id_hash": "cd" * 32}
+    assert store.get("unknown") is None
+    assert store.get("") is None
+    assert store.get(None) is None
+
+
+def test_update_merges_fields(store):
+    token = store.create({"compare_id_hash": "cd" * 32})
+    assert store.update(token, back_verified=True)
+    assert store.get(token) == {"compare_id_hash": "cd" * 32, "back_verified": True}
+
+
+def test_expiry(store, clock):
+    token = store.create({"compare_id_hash": "cd" * 32})
+    clock.now += TTL - 1
+    assert store.get(token) is not None
+    clock.now += 2
+    assert store.get(token) is None
+
+
+def test_update_extends_expiry(store, clock):
+    token = store.create({"compare_id_hash": "cd" * 32})
+    clock.now += TTL - 1
+    assert store.update(token, back_verified=True)
+    clock.now += TTL - 1
+    assert store.get(token)["back_verified"] is True
+
+
+def test_update_of_expired_or_unknown_token_fails(store, clock):
+    token = store.create({"compare_id_hash": "cd" * 32})
+    clock.now += TTL + 1
+    assert store.update(token, back_verified=True) is False
+    assert store.get(token) is None
+    assert store.update("unknown", back_verified=True) is False
+
+
+def test_delete_and_purge(store, clock):
+    kept = store.create({"n": 1})
+    deleted = store.create({"n": 2})
+    store.delete(deleted)
+    assert store.get(deleted) is None
+    clock.now += TTL + 1
+    fresh = store.create({"n": 3})
+    assert store.purge_expired() == 0  # create() already dropped the expired session
+    assert store.get(kept) is None
+    assert store.get(fresh) == {"n": 3}
+
+
+def test_sqlite_sessions_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    token = SQLiteSessionStore(path).create({"compare_id_hash": "cd" * 32})
+
+    # Another uvicorn worker is another process opening the same file
+    script = (
+        "import sys; from session_store import SQLiteSessionStore; "
+        "store = SQLiteSessionStore(sys.argv[1]); "
+        "print(store.get(sys.argv[2])['compare_id_hash']); "
+        "store.update(sys.argv[2], back_verified=True)"
+    )
+    output = subprocess.run([sys.executable, "-c", script, path, token], cwd=APP_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "cd" * 32
+    assert SQLiteSessionStore(path).get(token)["back_verified"] is True
+
+
+def test_sqlite_concurrent_updates_are_not_lost(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    stores = [SQLiteSessionStore(path) for _ in range(4)]
+    token = stores[0].create({})
+
+    def update(store, worker):
+        for i in range(25):
+            assert store.update(token, **{f"worker_{worker}_{i}": True})
+
+    threads = [threading.Thread(target=update, args=(store, worker)) for worker, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(stores[0].get(token)) == 100
@@ -0,0 +1,41 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stage_executor
+from stage_executor import StageExecutor
+
+
+def record(monkeypatch, histogram):
+    values = []
+    observe = histogram.observe
+
+    def recording_observe(value, *labels):
+        observe(value, *labels)
+        values.append((labels[0], value))
+
+    monkeypatch.setattr(histogram, "observe", recording_observe)
+    return values
+
+
+def test_stage_time_excludes_the_wait(monkeypatch):
+    stage_seconds = record(monkeypatch, stage_executor.STAGE_SECONDS)
+    wait_seconds = record(monkeypatch, stage_executor.STAGE_WAIT_SECONDS)
+    executor = StageExecutor(max_workers=2, stage_limits={"ocr": 1})
+
+    async def run_both():
+        await asyncio.gather(*(executor.run("ocr", time.sleep, 0.1) for _ in range(2)))
+
+    try:
+        asyncio.run(run_both())
+    finally:
+        executor.shutdown()
+
+    # One slot: the second call waits for the first, but each call still takes ~0.1s
+    assert [stage for stage, _ in stage_seconds] == ["ocr", "ocr"]
+    assert all(0.09 < seconds < 0.18 for _, seconds in stage_seconds)
+    waits = sorted(seconds for _, seconds in wait_seconds)
+    assert waits[0] < 0.05 and 0.09 < waits[1] < 0.18
@@ -0,0 +1,42 @@
+import torch
+import torch.nn as nn
+import torchvision.transforms as transforms
+from torchvision import models
+
+# MobileNet input size and the ImageNet statistics the classifier is trained with
+IMAGE_SIZE = 224
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# ImageFolder sorts the class folders: 0 is "with_id", 1 is "without_id"
+NUM_CLASSES = 2
+
+MODEL_PATH = "mobilenet_model.pth"
+
+# Define transforms for the training and validation datasets
+train_transform = transforms.Compose([
+    transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),  # Resize to fit MobileNet input size
+    transforms.ToTensor(),
+    transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
+])
+
+val_transform = transforms.Compose([
+    transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
+])
+
+
+def build_model(pretrained=True):
+    # MobileNetV2 with the output layer changed to match the number of classes
+    model = models.mobilenet_v2(pretrained=pretrained)
+    model.classifier[1] = nn.Linear(model.classifier[1].in_features, NUM_CLASSES)
+    return model
+
+
+def load_model(path=MODEL_PATH):
+    """Load the trained state_dict saved by main.py, in eval mode on the CPU."""
+    model = build_model(pretrained=False)
+    model.load_state_dict(torch.load(path, map_location="cpu"))
+    model.eval()
+    return model
@@ -0,0 +1,171 @@
+"""
+Decoded, resized dataset cache for the classifier trainer.
+
+Every image of an ImageFolder split is decoded and resized once into a memory-mapped
+(N, 224, 224, 3) uint8 array (images.npy) next to labels.npy and a manifest of the source
+files. Training then reads whole batches from the memory map and normalizes them in one
+vectorized operation instead of decoding every JPEG again each epoch.
+
+    python dataset_cache.py dataset/train dataset_cache/train
+"""
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+import torchvision.datasets as datasets
+from PIL import Image
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
+
+from classifier import IMAGE_SIZE, IMAGENET_MEAN, IMAGENET_STD
+
+CACHE_VERSION = 1
+
+
+def scan(root):
+    """List the ImageFolder samples of a split with the size and mtime of every file."""
+    folder = datasets.ImageFolder(root=root)
+    files = []
+    for path, label in folder.samples:
+        stat = os.stat(path)
+        files.append([os.path.relpath(path, root), label, stat.st_size, int(stat.st_mtime)])
+    return folder.classes, files
+
+
+def load_resized(path):
+    # Same as transforms.Resize((224, 224)) on a PIL image
+    with Image.open(path) as image:
+        return np.asarray(image.convert("RGB").resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR), dtype=np.uint8)
+
+
+def build_cache(root, cache_dir, workers=None):
+    """Decode and resize every image of root once into cache_dir."""
+    classes, files = scan(root)
+    os.makedirs(cache_dir, exist_ok=True)
+    images = np.lib.format.open_memmap(
+        os.path.join(cache_dir, "images.npy"), mode="w+", dtype=np.uint8,
+        shape=(len(files), IMAGE_SIZE, IMAGE_SIZE, 3),
+    )
+    paths = [os.path.join(root, relpath) for relpath, _, _, _ in files]
+    # PIL releases the GIL while decoding and resizing, threads are enough
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for i, image in enumerate(pool.map(load_resized, paths)):
+            images[i] = image
+    images.flush()
+    del images
+
+    np.save(os.path.join(cache_dir, "labels.npy"), np.asarray([label for _, label, _, _ in files], dtype=np.int64))
+    with open(os.path.join(cache_dir, "manifest.json"), "w") as f:
+        json.dump({"version": CACHE_VERSION, "image_size": IMAGE_SIZE, "classes": classes, "files": files}, f)
+    print(f"Cached {len(files)} images of {root} in {cache_dir}")
+
+
+def cache_is_fresh(root, cache_dir):
+    """True when the cache was built from exactly the files currently in root."""
+    try:
+        with open(os.path.join(cache_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if manifest.get("version") != CACHE_VERSION or manifest.get("image_size") != IMAGE_SIZE:
+        return False
+    classes, files = scan(root)
+    return manifest["classes"] == classes and manifest["files"] == files
+
+
+class CachedImageDataset(Dataset):
+    """
+    Reads batches of uint8 images from the memory-mapped cache.
+
+    Indexed with a list of indices (see cached_loader), so each DataLoader worker copies a
+    whole batch out of the memory map with one fancy-indexing read.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.labels = np.load(os.path.join(cache_dir, "labels.npy"))
+        self._images = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, indices):
+        if self._images is None:
+            # Opened lazily so every worker process maps the file itself
+            self._images = np.load(os.path.join(self.cache_dir, "images.npy"), mmap_mode="r")
+        indices = np.sort(np.asarray(indices))
+        return torch.from_numpy(self._images[indices]), torch.from_numpy(self.labels[indices])
+
+
+def cached_loader(cache_dir, batch_size, shuffle, num_workers):
+    dataset = CachedImageDataset(cache_dir)
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(
+        dataset,
+        sampler=BatchSampler(sampler, batch_size=batch_size, drop_last=False),
+        batch_size=None,  # the dataset already returns whole batches
+        num_workers=num_workers,
+        persistent_workers=num_workers > 0,
+        pin_memory=torch.cuda.is_available(),
+    )
+
+
+def make_loader(root, cache_dir, transform, batch_size, shuffle, num_workers, mode="auto"):
+    """
+    Loader of a split, from the cache when it matches the files in root.
+
+    mode "auto" builds a missing cache and falls back to ImageFolder when the cache is
+    stale, "rebuild" rebuilds a missing or stale cache and "off" always uses ImageFolder.
+    Cached batches are uint8 (N, 224, 224, 3), ImageFolder batches are already normalized,
+    prepare_batch() handles both.
+    """
+    if mode != "off":
+        fresh = cache_is_fresh(root, cache_dir)
+        missing = not os.path.exists(os.path.join(cache_dir, "manifest.json"))
+        if not fresh and (missing or mode == "rebuild"):
+            build_cache(root, cache_dir)
+            fresh = True
+        if fresh:
+            print(f"Using dataset cache {cache_dir}")
+            return cached_loader(cache_dir, batch_size, shuffle, num_workers)
+        print(f"Dataset cache {cache_dir} is stale, falling back to ImageFolder (DATASET_CACHE=rebuild to update it)")
+
+    dataset = datasets.ImageFolder(root=root, transform=transform)
+    return DataLoader(
+        dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
+        persistent_workers=num_workers > 0, pin_memory=torch.cuda.is_available(),
+    )
+
+
+def prepare_batch(images, device, augment=False):
+    """
+    Move a batch to the device as normalized (N, 3, 224, 224) float32.
+
+    uint8 batches from the cache are converted and normalized in one vectorized operation
+    on the device. With augment, random horizontal flips and brightness/contrast jitter
+    are applied to the whole batch at once.
+    """
+    if images.dtype != torch.uint8:
+        return images.to(device, non_blocking=True)
+
+    images = images.to(device, non_blocking=True).permute(0, 3, 1, 2).float().div_(255.0)
+    if augment:
+        flip = torch.rand(images.shape[0], device=device) < 0.5
+        images[flip] = images[flip].flip(-1)
+        brightness = torch.empty(images.shape[0], 1, 1, 1, device=device).uniform_(0.8, 1.2)
+        contrast = torch.empty(images.shape[0], 1, 1, 1, device=device).uniform_(0.8, 1.2)
+        mean = images.mean(dim=(1, 2, 3), keepdim=True)
+        images = ((images - mean) * contrast + mean * brightness).clamp_(0.0, 1.0)
+
+    mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1)
+    return (images - mean) / std
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python dataset_cache.py <ImageFolder root> <cache dir>")
+        sys.exit(1)
+    build_cache(sys.argv[1], sys.argv[2])
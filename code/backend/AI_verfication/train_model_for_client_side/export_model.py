@@ -0,0 +1,257 @@
+"""
+Export the trained classifier (mobilenet_model.pth) to ONNX and TFLite and benchmark every artifact.
+
+    python export_model.py --train-dir dataset/train --val-dir dataset/val
+
+Artifacts written to --output-dir:
+    mobilenet_model.onnx          FP32 ONNX (dynamic batch), the file run_model.py serves
+    mobilenet_model_fp16.onnx     FP16 weights and activations, float32 inputs/outputs
+    mobilenet_model_int8.onnx     INT8 static QDQ quantization calibrated on training images
+    mobilenet_model_fp32.tflite   TFLite through onnx_tf
+    mobilenet_model_fp16.tflite   TFLite with float16 weights
+    mobilenet_model_int8.tflite   TFLite with int8 weights and activations (calibrated)
+
+For each artifact it reports the file size, batch-1 CPU latency, validation accuracy and the
+share of validation images where it predicts the same class as the PyTorch model, and names
+the smallest artifact within --max-accuracy-drop of PyTorch. Formats whose converter is not
+installed (onnxconverter-common, onnx-tf, tensorflow) are skipped, formats whose conversion
+or evaluation fails are reported as failed, and the other formats are still benchmarked.
+
+Every run rebuilds mobilenet_saved_model/ (the TensorFlow graph the TFLite files are
+converted from) from the ONNX model it just exported, so the TFLite files never come from
+the weights of an earlier run.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import torch
+import torchvision.datasets as datasets
+
+from classifier import IMAGE_SIZE, MODEL_PATH, load_model, val_transform
+
+
+def load_split(directory, limit=None):
+    """Preprocess a split with val_transform into a (N, 3, 224, 224) float32 array and labels."""
+    dataset = datasets.ImageFolder(root=directory, transform=val_transform)
+    indices = np.arange(len(dataset))
+    if limit is not None and limit < len(indices):
+        indices = np.random.default_rng(0).choice(indices, limit, replace=False)
+    images, labels = zip(*(dataset[int(i)] for i in indices))
+    return torch.stack(images).numpy(), np.asarray(labels)
+
+
+def export_onnx_fp32(model, path):
+    dummy = torch.zeros(1, 3, IMAGE_SIZE, IMAGE_SIZE)
+    torch.onnx.export(
+        model, dummy, path, input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}}, opset_version=13,
+    )
+
+
+def export_onnx_fp16(source, path):
+    import onnx
+    from onnxconverter_common import float16
+
+    model = float16.convert_float_to_float16(onnx.load(source), keep_io_types=True)
+    onnx.save(model, path)
+
+
+class CalibrationReader:
+    def __init__(self, images, input_name):
+        self.images = iter(images)
+        self.input_name = input_name
+
+    def get_next(self):
+        image = next(self.images, None)
+        return None if image is None else {self.input_name: image[np.newaxis]}
+
+    def rewind(self):
+        pass
+
+
+def export_onnx_int8(source, path, calibration):
+    import onnxruntime
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    input_name = onnxruntime.InferenceSession(source, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    quantize_static(
+        source, path, CalibrationReader(calibration, input_name),
+        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+
+def export_saved_model(source, directory):
+    import onnx
+    from onnx_tf.backend import prepare
+
+    # Never keep the graph of an earlier run, a failed export must not leave it behind either
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    prepare(onnx.load(source)).export_graph(directory)
+
+
+def export_tflite(saved_model_dir, path, precision, calibration=None):
+    import tensorflow as tf
+
+    # The ONNX -> TensorFlow conversion of this run is shared by the three TFLite precisions
+    if not os.path.isdir(saved_model_dir):
+        raise RuntimeError(f"{saved_model_dir} was not exported")
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+    if precision == "fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif precision == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([image[np.newaxis]] for image in calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+
+
+class OnnxRunner:
+    def __init__(self, path):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class TFLiteRunner:
+    def __init__(self, path):
+        import tensorflow as tf
+
+        self.interpreter = tf.lite.Interpreter(model_path=path, num_threads=1)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+
+    def __call__(self, batch):
+        outputs = []
+        for image in batch:
+            self.interpreter.set_tensor(self.input_index, image[np.newaxis])
+            self.interpreter.invoke()
+            outputs.append(self.interpreter.get_tensor(self.output_index)[0])
+        return np.stack(outputs)
+
+
+class TorchRunner:
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.model(torch.from_numpy(batch)).numpy()
+
+
+def evaluate(runner, images, labels, reference, batch_size=32, latency_runs=50):
+    predictions = np.concatenate([
+        runner(images[i:i + batch_size]).argmax(axis=1) for i in range(0, len(images), batch_size)
+    ])
+
+    sample = images[:1]
+    runner(sample)
+    timings = []
+    for _ in range(latency_runs):
+        start = time.perf_counter()
+        runner(sample)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return predictions, {
+        "accuracy": round(float((predictions == labels).mean()), 4),
+        "agreement_with_pytorch": round(float((predictions == reference).mean()), 4) if reference is not None else 1.0,
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "p95_ms": round(float(np.percentile(timings, 95)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and benchmark the ID classifier")
+    parser.add_argument("--weights", default=MODEL_PATH)
+    parser.add_argument("--train-dir", default="dataset/train", help="Calibration images for INT8")
+    parser.add_argument("--val-dir", default="dataset/val")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--calibration-count", type=int, default=200)
+    parser.add_argument("--max-val", type=int, default=None, help="Evaluate on a random subset of the validation set")
+    parser.add_argument("--latency-runs", type=int, default=50)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)  # latency is compared single-threaded, like on a phone core
+    os.makedirs(args.output_dir, exist_ok=True)
+    out = lambda name: os.path.join(args.output_dir, name)
+
+    model = load_model(args.weights)
+    val_images, val_labels = load_split(args.val_dir, args.max_val)
+    calibration, _ = load_split(args.train_dir, args.calibration_count)
+    print(f"Validation images: {len(val_images)}, calibration images: {len(calibration)}")
+
+    reference, report = evaluate(TorchRunner(model), val_images, val_labels, None, latency_runs=args.latency_runs)
+    report.update({"artifact": args.weights, "format": "pytorch", "size_mb": round(os.path.getsize(args.weights) / 1e6, 3)})
+    reports = [report]
+
+    fp32_onnx = out("mobilenet_model.onnx")
+    saved_model_dir = out("mobilenet_saved_model")
+    exports = [
+        ("onnx", "fp32", fp32_onnx, lambda: export_onnx_fp32(model, fp32_onnx), OnnxRunner),
+        ("onnx", "fp16", out("mobilenet_model_fp16.onnx"),
+         lambda: export_onnx_fp16(fp32_onnx, out("mobilenet_model_fp16.onnx")), OnnxRunner),
+        ("onnx", "int8", out("mobilenet_model_int8.onnx"),
+         lambda: export_onnx_int8(fp32_onnx, out("mobilenet_model_int8.onnx"), calibration), OnnxRunner),
+        # Not benchmarked itself, the TFLite conversions below start from it
+        ("savedmodel", "fp32", saved_model_dir, lambda: export_saved_model(fp32_onnx, saved_model_dir), None),
+    ]
+    for precision in ("fp32", "fp16", "int8"):
+        path = out(f"mobilenet_model_{precision}.tflite")
+        exports.append((
+            "tflite", precision, path,
+            lambda path=path, precision=precision: export_tflite(saved_model_dir, path, precision, calibration),
+            TFLiteRunner,
+        ))
+
+    skipped = []
+    for fmt, precision, path, export, runner_class in exports:
+        try:
+            export()
+            if runner_class is None:
+                continue
+            _, report = evaluate(runner_class(path), val_images, val_labels, reference, latency_runs=args.latency_runs)
+        except ImportError as e:
+            print(f"Skipping {fmt} {precision}, missing dependency: {e}")
+            skipped.append({"format": f"{fmt}-{precision}", "status": "missing_dependency", "error": str(e)})
+            continue
+        except Exception as e:
+            print(f"Skipping {fmt} {precision}, export or evaluation failed: {type(e).__name__}: {e}")
+            skipped.append({"format": f"{fmt}-{precision}", "status": "failed", "error": f"{type(e).__name__}: {e}"})
+            continue
+        report.update({"artifact": path, "format": f"{fmt}-{precision}", "size_mb": round(os.path.getsize(path) / 1e6, 3)})
+        reports.append(report)
+
+    print(f"\n{'format':<14} {'size MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'accuracy':>9} {'agreement':>10}")
+    for report in reports:
+        print(f"{report['format']:<14} {report['size_mb']:>8} {report['p50_ms']:>8} {report['p95_ms']:>8} "
+              f"{report['accuracy']:>9} {report['agreement_with_pytorch']:>10}")
+    for entry in skipped:
+        print(f"{entry['format']:<14} {entry['status']}: {entry['error']}")
+
+    # Smallest exported artifact whose accuracy is within the allowed drop
+    baseline = reports[0]["accuracy"]
+    candidates = [r for r in reports[1:] if r["accuracy"] >= baseline - args.max_accuracy_drop]
+    recommended = min(candidates, key=lambda r: r["size_mb"])["artifact"] if candidates else None
+    print(f"\nSmallest artifact within {args.max_accuracy_drop:.1%} of PyTorch accuracy: {recommended}")
+
+    with open(out("export_report.json"), "w") as f:
+        json.dump({"reports": reports, "skipped": skipped, "recommended": recommended}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Pooled MobileNetV2 backbone features of a dataset split, cached on disk.
+
+With the backbone frozen, the classifier only depends on the 1280-d vector MobileNetV2
+feeds to model.classifier. The backbone is run once over the split, the vectors are
+saved to features.npy / labels.npy, and the linear head is trained from them, which
+takes seconds on a CPU. The cache is reused as long as the split's files and the
+backbone weights are unchanged.
+"""
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from dataset_cache import prepare_batch, scan
+
+FEATURE_CACHE_VERSION = 1
+
+
+def pooled_features(model, images):
+    # Same path as MobileNetV2.forward up to the classifier
+    x = model.features(images)
+    x = nn.functional.adaptive_avg_pool2d(x, (1, 1))
+    return torch.flatten(x, 1)
+
+
+def extract_features(model, loader, device):
+    model.eval()
+    features, labels = [], []
+    with torch.no_grad():
+        for images, batch_labels in loader:
+            features.append(pooled_features(model, prepare_batch(images, device)).cpu())
+            labels.append(batch_labels)
+    return torch.cat(features).numpy(), torch.cat(labels).numpy()
+
+
+def load_or_extract(model, root, loader, cache_dir, device, backbone_id):
+    """
+    Return the (features, labels) of a split, from cache_dir when it was built from the
+    same files and backbone, otherwise by running the backbone over the loader.
+    """
+    _, files = scan(root)
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if (manifest.get("version") == FEATURE_CACHE_VERSION and manifest.get("backbone") == backbone_id
+                and manifest.get("files") == files):
+            print(f"Using cached features {cache_dir}")
+            return np.load(os.path.join(cache_dir, "features.npy")), np.load(os.path.join(cache_dir, "labels.npy"))
+    except (OSError, ValueError):
+        pass
+
+    start = time.perf_counter()
+    features, labels = extract_features(model, loader, device)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(os.path.join(cache_dir, "features.npy"), features.astype(np.float32))
+    np.save(os.path.join(cache_dir, "labels.npy"), labels.astype(np.int64))
+    with open(manifest_path, "w") as f:
+        json.dump({"version": FEATURE_CACHE_VERSION, "backbone": backbone_id, "files": files}, f)
+    print(f"Extracted {len(labels)} feature vectors in {time.perf_counter() - start:.1f}s into {cache_dir}")
+    return features, labels
+
+
+def train_head(head, features, labels, device, epochs=100, lr=0.001, batch_size=256, dropout=0.2):
+    """Train the linear head on cached features, with the dropout MobileNetV2 applies before it."""
+    features = torch.from_numpy(features).to(device)
+    labels = torch.from_numpy(labels).to(device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(head.parameters(), lr=lr)
+    drop = nn.Dropout(dropout)
+
+    start = time.perf_counter()
+    head.train()
+    for epoch in range(epochs):
+        permutation = torch.randperm(len(labels), device=device)
+        running_loss = 0.0
+        for i in range(0, len(labels), batch_size):
+            index = permutation[i:i + batch_size]
+            optimizer.zero_grad()
+            loss = criterion(head(drop(features[index])), labels[index])
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * len(index)
+        if (epoch + 1) % 10 == 0 or epoch == epochs - 1:
+            print(f'Head epoch [{epoch + 1}/{epochs}], Loss: {running_loss / len(labels):.4f}')
+    print(f"Trained head in {time.perf_counter() - start:.1f}s")
+
+
+def head_accuracy(head, features, labels, device):
+    head.eval()
+    with torch.no_grad():
+        predicted = head(torch.from_numpy(features).to(device)).argmax(dim=1).cpu().numpy()
+    return 100 * float((predicted == labels).mean())
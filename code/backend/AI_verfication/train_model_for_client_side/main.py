@@ -1,90 +1,131 @@
 import torch
 import torch.nn as nn
-import torchvision.transforms as transforms
-import torchvision.datasets as datasets
-from torch.utils.data import DataLoader
-from torchvision import models
 import os
 
-# Set device
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+from classifier import build_model, train_transform, val_transform, MODEL_PATH
+from dataset_cache import make_loader, prepare_batch
+from feature_cache import head_accuracy, load_or_extract, train_head
 
 # Define paths to dataset
-train_dir = r"C:\Users\HF\Desktop\L3\Software Engineering\Project\E-ServicesHub\code\backend\AI_verfication\train_model_for_client_side\dataset\train"
-val_dir = r"C:\Users\HF\Desktop\L3\Software Engineering\Project\E-ServicesHub\code\backend\AI_verfication\train_model_for_client_side\dataset\val"
-
-# Define transforms for the training and validation datasets
-train_transform = transforms.Compose([
-    transforms.Resize((224, 224)),  # Resize to fit MobileNet input size
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-])
-
-val_transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-])
-
-# Load the datasets
-train_dataset = datasets.ImageFolder(root=train_dir, transform=train_transform)
-val_dataset = datasets.ImageFolder(root=val_dir, transform=val_transform)
-
-# Create data loaders
-train_loader = DataLoader(train_dataset, batch_size=16, shuffle=True)
-val_loader = DataLoader(val_dataset, batch_size=16, shuffle=False)
-
-# Initialize the MobileNet model
-model = models.mobilenet_v2(pretrained=True)  # Use pretrained weights
-model.classifier[1] = nn.Linear(model.classifier[1].in_features, 2)  # Change output layer to match number of classes
-model = model.to(device)
-
-# Define the loss function and optimizer
-criterion = nn.CrossEntropyLoss()
-optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
-
-# Training Loop
+train_dir = os.environ.get("TRAIN_DIR", r"C:\Users\HF\Desktop\L3\Software Engineering\Project\E-ServicesHub\code\backend\AI_verfication\train_model_for_client_side\dataset\train")
+val_dir = os.environ.get("VAL_DIR", r"C:\Users\HF\Desktop\L3\Software Engineering\Project\E-ServicesHub\code\backend\AI_verfication\train_model_for_client_side\dataset\val")
+
+# Decoded dataset cache: "auto" builds it when missing and falls back to ImageFolder when it
+# is stale, "rebuild" refreshes a stale cache, "off" always decodes with ImageFolder
+DATASET_CACHE = os.environ.get("DATASET_CACHE", "auto")
+DATASET_CACHE_DIR = os.environ.get("DATASET_CACHE_DIR", "dataset_cache")
+
+# DataLoader worker processes
+NUM_WORKERS = int(os.environ.get("NUM_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Random flips and brightness/contrast jitter on cached training batches
+AUGMENT = os.environ.get("AUGMENT", "0") == "1"
+
+# "full" fine-tunes the whole network, "head" trains model.classifier[1] on cached frozen
+# backbone features and then fine-tunes everything for FINE_TUNE_EPOCHS (0 to skip)
+TRAIN_MODE = os.environ.get("TRAIN_MODE", "full")
+HEAD_EPOCHS = int(os.environ.get("HEAD_EPOCHS", "100"))
+FINE_TUNE_EPOCHS = int(os.environ.get("FINE_TUNE_EPOCHS", "0"))
+FEATURE_CACHE_DIR = os.environ.get("FEATURE_CACHE_DIR", "feature_cache")
+
+batch_size = 16
 num_epochs = 10  # Set the number of epochs
-for epoch in range(num_epochs):
-    model.train()  # Set model to training mode
-    running_loss = 0.0
 
-    for images, labels in train_loader:
-        images, labels = images.to(device), labels.to(device)
 
-        # Zero the parameter gradients
-        optimizer.zero_grad()
+def train(model, train_loader, device, num_epochs=num_epochs, lr=0.001):
+    # Define the loss function and optimizer
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+
+    # Training Loop
+    for epoch in range(num_epochs):
+        model.train()  # Set model to training mode
+        running_loss = 0.0
+
+        for images, labels in train_loader:
+            images, labels = prepare_batch(images, device, augment=AUGMENT), labels.to(device)
+
+            # Zero the parameter gradients
+            optimizer.zero_grad()
+
+            # Forward pass
+            outputs = model(images)
+
+            # Compute loss
+            loss = criterion(outputs, labels)
+
+            # Backward pass and optimization
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.item()
+
+        # Print training loss
+        print(f'Epoch [{epoch + 1}/{num_epochs}], Loss: {running_loss / len(train_loader):.4f}')
+
+
+def evaluate(model, val_loader, device):
+    # Validation Loop
+    model.eval()  # Set model to evaluation mode
+    correct = 0
+    total = 0
+
+    with torch.no_grad():  # Disable gradient tracking
+        for images, labels in val_loader:
+            images, labels = prepare_batch(images, device), labels.to(device)
+            outputs = model(images)
+            _, predicted = torch.max(outputs.data, 1)
+            total += labels.size(0)
+            correct += (predicted == labels).sum().item()
+
+    return 100 * correct / total
+
+
+def train_with_cached_features(model, train_loader, val_loader, device):
+    # The backbone is frozen on its ImageNet weights, so its features only change with the files
+    backbone_id = "mobilenet_v2-imagenet"
+    train_features, train_labels = load_or_extract(
+        model, train_dir, train_loader, os.path.join(FEATURE_CACHE_DIR, "train"), device, backbone_id)
+    val_features, val_labels = load_or_extract(
+        model, val_dir, val_loader, os.path.join(FEATURE_CACHE_DIR, "val"), device, backbone_id)
+
+    head = model.classifier[1]
+    train_head(head, train_features, train_labels, device, epochs=HEAD_EPOCHS)
+    print(f'Head Validation Accuracy: {head_accuracy(head, val_features, val_labels, device):.2f}%')
 
-        # Forward pass
-        outputs = model(images)
 
-        # Compute loss
-        loss = criterion(outputs, labels)
+def main():
+    # Set device
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
-        # Backward pass and optimization
-        loss.backward()
-        optimizer.step()
+    # Create data loaders, from the decoded cache when it is up to date
+    train_loader = make_loader(train_dir, os.path.join(DATASET_CACHE_DIR, "train"), train_transform,
+                               batch_size, shuffle=True, num_workers=NUM_WORKERS, mode=DATASET_CACHE)
+    val_loader = make_loader(val_dir, os.path.join(DATASET_CACHE_DIR, "val"), val_transform,
+                             batch_size, shuffle=False, num_workers=NUM_WORKERS, mode=DATASET_CACHE)
 
-        running_loss += loss.item()
+    # Initialize the MobileNet model
+    model = build_model(pretrained=True)  # Use pretrained weights, output layer changed to 2 classes
+    model = model.to(device)
 
-    # Print training loss
-    print(f'Epoch [{epoch + 1}/{num_epochs}], Loss: {running_loss / len(train_loader):.4f}')
+    if TRAIN_MODE == "head":
+        train_with_cached_features(model, train_loader, val_loader, device)
+        if FINE_TUNE_EPOCHS:
+            # Full fine-tune starting from the trained head, with a smaller learning rate
+            train(model, train_loader, device, num_epochs=FINE_TUNE_EPOCHS, lr=0.0001)
+    elif TRAIN_MODE == "full":
+        train(model, train_loader, device)
+    else:
+        raise ValueError(f"Unknown TRAIN_MODE: {TRAIN_MODE}")
 
-# Validation Loop
-model.eval()  # Set model to evaluation mode
-correct = 0
-total = 0
+    # Print validation accuracy (already reported from the cached features when only the head was trained)
+    if TRAIN_MODE != "head" or FINE_TUNE_EPOCHS:
+        print(f'Validation Accuracy: {evaluate(model, val_loader, device):.2f}%')
 
-with torch.no_grad():  # Disable gradient tracking
-    for images, labels in val_loader:
-        images, labels = images.to(device), labels.to(device)
-        outputs = model(images)
-        _, predicted = torch.max(outputs.data, 1)
-        total += labels.size(0)
-        correct += (predicted == labels).sum().item()
+    # Save the model
+    torch.save(model.state_dict(), MODEL_PATH)
 
-# Print validation accuracy
-print(f'Validation Accuracy: {100 * correct / total:.2f}%')
 
-# Save the model
-torch.save(model.state_dict(), 'mobilenet_model.pth')
+# DataLoader workers re-import this file on Windows, training must only start from here
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+import os
+from typing import List
+
 from fastapi import FastAPI, File, UploadFile, HTTPException
 import onnxruntime
 import numpy as np
@@ -5,54 +8,95 @@ from PIL import Image
 
 app = FastAPI()
 
-# Load the ONNX model
-ort_session = onnxruntime.InferenceSession("mobilenet_model.onnx")
+# ONNX Runtime session options
+MODEL_PATH = os.environ.get("MODEL_PATH", "mobilenet_model.onnx")
+ORT_GRAPH_OPTIMIZATION = os.environ.get("ORT_GRAPH_OPTIMIZATION", "all")  # disable, basic, extended or all
+ORT_INTRA_OP_THREADS = int(os.environ.get("ORT_INTRA_OP_THREADS", "0"))  # 0 lets ONNX Runtime decide
+ORT_INTER_OP_THREADS = int(os.environ.get("ORT_INTER_OP_THREADS", "0"))
+ORT_EXECUTION_MODE = os.environ.get("ORT_EXECUTION_MODE", "sequential")  # sequential or parallel
+ORT_ENABLE_MEM_ARENA = os.environ.get("ORT_ENABLE_MEM_ARENA", "1") == "1"
+ORT_ENABLE_MEM_PATTERN = os.environ.get("ORT_ENABLE_MEM_PATTERN", "1") == "1"
+
+# Largest number of images run in one session call, bigger batches are split
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "32"))
+
+# Same preprocessing as val_transform in main.py: Resize((224, 224)), ToTensor(), Normalize()
+IMAGE_SIZE = 224
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
 
 # Define your class labels
-# Assuming 0 is for "with_id" and 1 is for "without_id"
-class_labels = ["without_id", "with_id"]
+# ImageFolder sorts the class folders, so 0 is "with_id" and 1 is "without_id"
+class_labels = ["with_id", "without_id"]
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def create_session(path=MODEL_PATH):
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[ORT_GRAPH_OPTIMIZATION]
+    options.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    options.inter_op_num_threads = ORT_INTER_OP_THREADS
+    options.execution_mode = (
+        onnxruntime.ExecutionMode.ORT_PARALLEL if ORT_EXECUTION_MODE == "parallel"
+        else onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    )
+    options.enable_cpu_mem_arena = ORT_ENABLE_MEM_ARENA
+    options.enable_mem_pattern = ORT_ENABLE_MEM_PATTERN
+    return onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+# Load the ONNX model
+ort_session = create_session()
+input_name = ort_session.get_inputs()[0].name
+# Models exported with a fixed batch dimension of 1 are run image by image
+dynamic_batch = not isinstance(ort_session.get_inputs()[0].shape[0], int)
 
 
-def load_and_preprocess_image(image_file):
+def load_image(image_file):
+    """Decode an upload and resize it to 224x224 RGB uint8, the way torchvision's Resize does."""
     try:
-        image = Image.open(image_file)
+        image = Image.open(image_file).convert("RGB")
     except Exception as e:
         raise HTTPException(status_code=400, detail="Invalid image file.")
 
-    # Resize to the expected input size, e.g., 224x224 for MobileNet
-    image = image.resize((224, 224))
-    # Convert image to numpy array and normalize
-    image_array = np.array(image).astype(np.float32) / 255.0
+    # torchvision's Resize uses bilinear interpolation (PIL's own default is bicubic)
+    image = image.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)
+    return np.asarray(image, dtype=np.uint8)
 
-    # Check if image has three channels (RGB)
-    if image_array.shape[-1] != 3:
-        raise HTTPException(status_code=400, detail="Image must be RGB.")
 
-    # Change dimensions to fit the model input (N, C, H, W)
-    image_array = np.transpose(image_array, (2, 0, 1))  # HWC to CHW
-    image_array = np.expand_dims(image_array, axis=0)  # Add batch dimension
-    return image_array
+def preprocess_batch(images):
+    """
+    Normalize a stack of 224x224 RGB uint8 images in one vectorized pass.
 
+    Args:
+        images (numpy.ndarray): (N, 224, 224, 3) uint8
 
-@app.post("/predict")
-async def predict(file: UploadFile = File(...)):
-    # Validate file type
-    if not file.filename.endswith(('.png', '.jpg', '.jpeg')):
-        raise HTTPException(status_code=400, detail="File type not supported. Please upload a PNG or JPG image.")
+    Returns:
+        numpy.ndarray: (N, 3, 224, 224) float32, ToTensor() + Normalize() applied
+    """
+    batch = images.astype(np.float32) * (1.0 / 255.0)
+    batch -= IMAGENET_MEAN
+    batch /= IMAGENET_STD
+    return np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
 
-    # Load the image and preprocess it
-    image = load_and_preprocess_image(file.file)
 
-    # Make a prediction
-    ort_inputs = {ort_session.get_inputs()[0].name: image}
-    ort_outs = ort_session.run(None, ort_inputs)
+def predict_batch(images):
+    """Run the model on (N, 224, 224, 3) uint8 images, returns the (N, 2) logits."""
+    batch = preprocess_batch(images)
+    step = MAX_BATCH_SIZE if dynamic_batch else 1
+    outputs = [ort_session.run(None, {input_name: batch[i:i + step]})[0] for i in range(0, len(batch), step)]
+    return np.concatenate(outputs)
 
-    # Convert the output to class probabilities
-    predictions = ort_outs[0]  # Assuming the output is a probability distribution
 
+def format_prediction(logits):
     # Get the predicted class
-    predicted_class_index = np.argmax(predictions)  # Index of the class with the highest score
-    predicted_class = class_labels[predicted_class_index]
+    predicted_class = class_labels[int(np.argmax(logits))]
 
     # Check if the prediction is for "with_id"
     if predicted_class == "with_id":
@@ -61,10 +105,50 @@ async def predict(file: UploadFile = File(...)):
         response_color = "red"
 
     return {
-        "predictions": predictions.tolist(),
+        "predictions": [logits.tolist()],
         "predicted_class": predicted_class,
         "rectangle_color": response_color  # Return the color for the rectangle
     }
 
+
+def validate_file_type(file):
+    if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+        raise HTTPException(status_code=400, detail="File type not supported. Please upload a PNG or JPG image.")
+
+
+@app.post("/predict")
+async def predict(file: UploadFile = File(...)):
+    # Validate file type
+    validate_file_type(file)
+
+    # Load the image, preprocess it and make a prediction
+    image = load_image(file.file)
+    logits = predict_batch(image[np.newaxis])[0]
+    return format_prediction(logits)
+
+
+@app.post("/predict-batch")
+async def predict_batch_endpoint(files: List[UploadFile] = File(...)):
+    """
+    Classify N images in one call. The valid images are run as a single (N, 3, 224, 224)
+    tensor, invalid ones get an error entry at their position in the results.
+    """
+    results = [None] * len(files)
+    images, positions = [], []
+    for position, file in enumerate(files):
+        try:
+            validate_file_type(file)
+            images.append(load_image(file.file))
+            positions.append(position)
+        except HTTPException as e:
+            results[position] = {"filename": file.filename, "error": e.detail}
+
+    if images:
+        logits = predict_batch(np.stack(images))
+        for position, row in zip(positions, logits):
+            results[position] = {"filename": files[position].filename, **format_prediction(row)}
+
+    return {"results": results}
+
 # To run the server, use the command:
-# uvicorn backend:app --reload
+# uvicorn run_model:app --reload
@@ -14,7 +14,8 @@ import 'package:hanini_frontend/screens/verification/manual_verification_screen.
 
 class FaceCompareScreen extends StatefulWidget {
   final String compareId;
-  FaceCompareScreen({required this.compareId});
+  final String sessionToken;
+  FaceCompareScreen({required this.compareId, required this.sessionToken});
 
   @override
   _FaceCompareScreenState createState() => _FaceCompareScreenState();
@@ -89,6 +90,7 @@ class _FaceCompareScreenState extends State<FaceCompareScreen> {
       );
 
       request.fields['compare_id'] = widget.compareId; // Use the passed compare_id
+      request.fields['session_token'] = widget.sessionToken;
       request.files.add(await http.MultipartFile.fromPath('file1', _firstImage!.path));
       request.files.add(await http.MultipartFile.fromPath('file2', _secondImage!.path));
       final response = await request.send();
@@ -30,6 +30,7 @@ class _RealTimeDetectionState extends State<RealTimeDetection> with TickerProvid
   late Animation<double> _flashAnimation;
   bool _isCapturing = false;
   bool _isBackIdCaptured = false; // Flag to check if back of ID is captured
+  String? _sessionToken; // Verification session returned by /upload-image/
   bool _showFrontIdMessage = false; // Flag to show front ID message
   bool _showBackIdMessage = false; // Flag to show back ID message
   bool _showFrontIdAnimation = false; // Flag to show front ID animation
@@ -155,6 +156,9 @@ class _RealTimeDetectionState extends State<RealTimeDetection> with TickerProvid
       );
 
       request.files.add(await http.MultipartFile.fromPath('file', _capturedImage!.path));
+      if (_isBackIdCaptured && _sessionToken != null) {
+        request.fields['session_token'] = _sessionToken!;
+      }
       final response = await request.send();
       final responseData = await http.Response.fromStream(response);
 
@@ -181,7 +185,10 @@ class _RealTimeDetectionState extends State<RealTimeDetection> with TickerProvid
               Navigator.push(
                 context,
                 MaterialPageRoute(
-                  builder: (context) => FaceCompareScreen(compareId: compareId),
+                  builder: (context) => FaceCompareScreen(
+                    compareId: compareId,
+                    sessionToken: _sessionToken!,
+                  ),
                 ),
               );
             } else {
@@ -193,6 +200,7 @@ class _RealTimeDetectionState extends State<RealTimeDetection> with TickerProvid
         } else {
           if (responseBody["stop_capture"]) {
             setState(() {
+              _sessionToken = responseBody["session_token"];
               _isBackIdCaptured = true;
               _capturedImage = null;
               _showFrontIdMessage = false;